@@ -0,0 +1,183 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from bulk_writers import DEFAULT_WRITER, make_writer, quote_name
+from copy_metrics import estimate_bytes, run_metrics
+from mysql_pushdown import source_query
+from swap_reload import reload_with_swap
+
+# Tables below both limits (information_schema estimates) count as small: they are read in one go and
+# reloaded in a single transaction, so the estimates only need to be roughly right
+SMALL_TABLE_MAX_ROWS = 50_000
+SMALL_TABLE_MAX_BYTES = 64 * 2 ** 20
+
+# Small tables copied at the same time; each one holds a MySQL and a SQL Server session while it runs
+SMALL_TABLE_CONCURRENCY = 16
+
+
+def small_tables(table_names, table_sizes, max_rows=SMALL_TABLE_MAX_ROWS, max_bytes=SMALL_TABLE_MAX_BYTES):
+    return [name for name in table_names
+            if name in table_sizes and table_sizes[name][0] < max_rows and table_sizes[name][1] < max_bytes]
+
+
+def fetch_rows(mysql_conn, query):
+    rows = mysql_conn.execute(query).fetchall()
+    mysql_conn.rollback()
+    return rows
+
+
+def truncate_table(mssql_conn, mssql_table):
+    # Not committed: the TRUNCATE and the inserts become visible together
+    qualified_name = quote_name(f"{mssql_table.schema or 'dbo'}.{mssql_table.name}")
+    mssql_conn.execute(text(f"TRUNCATE TABLE {qualified_name}"))
+
+
+def write_and_commit(mssql_conn, writer, batch):
+    if batch:
+        writer.write(mssql_conn, batch)
+    mssql_conn.execute(text("COMMIT"))
+
+
+class SessionPair:
+    """One MySQL and one SQL Server connection, checked out once and reused for every table a worker copies."""
+
+    def __init__(self, mysql_engine, mssql_engine):
+        self.mysql_engine = mysql_engine
+        self.mssql_engine = mssql_engine
+        self.mysql_conn = None
+        self.mssql_conn = None
+
+    def open(self):
+        if self.mysql_conn is None:
+            self.mysql_conn = self.mysql_engine.connect()
+        if self.mssql_conn is None:
+            self.mssql_conn = self.mssql_engine.connect()
+
+    def close(self):
+        for conn in (self.mysql_conn, self.mssql_conn):
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        self.mysql_conn = None
+        self.mssql_conn = None
+
+
+async def copy_small_table(sessions, mysql_table, mssql_table, writer_backend, after_copy=None, pushdown=False,
+                           swap=False):
+    """Reload one small table with a single commit.
+
+    Without swap the MySQL read and the SQL Server TRUNCATE run at the same
+    time and the rows are written in the TRUNCATE's transaction. With swap
+    the rows are loaded into a staging heap and switched in by
+    reload_with_swap (swap_reload.py). No COUNT(*) is sent; the number of
+    rows read is the count. Returns the stats dict of copy_table_streaming,
+    plus 'after_copy_error' when the rows were committed but after_copy failed.
+    """
+    table_name = mysql_table.name
+    metrics = run_metrics.table(table_name)
+    query, converter = source_query(sessions.mysql_engine, mysql_table, mssql_table, pushdown=pushdown)
+    await asyncio.to_thread(sessions.open)
+
+    read_start = time.perf_counter()
+    if swap:
+        # The live table is left alone until the switch, so there is nothing to overlap the read with
+        rows = await asyncio.to_thread(fetch_rows, sessions.mysql_conn, query)
+    else:
+        rows, _ = await asyncio.gather(asyncio.to_thread(fetch_rows, sessions.mysql_conn, query),
+                                       asyncio.to_thread(truncate_table, sessions.mssql_conn, mssql_table))
+    read_end = time.perf_counter()
+    metrics.record('read', len(rows), read_end - read_start, estimate_bytes(rows))
+    batch = converter.convert_batch(rows)
+    convert_end = time.perf_counter()
+    metrics.record('convert', len(rows), convert_end - read_end, estimate_bytes(batch))
+
+    if swap:
+        def load(staging_table):
+            # TABLOCK lets the insert into the staging heap be minimally logged
+            write_and_commit(sessions.mssql_conn, make_writer(writer_backend, staging_table, tablock=True), batch)
+
+        # Every swap step runs on the worker's session: the pool has no spare connection for it
+        await asyncio.to_thread(reload_with_swap, sessions.mssql_engine, mssql_table, load,
+                                conn=sessions.mssql_conn)
+    else:
+        await asyncio.to_thread(write_and_commit, sessions.mssql_conn, make_writer(writer_backend, mssql_table), batch)
+    metrics.record('write', len(batch), time.perf_counter() - convert_end, estimate_bytes(batch))
+    metrics.finish()
+    stats = {'copied': len(batch), 'skipped': len(rows) - len(batch),
+             'truncated': sum(converter.truncated.values()), 'batches': 1}
+
+    # after_copy(mssql_conn, mysql_table, mssql_table, rows) runs once the reload is committed
+    if after_copy is not None:
+        try:
+            await asyncio.to_thread(after_copy, sessions.mssql_conn, mysql_table, mssql_table, rows)
+        except Exception as e:
+            # The rows are in; copying the table again would not redo the bookkeeping any better
+            print(f"Table `{table_name}`: copied, but the steps after the copy failed: {e}")
+            stats['after_copy_error'] = e
+            await asyncio.to_thread(sessions.close)
+    return stats
+
+
+async def copy_small_tables_async(mysql_engine, mssql_engine, table_pairs, concurrency, writer_backend, table_writers,
+                                  after_copy, pushdown, swap):
+    queue = asyncio.Queue()
+    for pair in table_pairs:
+        queue.put_nowait(pair)
+    results = {}
+
+    async def worker():
+        sessions = SessionPair(mysql_engine, mssql_engine)
+        try:
+            while not queue.empty():
+                mysql_table, mssql_table = queue.get_nowait()
+                table_name = mysql_table.name
+                try:
+                    backend = table_writers.get(table_name, writer_backend)
+                    results[table_name] = await copy_small_table(sessions, mysql_table, mssql_table, backend,
+                                                                 after_copy, pushdown, swap)
+                except Exception as e:
+                    print(f"Error copying small table `{table_name}`: {e}")
+                    results[table_name] = e
+                    # The TRUNCATE is rolled back with the rest; start the next table on fresh sessions
+                    await asyncio.to_thread(sessions.close)
+        finally:
+            await asyncio.to_thread(sessions.close)
+
+    loop = asyncio.get_running_loop()
+    # Every blocking driver call runs on this pool: one MySQL and one SQL Server call per worker at most
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency * 2, thread_name_prefix='small-table'))
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(table_pairs)))))
+    return results
+
+
+def copy_small_tables(mysql_engine, mssql_engine, table_pairs, concurrency=SMALL_TABLE_CONCURRENCY,
+                      writer_backend=DEFAULT_WRITER, table_writers=None, after_copy=None, pushdown=False,
+                      swap=False):
+    """Reload many small tables at once on an asyncio loop with at most `concurrency` in flight.
+
+    table_pairs is a list of (mysql_table, mssql_table); table_writers maps
+    table names to writer backends, the others use writer_backend. The
+    drivers are blocking, so their calls run on a thread pool, while the
+    event loop interleaves hundreds of tables over a fixed set of sessions
+    that are opened once per worker instead of once per table. Each table is
+    truncated and reloaded in one SQL Server transaction: readers never see
+    it empty or half loaded, but the TRUNCATE's schema modification lock
+    blocks them until the commit. With swap the rows go through
+    reload_with_swap instead, so readers only wait for the switch.
+    Returns {table_name: stats or exception}.
+    """
+    if not table_pairs:
+        return {}
+    run_start = time.time()
+    results = asyncio.run(copy_small_tables_async(mysql_engine, mssql_engine, table_pairs, concurrency,
+                                                  writer_backend, table_writers or {}, after_copy, pushdown, swap))
+    copied = sum(result['copied'] for result in results.values() if isinstance(result, dict))
+    failed = sum(1 for result in results.values() if isinstance(result, Exception))
+    print(f"Copied {len(results) - failed} small tables ({copied} rows) in {time.time() - run_start:.2f}s, "
+          f"{failed} failed")
+    return results
@@ -0,0 +1,304 @@
+import csv
+import datetime
+import json
+import os
+import random
+import sqlite3
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from decimal import Decimal
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, Numeric, String, Table, create_engine, delete, func,
+                        select, text)
+from sqlalchemy.dialects import mssql, mysql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from benchmark_row_conversion import legacy_convert
+from checkpoint_copy import copy_table_resumable
+from checksum_sync import TableSpec, compare_range
+from chunked_copy import copy_table_chunked, pk_ranges_minmax
+from copy_metrics import peak_memory_bytes
+from copy_state import CopyStateStore
+from mssql_schema import build_mssql_table
+from pipeline_copy import copy_table_pipelined
+from stream_copy import copy_table_streaming
+
+# Synthetic table shapes: row count and how many columns of each kind. Strings are generated around the
+# target length limit, decimals have one digit more scale than the target and NULL_FRACTION of the values are
+# NULL, also in columns that are NOT NULL on the target (those rows are skipped by every copier)
+TABLE_SHAPES = {
+    'narrow': {'rows': 200_000, 'strings': 2, 'decimals': 1, 'integers': 2, 'datetimes': 1},
+    'wide': {'rows': 50_000, 'strings': 20, 'decimals': 8, 'integers': 8, 'datetimes': 4},
+}
+SOURCE_STRING_LENGTH = 100
+TARGET_STRING_LENGTH = 40
+NULL_FRACTION = 0.01
+SEED = 42
+
+# Scenarios run for every table shape; 'baseline' is the original truncate_alltables_copy_mysql_to_mssql.py
+# loop (fetchall, per-cell conversion, one insert for the whole table)
+SCENARIOS = ['baseline', 'streaming', 'pipelined', 'chunked', 'resumable', 'sync', 'schema']
+BATCH_SIZE = 5000
+CHUNK_COUNT = 8
+CHUNK_WORKERS = 4
+
+# Fraction of target rows changed or deleted before the sync scenario compares the tables
+SYNC_CHANGE_FRACTION = 0.01
+SYNC_LEAF_WIDTH = 1000
+
+# Number of table definitions converted by the schema scenario
+SCHEMA_TABLES = 500
+
+# Every run appends one line per scenario and shape, tagged with the commit, so runs can be compared
+RESULTS_FILE = 'benchmark_results.csv'
+
+# SQLite keeps NUMERIC as floating point; the copiers still get Decimal values, which is what is measured
+warnings.filterwarnings('ignore', message='Dialect sqlite.*does \\*not\\* support Decimal')
+
+
+def build_tables(shape_name):
+    """Source ("MySQL") and target ("SQL Server") tables of one shape; the target has shorter strings and NOT NULLs."""
+    shape = TABLE_SHAPES[shape_name]
+    source_columns = [Column('id', Integer, primary_key=True, autoincrement=False)]
+    target_columns = [Column('id', Integer, primary_key=True, autoincrement=False)]
+    for i in range(shape['strings']):
+        source_columns.append(Column(f's{i}', String(SOURCE_STRING_LENGTH)))
+        target_columns.append(Column(f's{i}', String(TARGET_STRING_LENGTH), nullable=(i % 2 == 0)))
+    for i in range(shape['decimals']):
+        source_columns.append(Column(f'd{i}', Numeric(12, 3)))
+        target_columns.append(Column(f'd{i}', Numeric(12, 2)))
+    for i in range(shape['integers']):
+        source_columns.append(Column(f'n{i}', Integer))
+        target_columns.append(Column(f'n{i}', Integer))
+    for i in range(shape['datetimes']):
+        source_columns.append(Column(f't{i}', DateTime))
+        target_columns.append(Column(f't{i}', DateTime))
+    return (Table(shape_name, MetaData(), *source_columns),
+            Table(shape_name, MetaData(), *target_columns))
+
+
+def generate_rows(shape_name):
+    """Yield the synthetic rows of a shape in batches, always the same ones for the same SEED."""
+    shape = TABLE_SHAPES[shape_name]
+    rng = random.Random(SEED)
+    # Mostly around the limit: just under, at, just over, and far over it
+    lengths = (5, TARGET_STRING_LENGTH - 1, TARGET_STRING_LENGTH, TARGET_STRING_LENGTH + 1, SOURCE_STRING_LENGTH)
+    start = datetime.datetime(2020, 1, 1)
+    batch = []
+    for row_id in range(shape['rows']):
+        row = {'id': row_id}
+        for i in range(shape['strings']):
+            row[f's{i}'] = None if rng.random() < NULL_FRACTION else \
+                ''.join(rng.choices(string.ascii_letters, k=rng.choice(lengths)))
+        for i in range(shape['decimals']):
+            row[f'd{i}'] = None if rng.random() < NULL_FRACTION else Decimal(rng.randint(0, 10 ** 9)) / 1000
+        for i in range(shape['integers']):
+            row[f'n{i}'] = None if rng.random() < NULL_FRACTION else rng.randint(-10 ** 9, 10 ** 9)
+        for i in range(shape['datetimes']):
+            row[f't{i}'] = start + datetime.timedelta(seconds=rng.randint(0, 10 ** 8))
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_engines(workdir):
+    """SQLite stand-ins for the two servers, one database file each; waits out write locks between chunk workers."""
+    connect_args = {'check_same_thread': False, 'timeout': 600}
+    return (create_engine(f"sqlite:///{os.path.join(workdir, 'mysql.db')}", connect_args=connect_args),
+            create_engine(f"sqlite:///{os.path.join(workdir, 'mssql.db')}", connect_args=connect_args))
+
+
+def prepare(workdir):
+    """Create and fill the source tables and create the empty target tables."""
+    mysql_engine, mssql_engine = create_engines(workdir)
+    for shape_name in TABLE_SHAPES:
+        source_table, target_table = build_tables(shape_name)
+        source_table.metadata.create_all(mysql_engine)
+        target_table.metadata.create_all(mssql_engine)
+        with mysql_engine.begin() as conn:
+            for batch in generate_rows(shape_name):
+                conn.execute(source_table.insert(), batch)
+        print(f"Generated table `{shape_name}`: {TABLE_SHAPES[shape_name]}")
+
+
+def baseline_copy(mysql_engine, mssql_engine, mysql_table, mssql_table):
+    """The copy loop of the original truncate_alltables_copy_mysql_to_mssql.py, TRUNCATE left out.
+
+    The per-cell conversion is legacy_convert from benchmark_row_conversion.py, which leaves out the original
+    message printed for every truncated value.
+    """
+    table_name = mssql_table.name
+    with mysql_engine.connect() as mysql_conn:
+        total_rows = mysql_conn.execute(select(func.count()).select_from(mysql_table)).scalar()
+        print(f"Total rows to copy from MySQL table `{table_name}`: {total_rows}")
+
+    with mysql_engine.connect() as mysql_conn:
+        mysql_data = mysql_conn.execute(select(mysql_table)).fetchall()
+        insert_data = legacy_convert(mysql_data, mssql_table, table_name)
+
+        with mssql_engine.connect() as conn:
+            conn.execute(mssql_table.insert(), insert_data)
+            conn.execute(text("COMMIT"))
+    return len(mysql_data)
+
+
+def run_copy_scenario(scenario, workdir, mysql_engine, mssql_engine, mysql_table, mssql_table):
+    if scenario == 'baseline':
+        return baseline_copy(mysql_engine, mssql_engine, mysql_table, mssql_table)
+    if scenario == 'chunked':
+        with mysql_engine.connect() as mysql_conn:
+            key_ranges = pk_ranges_minmax(mysql_conn, mysql_table, mysql_table.c.id, CHUNK_COUNT)
+        stats = copy_table_chunked(mysql_engine, mssql_engine, mysql_table, mssql_table, key_ranges, CHUNK_WORKERS,
+                                   batch_size=BATCH_SIZE)
+    elif scenario == 'resumable':
+        state = CopyStateStore(os.path.join(workdir, 'copy_state.sqlite'))
+        try:
+            with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                stats = copy_table_resumable(mysql_conn, conn, mysql_table, mssql_table, [mysql_table.c.id], state,
+                                             batch_size=BATCH_SIZE)
+        finally:
+            state.close()
+    else:
+        copy = copy_table_streaming if scenario == 'streaming' else copy_table_pipelined
+        with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+            stats = copy(mysql_conn, conn, mysql_table, mssql_table, batch_size=BATCH_SIZE)
+    return stats['copied'] + stats['skipped'] + stats.get('rejected', 0)
+
+
+def run_sync_scenario(workdir, shape_name, mysql_table):
+    """Row-level diff of checksum_sync.compare_range over every leaf range of a lightly changed copy.
+
+    The bucket checksums and the MERGE are MySQL/SQL Server SQL that SQLite
+    cannot run, so this measures the fetch-and-compare work that dominates a
+    sync of a table with many differing ranges.
+    """
+    source = sqlite3.connect(os.path.join(workdir, 'mysql.db'))
+    target = sqlite3.connect(':memory:')
+    # compare_range addresses the target as [dbo].[table]
+    target.execute("ATTACH DATABASE ? AS dbo", (os.path.join(workdir, 'sync.db'),))
+    target.execute(f"DROP TABLE IF EXISTS dbo.[{shape_name}]")
+    target.execute("ATTACH DATABASE ? AS src", (os.path.join(workdir, 'mysql.db'),))
+    target.execute(f"CREATE TABLE dbo.[{shape_name}] AS SELECT * FROM src.[{shape_name}]")
+    rng = random.Random(SEED)
+    total_rows = TABLE_SHAPES[shape_name]['rows']
+    changed = rng.sample(range(total_rows), int(total_rows * SYNC_CHANGE_FRACTION))
+    half = len(changed) // 2
+    target.executemany(f"UPDATE dbo.[{shape_name}] SET n0 = -1 WHERE id = ?", [(key,) for key in changed[:half]])
+    target.executemany(f"DELETE FROM dbo.[{shape_name}] WHERE id = ?", [(key,) for key in changed[half:]])
+    target.commit()
+
+    columns = [col.name for col in mysql_table.columns]
+    spec = TableSpec(shape_name, shape_name, 'id', columns, {})
+    differences = 0
+    for lower in range(0, total_rows, SYNC_LEAF_WIDTH):
+        inserts, updates, deletes = compare_range(source, target, spec, lower, lower + SYNC_LEAF_WIDTH)
+        differences += len(inserts) + len(updates) + len(deletes)
+    print(f"Table `{shape_name}`: {differences} differing rows found")
+    source.close()
+    target.close()
+    return total_rows
+
+
+def run_schema_scenario(shape_name):
+    """Convert SCHEMA_TABLES MySQL table definitions of this shape to SQL Server DDL (build + compile)."""
+    shape = TABLE_SHAPES[shape_name]
+    dialect = mssql.dialect()
+    for table_number in range(SCHEMA_TABLES):
+        metadata = MetaData()
+        columns = [Column('id', mysql.INTEGER(unsigned=True), primary_key=True, autoincrement=True)]
+        columns += [Column(f's{i}', mysql.VARCHAR(SOURCE_STRING_LENGTH, charset='utf8mb4'))
+                    for i in range(shape['strings'])]
+        columns += [Column(f'd{i}', mysql.DECIMAL(12, 3)) for i in range(shape['decimals'])]
+        columns += [Column(f'n{i}', mysql.BIGINT(unsigned=(i % 2 == 0))) for i in range(shape['integers'])]
+        columns += [Column(f't{i}', mysql.DATETIME(fsp=3)) for i in range(shape['datetimes'])]
+        columns += [Column('status', mysql.ENUM('new', 'done')), Column('payload', mysql.JSON)]
+        mysql_table = Table(f'{shape_name}_{table_number}', metadata, *columns)
+        mssql_table = build_mssql_table(mysql_table, MetaData())
+        str(CreateTable(mssql_table).compile(dialect=dialect))
+        for index in mssql_table.indexes:
+            str(CreateIndex(index).compile(dialect=dialect))
+    return SCHEMA_TABLES
+
+
+def run_scenario(scenario, shape_name, workdir):
+    """Run one scenario in this process and return its result; called in a fresh child process per scenario."""
+    mysql_engine, mssql_engine = create_engines(workdir)
+    mysql_table, mssql_table = build_tables(shape_name)
+    with mssql_engine.begin() as conn:
+        conn.execute(delete(mssql_table))
+    start = time.perf_counter()
+    if scenario == 'sync':
+        rows = run_sync_scenario(workdir, shape_name, mysql_table)
+    elif scenario == 'schema':
+        rows = run_schema_scenario(shape_name)
+    else:
+        rows = run_copy_scenario(scenario, workdir, mysql_engine, mssql_engine, mysql_table, mssql_table)
+    seconds = time.perf_counter() - start
+    return {'scenario': scenario, 'table': shape_name, 'rows': rows, 'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_bytes': peak_memory_bytes()}
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    # Each scenario runs in its own process so its peak RSS is not inflated by the ones before it
+    if len(sys.argv) == 5 and sys.argv[1] == '--run':
+        result = run_scenario(sys.argv[2], sys.argv[3], sys.argv[4])
+        print('RESULT ' + json.dumps(result))
+        return
+
+    scenarios = sys.argv[1:] or SCENARIOS
+    commit = current_commit()
+    run_at = datetime.datetime.now().isoformat(timespec='seconds')
+    results = []
+    with tempfile.TemporaryDirectory(prefix='mysql_to_mssql_bench_') as workdir:
+        prepare(workdir)
+        for shape_name in TABLE_SHAPES:
+            for scenario in scenarios:
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', scenario, shape_name,
+                                        workdir], capture_output=True, text=True)
+                lines = [line for line in child.stdout.splitlines() if line.startswith('RESULT ')]
+                if child.returncode != 0 or not lines:
+                    print(f"Scenario {scenario} on `{shape_name}` failed:\n{child.stderr[-2000:]}")
+                    continue
+                results.append(json.loads(lines[-1][len('RESULT '):]))
+
+    new_file = not os.path.exists(RESULTS_FILE)
+    with open(RESULTS_FILE, 'a', newline='') as results_file:
+        fields = ['run_at', 'commit', 'scenario', 'table', 'rows', 'seconds', 'rows_per_second', 'peak_rss_bytes']
+        writer = csv.DictWriter(results_file, fieldnames=fields)
+        if new_file:
+            writer.writeheader()
+        for result in results:
+            writer.writerow({'run_at': run_at, 'commit': commit, **result})
+
+    print(f"\nCommit {commit}, batch size {BATCH_SIZE} (results appended to {RESULTS_FILE}):")
+    baselines = {result['table']: result for result in results if result['scenario'] == 'baseline'}
+    for result in results:
+        baseline = baselines.get(result['table'])
+        speedup = ''
+        if baseline and result['scenario'] not in ('sync', 'schema') and baseline['rows_per_second']:
+            speedup = f"  ({result['rows_per_second'] / baseline['rows_per_second']:.1f}x baseline)"
+        peak = result['peak_rss_bytes']
+        peak_text = f"{peak / 2 ** 20:8.0f} MiB peak RSS" if peak else "  peak RSS n/a"
+        unit = 'tables/s' if result['scenario'] == 'schema' else 'rows/s'
+        print(f"  {result['table']:<8} {result['scenario']:<10} {result['rows_per_second']:>12,.0f} {unit:<8} "
+              f"{peak_text}{speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import random
+import string
+import time
+from decimal import Decimal
+
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table, create_engine, select
+
+from row_converter import compile_converter
+
+# Synthetic table shape and size for the benchmark
+ROW_COUNT = 200000
+STRING_COLUMNS = 6
+NUMERIC_COLUMNS = 6
+REPEATS = 3
+
+
+def legacy_convert(rows, mssql_table, table_name):
+    """The per-cell loop truncate_alltables_copy_mysql_to_mssql.py used before the compiled converter."""
+    column_max_lengths = {col.name: col.type.length for col in mssql_table.columns if hasattr(col.type, 'length')}
+    insert_data = []
+    for row in rows:
+        insert_row = {}
+        skip_row = False
+        for mssql_col in mssql_table.columns:
+            value = row._mapping.get(mssql_col.name)
+            max_length = column_max_lengths.get(mssql_col.name)
+            if max_length and isinstance(value, str) and len(value) > max_length:
+                value = value[:max_length]
+            if isinstance(value, Decimal):
+                value = f"{value:.2f}"
+            if not mssql_col.nullable and value is None:
+                skip_row = True
+                break
+            insert_row[mssql_col.name] = value
+        if not skip_row:
+            insert_data.append(insert_row)
+    return insert_data
+
+
+def build_tables():
+    """Source and target tables: the target has shorter strings and NOT NULL columns, like the real schemas."""
+    source_metadata = MetaData()
+    target_metadata = MetaData()
+    source_columns = [Column('id', Integer, primary_key=True)]
+    target_columns = [Column('id', Integer, primary_key=True)]
+    for i in range(STRING_COLUMNS):
+        source_columns.append(Column(f's{i}', String(100)))
+        target_columns.append(Column(f's{i}', String(40), nullable=(i % 2 == 0)))
+    for i in range(NUMERIC_COLUMNS):
+        source_columns.append(Column(f'n{i}', Numeric(12, 3) if i % 3 == 0 else Integer))
+        target_columns.append(Column(f'n{i}', Numeric(12, 2) if i % 3 == 0 else Integer))
+    return Table('bench', source_metadata, *source_columns), Table('bench', target_metadata, *target_columns)
+
+
+def load_rows(source_table):
+    """Materialise real SQLAlchemy rows from an in-memory SQLite table."""
+    engine = create_engine('sqlite://')
+    source_table.metadata.create_all(engine)
+    rng = random.Random(42)
+    data = []
+    for row_id in range(ROW_COUNT):
+        row = {'id': row_id}
+        for i in range(STRING_COLUMNS):
+            length = rng.choice((5, 20, 39, 40, 41, 90))
+            row[f's{i}'] = None if rng.random() < 0.01 else ''.join(rng.choices(string.ascii_letters, k=length))
+        for i in range(NUMERIC_COLUMNS):
+            row[f'n{i}'] = Decimal(rng.randint(0, 10 ** 7)) / 1000 if i % 3 == 0 else rng.randint(0, 10 ** 6)
+        data.append(row)
+    with engine.begin() as conn:
+        conn.execute(source_table.insert(), data)
+    with engine.connect() as conn:
+        return conn.execute(select(source_table)).fetchall()
+
+
+def best_rate(convert, rows):
+    best = 0.0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        convert(rows)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(rows) / elapsed)
+    return best
+
+
+def main():
+    source_table, target_table = build_tables()
+    rows = load_rows(source_table)
+    converter = compile_converter(source_table, target_table)
+    print(f"{len(rows)} rows, {len(target_table.columns)} columns, best of {REPEATS} runs (single core):")
+    results = [
+        ('legacy per-cell loop', best_rate(lambda batch: legacy_convert(batch, target_table, 'bench'), rows)),
+        ('compiled converter', best_rate(converter.convert_batch, rows)),
+        ('compiled converter, columnar', best_rate(converter.convert_batch_columnar, rows)),
+    ]
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f"  {name:<30} {rate:>12,.0f} rows/s  ({rate / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import time
+
+import pyodbc
+from sqlalchemy import MetaData, create_engine
+
+from bulk_writers import has_identity
+from copy_metrics import REPORT_DIR, estimate_bytes, run_metrics
+from mssql_upsert import delete_keys, upsert_rows
+from row_converter import RowConverter
+
+# Pending row changes applied per SQL Server transaction, and the longest a change waits before a flush
+CDC_BATCH_SIZE = 5000
+CDC_MAX_DELAY_SECONDS = 2.0
+
+# Where the last applied binlog position is kept between runs
+POSITION_FILE = 'binlog_position.json'
+
+
+class RowChange:
+    """One row-level change: op is 'upsert' or 'delete'; position is the (log_file, log_pos) after the event."""
+
+    def __init__(self, op, table, values, position):
+        self.op = op
+        self.table = table
+        self.values = values
+        self.position = position
+
+
+def load_position(path=POSITION_FILE):
+    """Return the saved (log_file, log_pos), or (None, None) to start at the current binlog end."""
+    if not os.path.exists(path):
+        return None, None
+    with open(path) as position_file:
+        saved = json.load(position_file)
+    return saved['log_file'], saved['log_pos']
+
+
+def save_position(position, path=POSITION_FILE):
+    # Write then rename so a crash never leaves a half-written position file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as position_file:
+        json.dump({'log_file': position[0], 'log_pos': position[1]}, position_file)
+    os.replace(temp_path, path)
+
+
+def changes_from_binlog(connection_settings, server_id, schema, tables, log_file=None, log_pos=None):
+    """Tail the MySQL row-based binlog and yield RowChange objects for the given tables.
+
+    Yields None on server heartbeats so pending changes can be flushed while the binlog is idle.
+    Column names come from the binlog when binlog_row_metadata=FULL and are
+    looked up on the server otherwise; rows that still arrive without them
+    raise RuntimeError instead of being applied under the wrong names.
+    """
+    from pymysqlreplication import BinLogStreamReader
+    from pymysqlreplication.event import HeartbeatLogEvent
+    from pymysqlreplication.row_event import DeleteRowsEvent, UpdateRowsEvent, WriteRowsEvent
+
+    stream = BinLogStreamReader(
+        connection_settings=connection_settings,
+        server_id=server_id,
+        only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, HeartbeatLogEvent],
+        slave_heartbeat=CDC_MAX_DELAY_SECONDS,
+        only_schemas=[schema],
+        only_tables=list(tables),
+        log_file=log_file,
+        log_pos=log_pos,
+        resume_stream=log_file is not None,
+        blocking=True,
+        # Without it (and binlog_row_metadata=MINIMAL) columns arrive as UNKNOWN_COL0, UNKNOWN_COL1, ...
+        use_column_name_cache=True,
+    )
+    try:
+        for event in stream:
+            if isinstance(event, HeartbeatLogEvent):
+                yield None
+                continue
+            position = (stream.log_file, stream.log_pos)
+            for row in event.rows:
+                values = row.get('values', row.get('after_values', {}))
+                if any(name.startswith('UNKNOWN_COL') for name in values):
+                    raise RuntimeError(f"Binlog rows of `{event.table}` carry no column names; set "
+                                       f"binlog_row_metadata=FULL or grant SELECT on information_schema.COLUMNS")
+                if isinstance(event, WriteRowsEvent):
+                    yield RowChange('upsert', event.table, row['values'], position)
+                elif isinstance(event, DeleteRowsEvent):
+                    yield RowChange('delete', event.table, row['values'], position)
+                else:
+                    # An update may change the key, so the old key is deleted first
+                    yield RowChange('delete', event.table, row['before_values'], position)
+                    yield RowChange('upsert', event.table, row['after_values'], position)
+    finally:
+        stream.close()
+
+
+def changes_from_file(path):
+    """Replay a recorded or synthetic event stream, one JSON object per line:
+
+    {"op": "insert" | "update" | "delete", "table": ..., "values": {...},
+     "before": {...} (updates only), "log_file": ..., "log_pos": ...}
+    """
+    with open(path) as event_file:
+        for line in event_file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            position = (event.get('log_file'), event.get('log_pos'))
+            if event['op'] == 'update' and event.get('before'):
+                yield RowChange('delete', event['table'], event['before'], position)
+            op = 'delete' if event['op'] == 'delete' else 'upsert'
+            yield RowChange(op, event['table'], event['values'], position)
+
+
+class CdcApplier:
+    """Collect row changes and apply them to SQL Server as batched upserts and deletes.
+
+    Changes are coalesced per primary key in arrival order, so the last change
+    to a key wins and replaying a batch after a crash is harmless. The binlog
+    position is saved only after the batch is committed, and run_cdc only
+    flushes between binlog events so a saved position never splits an event.
+    """
+
+    def __init__(self, mssql_conn, mssql_tables, position_path=POSITION_FILE,
+                 batch_size=CDC_BATCH_SIZE, max_delay=CDC_MAX_DELAY_SECONDS):
+        self.mssql_conn = mssql_conn
+        self.mssql_tables = mssql_tables
+        self.position_path = position_path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.pending = {}
+        self.pending_count = 0
+        self.position = None
+        self.first_pending_at = None
+        self.stats = {'upserted': 0, 'deleted': 0, 'skipped': 0, 'batches': 0}
+        # Changes are coalesced and merged by primary key, so a table without one cannot be replicated
+        keyless = sorted(name for name, table in mssql_tables.items() if not table.primary_key.columns)
+        if keyless:
+            raise ValueError(f"CDC needs a primary key on the SQL Server table; none on: {', '.join(keyless)}")
+        # Binlog rows arrive as dicts, so they are laid out in target column order before converting
+        self.converters = {name: RowConverter([col.name for col in table.columns], table)
+                           for name, table in mssql_tables.items()}
+
+    def add(self, change):
+        mssql_table = self.mssql_tables.get(change.table)
+        if mssql_table is None:
+            return
+        key_names = [col.name for col in mssql_table.primary_key.columns]
+        key = tuple(change.values.get(name) for name in key_names)
+        self.pending.setdefault(change.table, {})[key] = change
+        self.pending_count += 1
+        self.position = change.position
+        if self.first_pending_at is None:
+            self.first_pending_at = time.time()
+
+    def flush_if_due(self):
+        if self.first_pending_at is None:
+            return
+        if self.pending_count >= self.batch_size or time.time() - self.first_pending_at >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch_start = time.time()
+        for table_name, changes in self.pending.items():
+            mssql_table = self.mssql_tables[table_name]
+            key_names = [col.name for col in mssql_table.primary_key.columns]
+            column_names = [col.name for col in mssql_table.columns]
+            converter = self.converters[table_name]
+            metrics = run_metrics.table(table_name)
+
+            convert_start = time.perf_counter()
+            deletes = [key for key, change in changes.items() if change.op == 'delete']
+            upsert_source = [tuple(change.values.get(name) for name in column_names)
+                             for change in changes.values() if change.op == 'upsert']
+            upserts = converter.convert_batch(upsert_source)
+            self.stats['skipped'] += len(upsert_source) - len(upserts)
+            write_start = time.perf_counter()
+            metrics.record('convert', len(upsert_source), write_start - convert_start, estimate_bytes(upserts))
+
+            # Keys that end up upserted are handled by the MERGE, so only pure deletes are sent
+            if deletes:
+                delete_keys(self.mssql_conn, table_name, key_names, deletes, schema=mssql_table.schema or 'dbo')
+            if upserts:
+                upsert_rows(self.mssql_conn, table_name, column_names, key_names, upserts,
+                            schema=mssql_table.schema or 'dbo', identity_insert=has_identity(mssql_table))
+            metrics.record('write', len(upserts) + len(deletes), time.perf_counter() - write_start,
+                           estimate_bytes(upserts))
+            self.stats['deleted'] += len(deletes)
+            self.stats['upserted'] += len(upserts)
+        self.mssql_conn.commit()
+        if self.position is not None and self.position[0] is not None:
+            save_position(self.position, self.position_path)
+
+        self.stats['batches'] += 1
+        lag = time.time() - self.first_pending_at
+        print(f"CDC batch {self.stats['batches']}: {self.pending_count} changes applied in "
+              f"{time.time() - batch_start:.2f}s (oldest waited {lag:.2f}s), position {self.position}")
+        self.pending = {}
+        self.pending_count = 0
+        self.first_pending_at = None
+
+
+def run_cdc(changes, applier):
+    """Feed a change stream into the applier, flushing on size or age; flushes the rest at the end."""
+    for change in changes:
+        # At an event boundary (or heartbeat) every pending change belongs to a fully read event
+        if change is None or change.position[0] is None or change.position != applier.position:
+            applier.flush_if_due()
+        if change is not None:
+            applier.add(change)
+    applier.flush()
+    return applier.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream MySQL binlog row changes into SQL Server.")
+    parser.add_argument('tables', nargs='+', help="tables to replicate")
+    parser.add_argument('--replay', help="apply a recorded JSON-lines event file instead of tailing the binlog")
+    parser.add_argument('--position-file', default=POSITION_FILE)
+    parser.add_argument('--server-id', type=int, default=4201, help="replica server_id used for the binlog dump")
+    parser.add_argument('--report-dir', default=REPORT_DIR, help="folder for the JSON/CSV run report")
+    parser.add_argument('--prometheus-textfile', help="also write the run metrics to this node_exporter textfile")
+    args = parser.parse_args()
+
+    mysql_settings = {'host': 'sever_address', 'port': 3306, 'user': 'test123', 'password': 'test123'}
+    mssql_conn = pyodbc.connect(
+        'DRIVER={ODBC Driver 17 for SQL Server};'
+        'SERVER=ipack-svr-rpt;DATABASE=Report_1;'
+        'Trusted_Connection=yes;'
+    )
+    mssql_engine = create_engine('mssql+pyodbc://', creator=lambda: mssql_conn)
+
+    # Only the replicated tables are reflected; their primary keys drive the upserts
+    mssql_metadata = MetaData()
+    mssql_metadata.reflect(bind=mssql_engine, only=args.tables)
+    mssql_tables = {name: mssql_metadata.tables[name] for name in args.tables}
+
+    applier = CdcApplier(mssql_conn, mssql_tables, position_path=args.position_file)
+    try:
+        if args.replay:
+            changes = changes_from_file(args.replay)
+        else:
+            log_file, log_pos = load_position(args.position_file)
+            changes = changes_from_binlog(mysql_settings, args.server_id, 'hotpack_test', args.tables,
+                                          log_file, log_pos)
+        stats = run_cdc(changes, applier)
+        print(f"CDC finished: {stats}")
+    except KeyboardInterrupt:
+        applier.flush()
+        print(f"CDC stopped: {applier.stats}")
+    finally:
+        mssql_conn.close()
+        # Written however the run ends, so a stopped tail still leaves its convert/write figures
+        run_metrics.write_report('cdc', directory=args.report_dir, prometheus_path=args.prometheus_textfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import contextlib
+import datetime
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+
+import pyodbc
+from sqlalchemy import types as sqltypes
+from sqlalchemy.dialects import mssql
+
+# Backend used when a table has no explicit entry in a script's writer map
+DEFAULT_WRITER = 'fast_executemany'
+
+# Field and row terminators for BULK INSERT files (ASCII unit/record separators)
+FIELD_TERMINATOR = '\x1f'
+ROW_TERMINATOR = '\x1e'
+
+# How a BULK INSERT character file holds an empty string; an empty field is NULL
+EMPTY_STRING = '\x00'
+
+
+def quote_name(name):
+    """Quote a possibly schema-qualified SQL Server name, e.g. dbo.user_tb -> [dbo].[user_tb]."""
+    return '.'.join(f"[{part.strip('[]')}]" for part in name.split('.'))
+
+
+def dbapi_connection(conn):
+    """Return the raw pyodbc connection behind a SQLAlchemy connection (or the connection itself)."""
+    fairy = getattr(conn, 'connection', None)
+    if fairy is not None and hasattr(fairy, 'dbapi_connection'):
+        return fairy.dbapi_connection
+    return conn
+
+
+@contextlib.contextmanager
+def identity_insert_on(cursor, qualified_name):
+    """SET IDENTITY_INSERT ON for the duration of the block, and always back OFF.
+
+    IDENTITY_INSERT is session state that survives a rollback: a pooled
+    connection left with it ON fails the next table's SET (Msg 8107).
+    """
+    cursor.execute(f"SET IDENTITY_INSERT {qualified_name} ON")
+    try:
+        yield
+    finally:
+        cursor.execute(f"SET IDENTITY_INSERT {qualified_name} OFF")
+
+
+def pyodbc_input_size(sql_type):
+    """Map a reflected SQLAlchemy type to a pyodbc setinputsizes entry, or None if unknown."""
+    if isinstance(sql_type, sqltypes.Boolean) or type(sql_type).__name__ == 'BIT':
+        return (pyodbc.SQL_BIT, 0, 0)
+    if type(sql_type).__name__ == 'TINYINT':
+        return (pyodbc.SQL_TINYINT, 0, 0)
+    if isinstance(sql_type, sqltypes.BigInteger):
+        return (pyodbc.SQL_BIGINT, 0, 0)
+    if isinstance(sql_type, sqltypes.SmallInteger):
+        return (pyodbc.SQL_SMALLINT, 0, 0)
+    if isinstance(sql_type, sqltypes.Integer):
+        return (pyodbc.SQL_INTEGER, 0, 0)
+    if isinstance(sql_type, sqltypes.Float):
+        return (pyodbc.SQL_DOUBLE, 0, 0)
+    if isinstance(sql_type, sqltypes.Numeric):
+        return (pyodbc.SQL_DECIMAL, sql_type.precision or 18, sql_type.scale or 0)
+    if isinstance(sql_type, sqltypes.DateTime):
+        # DATETIME keeps 3 fractional digits, DATETIME2 up to 7
+        scale = 3 if type(sql_type).__name__ == 'DATETIME' else 7
+        return (pyodbc.SQL_TYPE_TIMESTAMP, 20 + scale, scale)
+    if isinstance(sql_type, sqltypes.Date):
+        return (pyodbc.SQL_TYPE_DATE, 0, 0)
+    if isinstance(sql_type, sqltypes.Time):
+        return (pyodbc.SQL_SS_TIME2, 16, 7)
+    if isinstance(sql_type, (sqltypes.LargeBinary, sqltypes.VARBINARY, sqltypes.BINARY)):
+        return (pyodbc.SQL_VARBINARY, sql_type.length or 0, 0)
+    if isinstance(sql_type, sqltypes.String):
+        # Size 0 means (MAX); unicode types bind as wide strings
+        wide = isinstance(sql_type, sqltypes.Unicode) or type(sql_type).__name__ in ('NVARCHAR', 'NCHAR', 'NTEXT')
+        return (pyodbc.SQL_WVARCHAR if wide else pyodbc.SQL_VARCHAR, sql_type.length or 0, 0)
+    return None
+
+
+class BulkWriter(ABC):
+    """Insert batches of tuples (in column order) into one SQL Server table.
+
+    Writers never commit; the caller commits after each batch as before.
+    identity_insert wraps each batch in SET IDENTITY_INSERT ON/OFF so explicit
+    values can be written to an IDENTITY column (SQLAlchemy's insert() does
+    the same automatically). tablock adds WITH (TABLOCK), which together with a
+    heap target (see swap_reload.py) lets INSERT ... SELECT be minimally logged.
+    """
+
+    name = None
+
+    def __init__(self, table_name, column_names, column_types=None, schema='dbo', identity_insert=False,
+                 tablock=False):
+        self.table_name = table_name
+        self.schema = schema
+        self.identity_insert = identity_insert
+        self.tablock = tablock
+        self.column_names = list(column_names)
+        self.column_types = list(column_types) if column_types is not None else None
+        self.qualified_name = quote_name(f"{schema}.{table_name}" if schema and '.' not in table_name else table_name)
+        column_list = ', '.join(quote_name(name) for name in self.column_names)
+        placeholders = ', '.join('?' for _ in self.column_names)
+        self.insert_target = f"{self.qualified_name} WITH (TABLOCK)" if tablock else self.qualified_name
+        self.insert_sql = f"INSERT INTO {self.insert_target} ({column_list}) VALUES ({placeholders})"
+
+    def write(self, conn, rows):
+        if not rows:
+            return
+        cursor = dbapi_connection(conn).cursor()
+        try:
+            if self.identity_insert:
+                with identity_insert_on(cursor, self.qualified_name):
+                    self.write_batch(cursor, rows)
+            else:
+                self.write_batch(cursor, rows)
+        finally:
+            cursor.close()
+
+    @abstractmethod
+    def write_batch(self, cursor, rows):
+        """Send one non-empty batch through an open cursor."""
+
+
+class ExecutemanyWriter(BulkWriter):
+    """Plain cursor.executemany: one round trip per row, kept as the baseline."""
+
+    name = 'executemany'
+
+    def write_batch(self, cursor, rows):
+        cursor.executemany(self.insert_sql, rows)
+
+
+class FastExecutemanyWriter(BulkWriter):
+    """pyodbc fast_executemany: the whole batch is sent as one parameter array."""
+
+    name = 'fast_executemany'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Explicit input sizes stop pyodbc from guessing (and re-binding) per column
+        self.input_sizes = None
+        if self.column_types is not None:
+            sizes = [pyodbc_input_size(sql_type) for sql_type in self.column_types]
+            if all(size is not None for size in sizes):
+                self.input_sizes = sizes
+
+    def write_batch(self, cursor, rows):
+        cursor.fast_executemany = True
+        if self.input_sizes is not None:
+            cursor.setinputsizes(self.input_sizes)
+        cursor.executemany(self.insert_sql, rows)
+
+
+class TvpWriter(BulkWriter):
+    """Send the batch as one table-valued parameter: INSERT ... SELECT ... FROM ?.
+
+    Needs the reflected column types to create the table type on first use.
+    A table type left by an earlier run is checked against the target table
+    and recreated when its columns no longer match (e.g. after a schema change).
+    """
+
+    name = 'tvp'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.column_types is None:
+            raise ValueError("TVP writer needs the column types of the target table")
+        self.type_name = f"{self.table_name.split('.')[-1]}_tvp"
+        column_list = ', '.join(quote_name(name) for name in self.column_names)
+        self.insert_sql = f"INSERT INTO {self.insert_target} ({column_list}) SELECT {column_list} FROM ?"
+        self.type_created = False
+        # Chunk workers share one writer; only one of them checks and creates the type
+        self.type_lock = threading.Lock()
+
+    def type_matches_target(self, cursor, type_columns):
+        """True if the table type has the writer's columns, in order, with the target table's types."""
+        if [row[0] for row in type_columns] != self.column_names:
+            return False
+        cursor.execute(
+            "SELECT name, system_type_id, max_length, precision, scale FROM sys.columns "
+            "WHERE object_id = OBJECT_ID(?)", [self.qualified_name]
+        )
+        target_columns = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        return all(tuple(row[1:]) == target_columns.get(row[0]) for row in type_columns)
+
+    def ensure_type(self, cursor):
+        qualified_type = f"{quote_name(self.schema)}.{quote_name(self.type_name)}"
+        cursor.execute(
+            "SELECT c.name, c.system_type_id, c.max_length, c.precision, c.scale FROM sys.table_types tt "
+            "JOIN sys.columns c ON c.object_id = tt.type_table_object_id "
+            "WHERE tt.schema_id = SCHEMA_ID(?) AND tt.name = ? ORDER BY c.column_id", [self.schema, self.type_name]
+        )
+        type_columns = [tuple(row) for row in cursor.fetchall()]
+        if type_columns:
+            if self.type_matches_target(cursor, type_columns):
+                self.type_created = True
+                return
+            print(f"Table type {qualified_type} does not match {self.qualified_name}; recreating it.")
+            cursor.execute(f"DROP TYPE {qualified_type}")
+        columns = ', '.join(
+            f"{quote_name(name)} {sql_type.compile(dialect=mssql.dialect())} NULL"
+            for name, sql_type in zip(self.column_names, self.column_types)
+        )
+        cursor.execute(
+            f"IF TYPE_ID('{self.schema}.{self.type_name}') IS NULL "
+            f"EXEC('CREATE TYPE {qualified_type} AS TABLE ({columns})')"
+        )
+        self.type_created = True
+
+    def write_batch(self, cursor, rows):
+        if not self.type_created:
+            with self.type_lock:
+                if not self.type_created:
+                    self.ensure_type(cursor)
+        # pyodbc takes the table type name and schema as the first two list items
+        cursor.execute(self.insert_sql, [[self.type_name, self.schema] + [tuple(row) for row in rows]])
+
+
+class BulkInsertWriter(BulkWriter):
+    """Write the batch to a delimited flat file and load it with BULK INSERT (BCP-style).
+
+    local_dir is where this process writes the file; server_dir is the same
+    folder as seen by the SQL Server service (e.g. a UNC share). Rows must
+    hold every table column in table order. As in bcp character files, NULL
+    is an empty field and an empty string a single NUL character, so KEEPNULLS
+    loads each as it was. Binary columns are not supported by this backend.
+    """
+
+    name = 'bulk_insert'
+
+    def __init__(self, *args, local_dir=None, server_dir=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.local_dir = local_dir or os.environ.get('BULK_INSERT_LOCAL_DIR', '.')
+        self.server_dir = server_dir or os.environ.get('BULK_INSERT_SERVER_DIR', self.local_dir)
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, datetime.datetime):
+            return value.isoformat(sep=' ')
+        if isinstance(value, (bytes, bytearray)):
+            raise ValueError("BULK INSERT writer does not support binary values")
+        text_value = str(value)
+        if FIELD_TERMINATOR in text_value or ROW_TERMINATOR in text_value:
+            raise ValueError("Value contains a BULK INSERT terminator character")
+        if EMPTY_STRING in text_value:
+            raise ValueError("Value contains a NUL character, which marks an empty string in a BULK INSERT file")
+        return text_value or EMPTY_STRING
+
+    def write(self, conn, rows):
+        # BULK INSERT ignores SET IDENTITY_INSERT (KEEPIDENTITY is used instead), so no identity wrapper
+        if not rows:
+            return
+        cursor = dbapi_connection(conn).cursor()
+        try:
+            self.write_batch(cursor, rows)
+        finally:
+            cursor.close()
+
+    def write_batch(self, cursor, rows):
+        file_name = f"{self.table_name.split('.')[-1]}_{uuid.uuid4().hex}.dat"
+        local_path = os.path.join(self.local_dir, file_name)
+        server_path = self.server_dir.rstrip('\\/') + ('\\' if '\\' in self.server_dir else '/') + file_name
+        with open(local_path, 'w', encoding='utf-8', newline='') as data_file:
+            for row in rows:
+                data_file.write(FIELD_TERMINATOR.join(self.format_value(value) for value in row))
+                data_file.write(ROW_TERMINATOR)
+        keep_identity = ', KEEPIDENTITY' if self.identity_insert else ''
+        tablock = ', TABLOCK' if self.tablock else ''
+        try:
+            cursor.execute(
+                f"BULK INSERT {self.qualified_name} FROM '{server_path}' WITH ("
+                f"DATAFILETYPE = 'char', CODEPAGE = '65001', "
+                f"FIELDTERMINATOR = '0x1f', ROWTERMINATOR = '0x1e', KEEPNULLS{tablock}{keep_identity})"
+            )
+        finally:
+            os.remove(local_path)
+
+
+WRITER_BACKENDS = {
+    writer.name: writer
+    for writer in (ExecutemanyWriter, FastExecutemanyWriter, TvpWriter, BulkInsertWriter)
+}
+
+
+def has_identity(mssql_table):
+    """True if the reflected SQL Server table has an IDENTITY column."""
+    return any(getattr(col, 'identity', None) is not None for col in mssql_table.columns)
+
+
+def make_writer(backend, mssql_table, **options):
+    """Create a writer for a reflected SQL Server table."""
+    if backend not in WRITER_BACKENDS:
+        raise ValueError(f"Unknown writer backend {backend!r}; choose one of {sorted(WRITER_BACKENDS)}")
+    options.setdefault('identity_insert', has_identity(mssql_table))
+    return WRITER_BACKENDS[backend](
+        mssql_table.name,
+        [col.name for col in mssql_table.columns],
+        [col.type for col in mssql_table.columns],
+        schema=mssql_table.schema or 'dbo',
+        **options,
+    )
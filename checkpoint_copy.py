@@ -0,0 +1,152 @@
+import datetime
+import json
+import os
+import time
+from decimal import Decimal
+
+import pyodbc
+from sqlalchemy import delete, text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from copy_metrics import estimate_bytes, run_metrics
+from mysql_pushdown import source_query
+from stream_copy import AdaptiveBatchSizer, iter_keyset_batches, keyset_after
+
+# Folder the rejected rows are written to, one JSON-lines file per table
+REJECT_DIR = 'rejects'
+
+# Errors caused by the rows themselves; anything else (lost connection, deadlock) fails the batch as before
+ROW_ERRORS = (pyodbc.DataError, pyodbc.IntegrityError, DataError, IntegrityError)
+
+
+def json_value(value):
+    if isinstance(value, (datetime.date, datetime.time, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return value
+
+
+class RejectFile:
+    """Append rows SQL Server refused to rejects/<table>.jsonl with the error message."""
+
+    def __init__(self, table_name, column_names, directory=REJECT_DIR):
+        self.table_name = table_name
+        self.column_names = list(column_names)
+        self.path = os.path.join(directory, f"{table_name}.jsonl")
+        self.directory = directory
+        self.count = 0
+
+    def add(self, row, error):
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            'table': self.table_name,
+            'row': {name: json_value(value) for name, value in zip(self.column_names, row)},
+            'error': str(error).splitlines()[0] if str(error) else type(error).__name__,
+            'rejected_at': datetime.datetime.now().isoformat(),
+        }
+        with open(self.path, 'a', encoding='utf-8') as reject_file:
+            reject_file.write(json.dumps(record) + '\n')
+        self.count += 1
+
+
+def can_resume(state, table_name):
+    """True if the table has an unfinished copy to continue: a committed key or a recorded chunk plan."""
+    checkpoint = state.get_checkpoint(table_name)
+    return (checkpoint is not None and checkpoint[0] == 'in_progress'
+            and (checkpoint[1] is not None or bool(state.get_chunk_plan(table_name))))
+
+
+def start_checkpoint(state, table_name):
+    """Record a fresh copy of the table, dropping any earlier progress."""
+    state.set_chunk_plan(table_name, [])
+    state.set_checkpoint(table_name, 'in_progress')
+
+
+def write_batch_bisecting(conn, write, rows, rejects, metrics=None):
+    """Write and commit rows; if SQL Server refuses the batch, split it in halves until the bad rows are isolated.
+
+    Good rows are committed, each bad row goes to the reject file. Returns
+    the number of rows loaded; every split is counted as a retry in metrics.
+    """
+    try:
+        write(conn, rows)
+        conn.execute(text("COMMIT"))
+        return len(rows)
+    except ROW_ERRORS as e:
+        conn.rollback()
+        if len(rows) == 1:
+            rejects.add(rows[0], e)
+            return 0
+    if metrics is not None:
+        metrics.retry()
+    middle = len(rows) // 2
+    return (write_batch_bisecting(conn, write, rows[:middle], rejects, metrics)
+            + write_batch_bisecting(conn, write, rows[middle:], rejects, metrics))
+
+
+def copy_table_resumable(mysql_conn, mssql_conn, mysql_table, mssql_table, key_columns, state,
+                         batch_size=5000, writer=None, clean_utf8=False, checkpoint_name=None, pushdown=False):
+    """Copy a table in key order, checkpointing the last committed key after every batch.
+
+    If the table has an unfinished checkpoint the copy continues after its
+    key; rows past that key are deleted on the target first, since the run
+    may have died between the SQL Server commit and the checkpoint write.
+    Returns the stats dict of copy_table_streaming plus rejected rows.
+    """
+    table_name = mssql_table.name
+    checkpoint_name = checkpoint_name or table_name
+    column_names = [col.name for col in mssql_table.columns]
+    mssql_keys = [mssql_table.c[col.name] for col in key_columns]
+    query, converter = source_query(mysql_conn, mysql_table, mssql_table, clean_utf8=clean_utf8, pushdown=pushdown,
+                                    key_columns=key_columns)
+    rejects = RejectFile(checkpoint_name, column_names)
+    stats = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0, 'rejected': 0}
+    metrics = run_metrics.table(mysql_table.name)
+
+    if writer is not None:
+        write = writer.write
+    else:
+        def write(conn, rows):
+            conn.execute(mssql_table.insert(), [dict(zip(column_names, row)) for row in rows])
+
+    checkpoint = state.get_checkpoint(checkpoint_name)
+    start_after = None
+    if checkpoint is not None and checkpoint[0] == 'in_progress' and checkpoint[1] is not None:
+        _, start_after, stats['copied'] = checkpoint
+        mssql_conn.execute(delete(mssql_table).where(keyset_after(mssql_keys, start_after)))
+        mssql_conn.execute(text("COMMIT"))
+        print(f"Table `{table_name}`: resuming after key {start_after} ({stats['copied']} rows already copied)")
+    else:
+        state.set_checkpoint(checkpoint_name, 'in_progress')
+
+    sizer = AdaptiveBatchSizer(initial=batch_size, maximum=batch_size)
+    copy_start = time.time()
+    stage_start = time.perf_counter()
+    for rows, last_key in iter_keyset_batches(mysql_conn, mysql_table, key_columns, sizer, start_after=start_after,
+                                              query=query):
+        read_end = time.perf_counter()
+        metrics.record('read', len(rows), read_end - stage_start, estimate_bytes(rows))
+        batch = converter.convert_batch(rows)
+        stats['skipped'] += len(rows) - len(batch)
+        convert_end = time.perf_counter()
+        metrics.record('convert', len(rows), convert_end - read_end, estimate_bytes(batch))
+        if batch:
+            loaded = write_batch_bisecting(mssql_conn, write, batch, rejects, metrics)
+            stats['copied'] += loaded
+            stats['rejected'] += len(batch) - loaded
+        state.set_checkpoint(checkpoint_name, 'in_progress', last_key, stats['copied'])
+        stats['batches'] += 1
+        stage_start = time.perf_counter()
+        metrics.record('write', len(batch), stage_start - convert_end, estimate_bytes(batch))
+
+    state.set_checkpoint(checkpoint_name, 'done', None, stats['copied'])
+    stats['truncated'] = sum(converter.truncated.values())
+    converter.report_truncations()
+    metrics.finish()
+    if rejects.count:
+        print(f"Table `{table_name}`: {rejects.count} rows rejected, see {rejects.path}")
+    elapsed = time.time() - copy_start
+    rate = stats['copied'] / elapsed if elapsed > 0 else float('inf')
+    print(f"Table `{table_name}`: {stats['copied']} rows copied in {elapsed:.2f}s ({rate:.0f} rows/s)")
+    return stats
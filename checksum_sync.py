@@ -0,0 +1,335 @@
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+
+from copy_metrics import estimate_bytes, run_metrics
+from mssql_upsert import MERGE_BATCH_SIZE, delete_keys, upsert_rows
+
+# Both servers render every value as text, hash the row with MD5 and sum the first
+# 32 bits of the hash per key bucket; only buckets whose (count, sum) differ are
+# drilled into. Where this collation exists (SQL Server 2019+) SQL Server hashes the
+# text as UTF-8; SQL Server 2016/2017 hash it as NVARCHAR (UTF-16LE) and MySQL
+# converts to utf16le to match. Older servers are rejected: HASHBYTES stops at 8000
+# bytes of input there.
+MSSQL_UTF8_COLLATION = 'Latin1_General_100_BIN2_UTF8'
+MIN_MSSQL_MAJOR_VERSION = 13
+NULL_MARKER = '#NULL#'
+
+# Width of the top-level key buckets, the bucket width at which rows are compared
+# directly, and how much narrower each drill-down level is
+CHUNK_WIDTH = 100000
+LEAF_WIDTH = 1000
+DRILL_FANOUT = 10
+
+# CHAR columns become NCHAR/CHAR, which SQL Server returns space-padded while MySQL strips the padding
+FIXED_STRING_TYPES = {'char'}
+NUMERIC_TYPES = {'decimal', 'numeric'}
+STRING_TYPES = {'char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum', 'set', 'json'}
+BINARY_TYPES = {'binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob'}
+INTEGER_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint'}
+
+
+class TableSpec:
+    """Columns to compare for one table; column_types holds the MySQL DATA_TYPE of each column."""
+
+    def __init__(self, mysql_name, mssql_name, key, columns, column_types, mssql_schema='dbo'):
+        self.mysql_name = mysql_name
+        self.mssql_name = mssql_name
+        self.mssql_schema = mssql_schema
+        self.key = key
+        self.columns = list(columns)
+        self.column_types = column_types
+        self.key_index = self.columns.index(key)
+        # 'utf8' or 'utf16': how row text is encoded before hashing (see mssql_hash_encoding)
+        self.hash_encoding = 'utf8'
+
+
+def load_table_spec(mysql_conn, mysql_name, mssql_name=None, columns=None, key=None, mssql_schema='dbo'):
+    """Build a TableSpec from information_schema; the key defaults to the single integer primary key."""
+    cursor = mysql_conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, COLUMN_KEY FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (mysql_name,),
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    column_types = {name: data_type.lower() for name, data_type, _ in rows}
+    if key is None:
+        primary_key = [name for name, _, column_key in rows if column_key == 'PRI']
+        if len(primary_key) != 1:
+            raise ValueError(f"Table {mysql_name} needs a single-column primary key for checksum sync")
+        key = primary_key[0]
+    if column_types.get(key) not in INTEGER_TYPES:
+        raise ValueError(f"Checksum sync key {mysql_name}.{key} must be an integer column")
+    columns = list(columns) if columns else [name for name, _, _ in rows]
+    if key not in columns:
+        columns.insert(0, key)
+    return TableSpec(mysql_name, mssql_name or mysql_name, key, columns, column_types, mssql_schema)
+
+
+def mssql_hash_encoding(mssql_conn):
+    """'utf8' when the server has MSSQL_UTF8_COLLATION, else 'utf16'; raises RuntimeError before SQL Server 2016."""
+    (has_utf8,), = fetch_range_rows(
+        mssql_conn, f"SELECT COUNT(*) FROM sys.fn_helpcollations() WHERE name = '{MSSQL_UTF8_COLLATION}'")
+    if has_utf8:
+        return 'utf8'
+    (major_version,), = fetch_range_rows(mssql_conn, "SELECT CAST(SERVERPROPERTY('ProductMajorVersion') AS INT)")
+    if (major_version or 0) < MIN_MSSQL_MAJOR_VERSION:
+        raise RuntimeError(f"Checksum sync needs SQL Server 2016 or later (major version "
+                           f"{MIN_MSSQL_MAJOR_VERSION}); this server reports {major_version}")
+    return 'utf16'
+
+
+def mysql_value_expr(name, data_type):
+    """MySQL expression rendering a column as the same text SQL Server renders."""
+    column = f"`{name}`"
+    if data_type in ('datetime', 'timestamp'):
+        expr = f"DATE_FORMAT({column}, '%Y-%m-%d %H:%i:%s')"
+    elif data_type == 'date':
+        expr = f"DATE_FORMAT({column}, '%Y-%m-%d')"
+    elif data_type == 'time':
+        expr = f"TIME_FORMAT({column}, '%H:%i:%s')"
+    elif data_type == 'bit':
+        # CAST(bit AS CHAR) gives the raw bytes (b'\x01'); + 0 makes it the number SQL Server's BIT/BIGINT holds
+        expr = f"CAST({column} + 0 AS CHAR)"
+    elif data_type in ('float', 'double'):
+        expr = f"CAST(CAST({column} AS DECIMAL(38,6)) AS CHAR)"
+    elif data_type in BINARY_TYPES:
+        expr = f"HEX({column})"
+    elif data_type in FIXED_STRING_TYPES:
+        expr = f"RTRIM({column})"
+    elif data_type in STRING_TYPES:
+        expr = column
+    else:
+        expr = f"CAST({column} AS CHAR)"
+    return f"COALESCE({expr}, '{NULL_MARKER}')"
+
+
+def mssql_value_expr(name, data_type):
+    """SQL Server expression rendering a column as the same text MySQL renders."""
+    column = f"[{name}]"
+    if data_type in ('datetime', 'timestamp'):
+        expr = f"CONVERT(VARCHAR(19), {column}, 120)"
+    elif data_type == 'date':
+        expr = f"CONVERT(VARCHAR(10), {column}, 23)"
+    elif data_type == 'time':
+        expr = f"CONVERT(VARCHAR(8), {column}, 108)"
+    elif data_type in ('float', 'double'):
+        expr = f"CAST(CAST({column} AS DECIMAL(38,6)) AS VARCHAR(50))"
+    elif data_type in BINARY_TYPES:
+        expr = f"CONVERT(VARCHAR(MAX), {column}, 2)"
+    elif data_type in FIXED_STRING_TYPES:
+        expr = f"RTRIM(CAST({column} AS NVARCHAR(MAX)))"
+    elif data_type in STRING_TYPES:
+        expr = f"CAST({column} AS NVARCHAR(MAX))"
+    else:
+        expr = f"CAST({column} AS VARCHAR(100))"
+    return f"COALESCE({expr}, '{NULL_MARKER}')"
+
+
+def mysql_row_hash(spec):
+    values = ', '.join(mysql_value_expr(name, spec.column_types.get(name)) for name in spec.columns)
+    charset = 'utf16le' if spec.hash_encoding == 'utf16' else 'utf8mb4'
+    return f"CAST(CONV(LEFT(MD5(CONVERT(CONCAT_WS('|', {values}) USING {charset})), 8), 16, 10) AS UNSIGNED)"
+
+
+def mssql_row_hash(spec):
+    # CONCAT with explicit separators rather than CONCAT_WS (SQL Server 2017+); no value is NULL after COALESCE
+    values = ", '|', ".join(mssql_value_expr(name, spec.column_types.get(name)) for name in spec.columns)
+    if spec.hash_encoding == 'utf16':
+        text_value = f"CONVERT(NVARCHAR(MAX), CONCAT({values}))"
+    else:
+        text_value = f"CONVERT(VARCHAR(MAX), CONCAT({values}) COLLATE {MSSQL_UTF8_COLLATION})"
+    return f"CAST(CONVERT(BINARY(4), HASHBYTES('MD5', {text_value})) AS BIGINT)"
+
+
+def range_where(key, lower, upper):
+    conditions = []
+    if lower is not None:
+        conditions.append(f"{key} >= {int(lower)}")
+    if upper is not None:
+        conditions.append(f"{key} < {int(upper)}")
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+
+def mysql_bucket_sql(spec, width, lower=None, upper=None):
+    key = f"`{spec.key}`"
+    bucket = f"FLOOR({key} / {int(width)})"
+    return (f"SELECT {bucket} AS bucket, COUNT(*), SUM({mysql_row_hash(spec)}) FROM `{spec.mysql_name}`"
+            f"{range_where(key, lower, upper)} GROUP BY bucket")
+
+
+def mssql_bucket_sql(spec, width, lower=None, upper=None):
+    key = f"[{spec.key}]"
+    bucket = f"FLOOR({key} / {int(width)}.0)"
+    return (f"SELECT {bucket}, COUNT(*), SUM({mssql_row_hash(spec)}) "
+            f"FROM [{spec.mssql_schema}].[{spec.mssql_name}]{range_where(key, lower, upper)} GROUP BY {bucket}")
+
+
+def fetch_buckets(conn, sql):
+    """Run a bucket query and return {bucket: (row_count, hash_sum)}."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        return {int(bucket): (int(count), int(hash_sum or 0)) for bucket, count, hash_sum in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def differing_buckets(mysql_conn, mssql_conn, spec, width, lower=None, upper=None):
+    """Return the (lower, upper) key ranges of width `width` whose checksums differ."""
+    source = fetch_buckets(mysql_conn, mysql_bucket_sql(spec, width, lower, upper))
+    target = fetch_buckets(mssql_conn, mssql_bucket_sql(spec, width, lower, upper))
+    ranges = []
+    for bucket in sorted(set(source) | set(target)):
+        if source.get(bucket) != target.get(bucket):
+            # Clip to the parent range in case width does not divide it evenly
+            range_lower = bucket * width if lower is None else max(bucket * width, lower)
+            range_upper = (bucket + 1) * width if upper is None else min((bucket + 1) * width, upper)
+            ranges.append((range_lower, range_upper))
+    return ranges
+
+
+def fetch_range_rows(conn, sql):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        return [tuple(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def mysql_rows_sql(spec, lower, upper, raw=False):
+    """SELECT of the rendered values of one MySQL key range, after the raw column values when raw is set."""
+    rendered = ', '.join(mysql_value_expr(name, spec.column_types.get(name)) for name in spec.columns)
+    raw_columns = ''.join(f"`{name}`, " for name in spec.columns) if raw else ''
+    return (f"SELECT {raw_columns}{rendered} FROM `{spec.mysql_name}`"
+            f"{range_where(f'`{spec.key}`', lower, upper)}")
+
+
+def mssql_rows_sql(spec, lower, upper):
+    """SELECT of the rendered values of one SQL Server key range."""
+    rendered = ', '.join(mssql_value_expr(name, spec.column_types.get(name)) for name in spec.columns)
+    return (f"SELECT {rendered} FROM [{spec.mssql_schema}].[{spec.mssql_name}]"
+            f"{range_where(f'[{spec.key}]', lower, upper)}")
+
+
+def values_match(data_type, source, target):
+    """Compare two rendered values; decimals that differ only in scale ('1.2300', '1.23') match."""
+    if source == target:
+        return True
+    if data_type in NUMERIC_TYPES and NULL_MARKER not in (source, target):
+        try:
+            return Decimal(source) == Decimal(target)
+        except (InvalidOperation, TypeError):
+            return False
+    return False
+
+
+def differing_columns(spec, source, target):
+    """Names of the columns whose rendered values differ between two rows."""
+    return [name for name, source_value, target_value in zip(spec.columns, source, target)
+            if not values_match(spec.column_types.get(name), source_value, target_value)]
+
+
+def compare_range(mysql_conn, mssql_conn, spec, lower, upper):
+    """Compare the rows of one key range. Returns (inserts, updates, delete_keys).
+
+    Rows are compared on the values the checksums hash (padding, BIT and
+    TIME normalised), so a row the checksums saw as equal is never updated;
+    inserts and updates carry the raw MySQL values.
+    """
+    width = len(spec.columns)
+    source_rows = fetch_range_rows(mysql_conn, mysql_rows_sql(spec, lower, upper, raw=True))
+    target_rows = fetch_range_rows(mssql_conn, mssql_rows_sql(spec, lower, upper))
+    source = {row[width + spec.key_index]: row for row in source_rows}
+    target = {row[spec.key_index]: row for row in target_rows}
+    inserts = [row[:width] for key, row in source.items() if key not in target]
+    updates = [row[:width] for key, row in source.items()
+               if key in target and differing_columns(spec, row[width:], target[key])]
+    deletes = [int(key) for key in target if key not in source]
+    return inserts, updates, deletes
+
+
+def find_differing_ranges(mysql_conn, mssql_conn, spec, lower=None, upper=None, chunk_width=CHUNK_WIDTH,
+                          leaf_width=LEAF_WIDTH, fanout=DRILL_FANOUT):
+    """Yield the (lower, upper) leaf ranges whose checksums differ, drilling down from buckets of chunk_width."""
+    pending = [(lower, upper, chunk_width)]
+    while pending:
+        lower, upper, width = pending.pop()
+        for range_lower, range_upper in differing_buckets(mysql_conn, mssql_conn, spec, width, lower, upper):
+            if width > leaf_width:
+                pending.append((range_lower, range_upper, max(width // fanout, leaf_width)))
+            else:
+                yield range_lower, range_upper
+
+
+def find_changes(mysql_conn, mssql_conn, spec, chunk_width=CHUNK_WIDTH, leaf_width=LEAF_WIDTH, fanout=DRILL_FANOUT):
+    """Yield (inserts, updates, delete_keys) for every leaf range whose checksum differs."""
+    for range_lower, range_upper in find_differing_ranges(mysql_conn, mssql_conn, spec, chunk_width=chunk_width,
+                                                          leaf_width=leaf_width, fanout=fanout):
+        yield compare_range(mysql_conn, mssql_conn, spec, range_lower, range_upper)
+
+
+def sync_table(mysql_conn, mssql_conn, spec, identity_insert=False, chunk_width=CHUNK_WIDTH,
+               leaf_width=LEAF_WIDTH, batch_size=MERGE_BATCH_SIZE, writer=None):
+    """Make the SQL Server table match MySQL, touching only ranges whose checksums differ.
+
+    Changes are applied with batched MERGE/DELETE statements and committed per
+    batch. With a bulk writer (columns in spec.columns order), rows missing
+    from SQL Server are inserted through it and only changed rows are
+    merged. Returns a dict of inserted, updated and deleted row counts.
+    """
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'ranges': 0}
+    metrics = run_metrics.table(spec.mysql_name)
+    spec.hash_encoding = mssql_hash_encoding(mssql_conn)
+    new_rows = []
+    upserts = []
+    deletes = []
+
+    def flush(force=False):
+        if new_rows and (force or len(new_rows) >= batch_size):
+            start = time.perf_counter()
+            writer.write(mssql_conn, new_rows)
+            mssql_conn.commit()
+            metrics.record('write', len(new_rows), time.perf_counter() - start, estimate_bytes(new_rows))
+            new_rows.clear()
+        if upserts and (force or len(upserts) >= batch_size):
+            start = time.perf_counter()
+            upsert_rows(mssql_conn, spec.mssql_name, spec.columns, [spec.key], upserts,
+                        schema=spec.mssql_schema, identity_insert=identity_insert, batch_size=batch_size)
+            mssql_conn.commit()
+            metrics.record('write', len(upserts), time.perf_counter() - start, estimate_bytes(upserts))
+            upserts.clear()
+        if deletes and (force or len(deletes) >= batch_size):
+            start = time.perf_counter()
+            delete_keys(mssql_conn, spec.mssql_name, [spec.key], [(key,) for key in deletes],
+                        schema=spec.mssql_schema, batch_size=batch_size)
+            mssql_conn.commit()
+            metrics.record('delete', len(deletes), time.perf_counter() - start)
+            deletes.clear()
+
+    # 'compare' covers the checksum queries and the row fetches that led to each differing leaf range
+    compare_start = time.perf_counter()
+    for inserts, updates, delete_list in find_changes(mysql_conn, mssql_conn, spec, chunk_width, leaf_width):
+        changed = inserts + updates
+        metrics.record('compare', len(changed) + len(delete_list), time.perf_counter() - compare_start,
+                       estimate_bytes(changed))
+        stats['ranges'] += 1
+        stats['inserted'] += len(inserts)
+        stats['updated'] += len(updates)
+        stats['deleted'] += len(delete_list)
+        (new_rows if writer is not None else upserts).extend(inserts)
+        upserts.extend(updates)
+        deletes.extend(delete_list)
+        flush()
+        compare_start = time.perf_counter()
+    flush(force=True)
+    metrics.finish()
+
+    logging.info(f"Checksum sync of {spec.mssql_name}: {stats['ranges']} differing ranges, "
+                 f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['deleted']} deleted.")
+    return stats
@@ -0,0 +1,203 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from sqlalchemy import and_, delete, func, select, text
+
+from copy_metrics import estimate_bytes, run_metrics
+from mysql_pushdown import source_query
+from stream_copy import DEFAULT_BATCH_SIZE, iter_mysql_batches
+
+# Attempts per chunk before the table copy is reported as failed
+CHUNK_RETRIES = 3
+
+# Key values pk_ranges_minmax can split into equal widths
+NUMERIC_KEY_TYPES = (int, float, Decimal)
+
+
+def single_key_column(mysql_table):
+    """Return the single primary key column, or None for tables without one (or with a composite key)."""
+    key_columns = list(mysql_table.primary_key.columns)
+    return key_columns[0] if len(key_columns) == 1 else None
+
+
+def ranges_from_split_points(split_points):
+    """Turn sorted split points into disjoint half-open ranges that cover every key.
+
+    The first range has no lower bound and the last no upper bound, so rows
+    below the sampled minimum or above the maximum still land in a chunk.
+    """
+    bounds = [None] + sorted(set(split_points)) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def pk_ranges_minmax(mysql_conn, mysql_table, key_column, chunk_count, total_rows=None):
+    """Split a numeric key into equal-width ranges between MIN(key) and MAX(key).
+
+    Keys that cannot be divided into widths (strings, dates, binary) are
+    split with pk_ranges_sampled instead.
+    """
+    low, high = mysql_conn.execute(select(func.min(key_column), func.max(key_column)).select_from(mysql_table)).one()
+    if low is None or chunk_count <= 1 or high == low:
+        return [(None, None)]
+    if not all(isinstance(value, NUMERIC_KEY_TYPES) and not isinstance(value, bool) for value in (low, high)):
+        return pk_ranges_sampled(mysql_conn, mysql_table, key_column, chunk_count, total_rows)
+    step = (high - low) / chunk_count
+    split_points = [low + step * i for i in range(1, chunk_count)]
+    if isinstance(low, int):
+        split_points = [int(point) for point in split_points]
+    return ranges_from_split_points(point for point in split_points if low < point <= high)
+
+
+def pk_ranges_sampled(mysql_conn, mysql_table, key_column, chunk_count, total_rows=None):
+    """Split any orderable key at row-count quantiles, so skewed keys give equal-sized chunks.
+
+    Each split point is one `ORDER BY key LIMIT 1 OFFSET n` lookup on the key index.
+    """
+    if total_rows is None:
+        total_rows = mysql_conn.execute(select(func.count()).select_from(mysql_table)).scalar()
+    if not total_rows or chunk_count <= 1:
+        return [(None, None)]
+    split_points = []
+    for i in range(1, chunk_count):
+        offset = total_rows * i // chunk_count
+        point = mysql_conn.execute(
+            select(key_column).order_by(key_column).limit(1).offset(offset)
+        ).scalar()
+        if point is not None:
+            split_points.append(point)
+    return ranges_from_split_points(split_points)
+
+
+def range_condition(key_column, key_range):
+    """`lower <= key < upper`, leaving out the open ends."""
+    lower, upper = key_range
+    conditions = []
+    if lower is not None:
+        conditions.append(key_column >= lower)
+    if upper is not None:
+        conditions.append(key_column < upper)
+    return and_(*conditions)
+
+
+def copy_chunk(mysql_engine, mssql_engine, mysql_table, mssql_table, key_range, writer, converter,
+               batch_size=DEFAULT_BATCH_SIZE, retries=CHUNK_RETRIES, clear_first=False, query=None):
+    """Copy one key range in a single SQL Server transaction, retrying on failure.
+
+    Before each retry the range is deleted on the target, so a chunk that
+    failed after some rows reached SQL Server is never copied twice;
+    clear_first does the same before the first attempt (resumed copies).
+    query replaces select(mysql_table) (the pushdown SELECT the converter
+    was built for).
+    """
+    table_name = mssql_table.name
+    mysql_key = single_key_column(mysql_table)
+    mssql_key = mssql_table.c[mysql_key.name]
+    column_names = [col.name for col in mssql_table.columns]
+    metrics = run_metrics.table(mysql_table.name)
+
+    for attempt in range(1, retries + 1):
+        stats = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0}
+        chunk_start = time.time()
+        try:
+            with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                if attempt > 1 or clear_first:
+                    conn.execute(delete(mssql_table).where(range_condition(mssql_key, key_range)))
+
+                chunk_query = (query if query is not None else select(mysql_table)).where(
+                    range_condition(mysql_key, key_range))
+                stage_start = time.perf_counter()
+                for partition in iter_mysql_batches(mysql_conn, chunk_query, batch_size):
+                    read_end = time.perf_counter()
+                    metrics.record('read', len(partition), read_end - stage_start, estimate_bytes(partition))
+                    batch = converter.convert_batch(partition)
+                    stats['skipped'] += len(partition) - len(batch)
+                    convert_end = time.perf_counter()
+                    metrics.record('convert', len(partition), convert_end - read_end, estimate_bytes(batch))
+                    stage_start = convert_end
+                    if not batch:
+                        continue
+                    if writer is not None:
+                        writer.write(conn, batch)
+                    else:
+                        conn.execute(mssql_table.insert(), [dict(zip(column_names, row)) for row in batch])
+                    stage_start = time.perf_counter()
+                    metrics.record('write', len(batch), stage_start - convert_end, estimate_bytes(batch))
+                    stats['batches'] += 1
+                    stats['copied'] += len(batch)
+                conn.execute(text("COMMIT"))
+        except Exception as e:
+            print(f"Table `{table_name}` chunk {key_range}: attempt {attempt} failed: {e}")
+            if attempt == retries:
+                raise
+            metrics.retry()
+            time.sleep(2 ** attempt)
+            continue
+
+        elapsed = time.time() - chunk_start
+        rate = stats['copied'] / elapsed if elapsed > 0 else float('inf')
+        print(f"Table `{table_name}` chunk {key_range}: {stats['copied']} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+        return stats
+
+
+def copy_table_chunked(mysql_engine, mssql_engine, mysql_table, mssql_table, key_ranges, max_workers,
+                       writer=None, batch_size=DEFAULT_BATCH_SIZE, clean_utf8=False, state=None,
+                       checkpoint_name=None, pushdown=False):
+    """Copy disjoint key ranges of one table on parallel workers, each with its own connections.
+
+    With a CopyStateStore each committed range is checkpointed; if a chunk
+    plan is already recorded for the table, its ranges replace key_ranges,
+    finished ones are skipped and the rest are cleared and copied again.
+    Raises RuntimeError unless every range was committed exactly once.
+    """
+    table_name = mssql_table.name
+    checkpoint_name = checkpoint_name or table_name
+    totals = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0, 'chunks': 0}
+    query, converter = source_query(mysql_engine, mysql_table, mssql_table, clean_utf8=clean_utf8,
+                                    pushdown=pushdown)
+    completed = []
+    failed = []
+    copy_start = time.time()
+
+    resuming = False
+    if state is not None:
+        plan = state.get_chunk_plan(checkpoint_name)
+        if plan:
+            resuming = True
+            key_ranges = list(plan)
+            completed = [key_range for key_range, done in plan.items() if done]
+            print(f"Table `{table_name}`: resuming, {len(completed)} of {len(key_ranges)} chunks already copied")
+        else:
+            state.set_chunk_plan(checkpoint_name, key_ranges)
+    pending = [key_range for key_range in key_ranges if key_range not in completed]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{table_name}-chunk') as pool:
+        futures = {
+            pool.submit(copy_chunk, mysql_engine, mssql_engine, mysql_table, mssql_table, key_range, writer,
+                        converter, batch_size, clear_first=resuming, query=query): key_range
+            for key_range in pending
+        }
+        for future in as_completed(futures):
+            key_range = futures[future]
+            try:
+                stats = future.result()
+            except Exception:
+                failed.append(key_range)
+                continue
+            completed.append(key_range)
+            if state is not None:
+                state.set_chunk_done(checkpoint_name, key_range, stats['copied'])
+            for key in ('copied', 'skipped', 'batches'):
+                totals[key] += stats[key]
+            totals['chunks'] += 1
+
+    totals['truncated'] = sum(converter.truncated.values())
+    converter.report_truncations()
+    run_metrics.table(mysql_table.name).finish()
+    if failed or sorted(completed, key=repr) != sorted(key_ranges, key=repr):
+        raise RuntimeError(f"Table `{table_name}`: {len(failed)} of {len(key_ranges)} chunks failed: {failed}")
+
+    elapsed = time.time() - copy_start
+    rate = totals['copied'] / elapsed if elapsed > 0 else float('inf')
+    print(f"Table `{table_name}`: {totals['chunks']} chunks, {totals['copied']} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+    return totals
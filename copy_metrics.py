@@ -0,0 +1,212 @@
+import csv
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Where write_report puts the JSON and CSV run reports
+REPORT_DIR = 'reports'
+
+# Prefix of the Prometheus metric names
+PROMETHEUS_PREFIX = 'mysql_to_mssql'
+
+# Batch latency percentiles included in the reports
+PERCENTILES = (50, 90, 99)
+
+
+def estimate_bytes(rows, sample=100):
+    """Approximate payload size of a batch from up to `sample` rows: string/bytes lengths, 8 bytes otherwise."""
+    if not rows:
+        return 0
+    step = max(len(rows) // sample, 1)
+    sampled = rows[::step]
+    size = 0
+    for row in sampled:
+        for value in row:
+            if value is None:
+                continue
+            size += len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+    return size * len(rows) // len(sampled)
+
+
+def peak_memory_bytes():
+    """High-water mark of this process's resident memory, or None if it cannot be read here."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class StageMetrics:
+    """Rows, bytes, busy seconds and per-batch latencies of one stage (read, convert, write, ...)."""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.latencies = []
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        result = {
+            'batches': len(latencies),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'seconds': round(self.seconds, 6),
+            'rows_per_second': round(self.rows / self.seconds, 1) if self.seconds > 0 else None,
+            'bytes_per_second': round(self.bytes / self.seconds, 1) if self.seconds > 0 else None,
+        }
+        for pct in PERCENTILES:
+            value = percentile(latencies, pct)
+            result[f'latency_p{pct}'] = round(value, 6) if value is not None else None
+        return result
+
+
+class TableMetrics:
+    """Everything recorded for one table during a run."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.stages = {}
+        self.retries = 0
+        self.started = time.time()
+        self.finished = None
+        self.peak_memory = None
+        self.lock = threading.Lock()
+
+    def record(self, stage, rows, seconds, nbytes=0):
+        with self.lock:
+            metrics = self.stages.setdefault(stage, StageMetrics())
+            metrics.rows += rows
+            metrics.bytes += nbytes
+            metrics.seconds += seconds
+            metrics.latencies.append(seconds)
+
+    def retry(self, count=1):
+        with self.lock:
+            self.retries += count
+
+    def finish(self):
+        self.finished = time.time()
+        self.peak_memory = peak_memory_bytes()
+
+    def summary(self):
+        with self.lock:
+            end = self.finished or time.time()
+            return {
+                'table': self.table_name,
+                'wall_seconds': round(end - self.started, 3),
+                'retries': self.retries,
+                'peak_memory_bytes': self.peak_memory,
+                'stages': {stage: metrics.summary() for stage, metrics in self.stages.items()},
+            }
+
+
+class RunMetrics:
+    """Per-table metrics for a whole run; shared by every worker thread."""
+
+    def __init__(self):
+        self.started = datetime.datetime.now()
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def table(self, table_name):
+        with self.lock:
+            if table_name not in self.tables:
+                self.tables[table_name] = TableMetrics(table_name)
+            return self.tables[table_name]
+
+    def report(self):
+        return {
+            'started': self.started.isoformat(),
+            'finished': datetime.datetime.now().isoformat(),
+            'peak_memory_bytes': peak_memory_bytes(),
+            'tables': [metrics.summary() for _, metrics in sorted(self.tables.items())],
+        }
+
+    def write_report(self, name, directory=REPORT_DIR, prometheus_path=None):
+        """Write <directory>/<name>-<timestamp>.json and .csv, and optionally a Prometheus textfile."""
+        report = self.report()
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{name}-{self.started:%Y%m%d-%H%M%S}")
+        with open(f"{base}.json", 'w', encoding='utf-8') as json_file:
+            json.dump(report, json_file, indent=2)
+        with open(f"{base}.csv", 'w', encoding='utf-8', newline='') as csv_file:
+            fields = ['table', 'stage', 'batches', 'rows', 'bytes', 'seconds', 'rows_per_second', 'bytes_per_second']
+            fields += [f'latency_p{pct}' for pct in PERCENTILES] + ['retries', 'wall_seconds', 'peak_memory_bytes']
+            writer = csv.DictWriter(csv_file, fieldnames=fields)
+            writer.writeheader()
+            for table in report['tables']:
+                for stage, summary in table['stages'].items():
+                    writer.writerow({'table': table['table'], 'stage': stage, **summary,
+                                     'retries': table['retries'], 'wall_seconds': table['wall_seconds'],
+                                     'peak_memory_bytes': table['peak_memory_bytes']})
+        if prometheus_path:
+            self.write_prometheus(report, prometheus_path)
+        print(f"Run report written to {base}.json and {base}.csv")
+        return report
+
+    @staticmethod
+    def write_prometheus(report, path):
+        """Write a node_exporter textfile; written to a temporary file first so it is never read half done."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}")
+
+        tables = report['tables']
+        stage_samples = [(table, stage, summary) for table in tables for stage, summary in table['stages'].items()]
+        metric('rows', 'gauge', "Rows handled per table and stage in the last run.",
+               [({'table': t['table'], 'stage': s}, m['rows']) for t, s, m in stage_samples])
+        metric('bytes', 'gauge', "Approximate bytes handled per table and stage in the last run.",
+               [({'table': t['table'], 'stage': s}, m['bytes']) for t, s, m in stage_samples])
+        metric('stage_seconds', 'gauge', "Busy seconds per table and stage in the last run.",
+               [({'table': t['table'], 'stage': s}, m['seconds']) for t, s, m in stage_samples])
+        metric('batch_latency_seconds', 'gauge', "Batch latency percentiles per table and stage.",
+               [({'table': t['table'], 'stage': s, 'quantile': str(pct / 100)}, m[f'latency_p{pct}'])
+                for t, s, m in stage_samples for pct in PERCENTILES])
+        metric('retries', 'gauge', "Retried chunks or bisected batches per table in the last run.",
+               [({'table': t['table']}, t['retries']) for t in tables])
+        metric('table_seconds', 'gauge', "Wall-clock seconds per table in the last run.",
+               [({'table': t['table']}, t['wall_seconds']) for t in tables])
+        metric('peak_memory_bytes', 'gauge', "Resident memory high-water mark of the run.",
+               [({}, report['peak_memory_bytes'])])
+        lines = [line.replace('{}', '') for line in lines]
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as prom_file:
+            prom_file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, path)
+
+
+# The run's metrics; copiers record into it and the scripts write the report at the end
+run_metrics = RunMetrics()
@@ -1,9 +1,10 @@
 import pyodbc
 import pymysql
-from sqlalchemy import create_engine, MetaData, Table, Column, text
-from sqlalchemy.dialects.mssql import INTEGER, VARCHAR, TEXT, DATETIME, TINYINT
-from sqlalchemy.schema import CreateTable
-from sqlalchemy.dialects import mssql
+from sqlalchemy import create_engine, MetaData
+
+from mssql_schema import create_mssql_table
+from parallel_copy import mysql_table_sizes
+from reflection_cache import ReflectionCache
 
 # SQL Server connection (using pyodbc)
 mssql_conn = pyodbc.connect(
@@ -24,59 +25,24 @@ mysql_conn = pymysql.connect(
 mysql_engine = create_engine('mysql+pymysql://', creator=lambda: mysql_conn)
 mssql_engine = create_engine('mssql+pyodbc://', creator=lambda: mssql_conn)
 
-# MySQL metadata reflection
-mysql_metadata = MetaData()
-mysql_metadata.reflect(bind=mysql_engine)  # Reflect all tables from MySQL
-mysql_tables = mysql_metadata.tables
+# MySQL metadata reflection, cached until a table's DDL changes
+mysql_tables = ReflectionCache(mysql_engine).tables(mysql_table_sizes(mysql_engine))
 
 # SQL Server metadata
 sqlserver_metadata = MetaData()
 
-# Function to convert MySQL data types to SQL Server data types
-def convert_to_sqlserver_type(mysql_column_type):
-    """Convert MySQL column type to SQL Server column type using SQLAlchemy."""
-    # Map MySQL types to SQL Server types
-    type_mapping = {
-        'INTEGER': INTEGER(),
-        'VARCHAR': VARCHAR(length=255),  # Default length, adjust as necessary
-        'TEXT': TEXT(),
-        'TINYINT': TINYINT(),  # Used for boolean
-        'DATETIME': DATETIME(),
-        # Add more mappings as necessary
-    }
-
-    # If it's a type object, return it directly
-    if isinstance(mysql_column_type, str):
-        return type_mapping.get(mysql_column_type.upper(), VARCHAR(length=255))  # Default to VARCHAR
-
-    return mysql_column_type
+# Leave secondary indexes to be built after the bulk load (create_deferred_indexes in the copy scripts);
+# the primary key is always created with the table
+DEFER_INDEXES = True
 
 # Begin transferring tables from MySQL to SQL Server
 for table_name, table in mysql_tables.items():
     print(f"Creating table {table_name} in SQL Server...")
 
-    # Create new Table object for SQL Server
-    sqlserver_table = Table(table_name, sqlserver_metadata)
-
-    # Add columns to SQL Server table with converted types
-    for col in table.columns:
-        new_column = Column(
-            col.name,
-            convert_to_sqlserver_type(str(col.type)),
-            primary_key=col.primary_key,
-            nullable=col.nullable,
-            default=col.default,
-            autoincrement=col.autoincrement
-        )
-        sqlserver_table.append_column(new_column)
-
-    # Generate SQL Server-compatible CREATE TABLE statement
-    create_stmt = CreateTable(sqlserver_table).compile(dialect=mssql.dialect())
-    sql_statement = str(create_stmt).replace("`", "")  # Remove backticks for SQL Server compatibility
-
-    # Execute CREATE TABLE statement on SQL Server using text
+    # Create the SQL Server table with mapped types and primary key (and its indexes unless deferred)
     with mssql_engine.connect() as conn:
-        conn.execute(text(sql_statement))
-        conn.execute(text("COMMIT"))  # Explicit commit for each table creation
+        create_mssql_table(conn, table, sqlserver_metadata, defer_indexes=DEFER_INDEXES)
 
+if DEFER_INDEXES:
+    print("Secondary indexes deferred; the copy scripts create them after loading each table.")
 print("Table structure transfer complete!")
@@ -0,0 +1,135 @@
+import datetime
+import json
+import sqlite3
+import threading
+from decimal import Decimal
+
+# Local SQLite file holding incremental-copy state between runs
+STATE_PATH = 'copy_state.sqlite'
+
+
+def encode_value(value):
+    """Serialize a key value (int, str, Decimal, date or datetime) to JSON with its type."""
+    if isinstance(value, datetime.datetime):
+        return {'type': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'type': 'date', 'value': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'type': 'decimal', 'value': str(value)}
+    return {'type': 'plain', 'value': value}
+
+
+def decode_value(encoded):
+    kind, value = encoded['type'], encoded['value']
+    if kind == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    if kind == 'date':
+        return datetime.date.fromisoformat(value)
+    if kind == 'decimal':
+        return Decimal(value)
+    return value
+
+
+class CopyStateStore:
+    """Per-table state kept in a local SQLite database; safe to share between worker threads."""
+
+    def __init__(self, path=STATE_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            "table_name TEXT PRIMARY KEY, columns TEXT NOT NULL, value TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        # Progress of the current full copy: per table its status and last committed key (or chunk plan)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "table_name TEXT PRIMARY KEY, status TEXT NOT NULL, last_key TEXT, rows_copied INTEGER NOT NULL, "
+            "updated_at TEXT NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_checkpoints ("
+            "table_name TEXT NOT NULL, key_range TEXT NOT NULL, done INTEGER NOT NULL, rows_copied INTEGER NOT NULL, "
+            "PRIMARY KEY (table_name, key_range))"
+        )
+        self.db.commit()
+
+    def get_watermark(self, table_name, columns):
+        """Return the stored watermark tuple, or None if there is none for these columns."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT columns, value FROM watermarks WHERE table_name = ?", (table_name,)
+            ).fetchone()
+        if row is None or json.loads(row[0]) != list(columns):
+            # No watermark yet, or the watermark columns were reconfigured
+            return None
+        return tuple(decode_value(value) for value in json.loads(row[1]))
+
+    def set_watermark(self, table_name, columns, value):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO watermarks (table_name, columns, value, updated_at) VALUES (?, ?, ?, ?)",
+                (table_name, json.dumps(list(columns)), json.dumps([encode_value(v) for v in value]),
+                 datetime.datetime.now().isoformat()),
+            )
+            self.db.commit()
+
+    def get_checkpoint(self, table_name):
+        """Return (status, last_key tuple or None, rows_copied), or None if the table has no checkpoint."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, last_key, rows_copied FROM checkpoints WHERE table_name = ?", (table_name,)
+            ).fetchone()
+        if row is None:
+            return None
+        last_key = tuple(decode_value(value) for value in json.loads(row[1])) if row[1] is not None else None
+        return row[0], last_key, row[2]
+
+    def set_checkpoint(self, table_name, status, last_key=None, rows_copied=0):
+        encoded = json.dumps([encode_value(v) for v in last_key]) if last_key is not None else None
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO checkpoints (table_name, status, last_key, rows_copied, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (table_name, status, encoded, rows_copied, datetime.datetime.now().isoformat()),
+            )
+            self.db.commit()
+
+    def get_chunk_plan(self, table_name):
+        """Return {key_range: done} for a table copied in chunks, or {} if none was recorded."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT key_range, done FROM chunk_checkpoints WHERE table_name = ?", (table_name,)
+            ).fetchall()
+        return {tuple(decode_value(v) if v is not None else None for v in json.loads(key_range)): bool(done)
+                for key_range, done in rows}
+
+    def set_chunk_plan(self, table_name, key_ranges):
+        with self.lock:
+            self.db.execute("DELETE FROM chunk_checkpoints WHERE table_name = ?", (table_name,))
+            self.db.executemany(
+                "INSERT INTO chunk_checkpoints (table_name, key_range, done, rows_copied) VALUES (?, ?, 0, 0)",
+                [(table_name, self.encode_range(key_range)) for key_range in key_ranges],
+            )
+            self.db.commit()
+
+    def set_chunk_done(self, table_name, key_range, rows_copied):
+        with self.lock:
+            self.db.execute(
+                "UPDATE chunk_checkpoints SET done = 1, rows_copied = ? WHERE table_name = ? AND key_range = ?",
+                (rows_copied, table_name, self.encode_range(key_range)),
+            )
+            self.db.commit()
+
+    @staticmethod
+    def encode_range(key_range):
+        return json.dumps([encode_value(v) if v is not None else None for v in key_range])
+
+    def clear_checkpoints(self):
+        """Forget the previous run's progress so every table is copied from the start."""
+        with self.lock:
+            self.db.execute("DELETE FROM checkpoints")
+            self.db.execute("DELETE FROM chunk_checkpoints")
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
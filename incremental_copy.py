@@ -0,0 +1,95 @@
+import time
+
+from sqlalchemy import DateTime, Integer, select, text
+
+from bulk_writers import has_identity
+from copy_metrics import estimate_bytes, run_metrics
+from mssql_upsert import upsert_rows
+from mysql_pushdown import source_query
+from stream_copy import AdaptiveBatchSizer, iter_keyset_batches
+
+# Timestamp columns tried (in order) when a table has no auto-increment key and none is configured
+WATERMARK_CANDIDATES = ('updated_at', 'modified_at', 'last_modified', 'update_time')
+
+
+def watermark_columns(mysql_table, configured=None):
+    """Return the key columns to page past the watermark on, or None if the table has no usable watermark.
+
+    An auto-increment integer primary key is used on its own; a timestamp
+    column is paired with the primary key so rows sharing a timestamp are not
+    skipped (rows whose timestamp is NULL are only picked up by a full copy).
+    """
+    primary_key = list(mysql_table.primary_key.columns)
+    if configured:
+        column = mysql_table.c[configured]
+        if len(primary_key) == 1 and column is primary_key[0]:
+            return [column]
+        return [column] + primary_key if primary_key else None
+    if len(primary_key) == 1 and isinstance(primary_key[0].type, Integer) and primary_key[0].autoincrement is True:
+        return primary_key
+    if not primary_key:
+        return None
+    for name in WATERMARK_CANDIDATES:
+        column = mysql_table.c.get(name)
+        if column is not None and isinstance(column.type, DateTime):
+            return [column] + primary_key
+    return None
+
+
+def current_watermark(mysql_conn, mysql_table, key_columns):
+    """Return the highest key tuple currently in the table (None if empty)."""
+    query = select(*key_columns).order_by(*[col.desc() for col in key_columns]).limit(1)
+    row = mysql_conn.execute(query).first()
+    return tuple(row) if row is not None else None
+
+
+def copy_table_incremental(mysql_conn, mssql_conn, mysql_table, mssql_table, key_columns, state,
+                           batch_size=5000, pushdown=False):
+    """Upsert the rows past the stored watermark, saving the watermark after every committed batch.
+
+    Rows are matched on the SQL Server primary key, or on the MySQL one for
+    targets created without a primary key (see mssql_schema.py).
+    """
+    table_name = mssql_table.name
+    key_names = [col.name for col in key_columns]
+    mssql_key_names = [col.name for col in mssql_table.primary_key.columns]
+    if not mssql_key_names:
+        mssql_key_names = [col.name for col in mysql_table.primary_key.columns if col.name in mssql_table.c]
+        if not mssql_key_names:
+            raise RuntimeError(f"Table `{table_name}` has no primary key to match rows on in either database")
+        print(f"Table `{table_name}`: no primary key on SQL Server; matching rows on the MySQL key {mssql_key_names}")
+    column_names = [col.name for col in mssql_table.columns]
+    query, converter = source_query(mysql_conn, mysql_table, mssql_table, pushdown=pushdown, key_columns=key_columns)
+    identity_insert = has_identity(mssql_table)
+    stats = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0}
+    metrics = run_metrics.table(mysql_table.name)
+
+    watermark = state.get_watermark(table_name, key_names)
+    print(f"Table `{table_name}`: copying rows past watermark {watermark} on {key_names}")
+    sizer = AdaptiveBatchSizer(initial=batch_size, maximum=batch_size)
+    copy_start = time.time()
+    stage_start = time.perf_counter()
+    for rows, last_key in iter_keyset_batches(mysql_conn, mysql_table, key_columns, sizer, start_after=watermark,
+                                              query=query):
+        read_end = time.perf_counter()
+        metrics.record('read', len(rows), read_end - stage_start, estimate_bytes(rows))
+        batch = converter.convert_batch(rows)
+        stats['skipped'] += len(rows) - len(batch)
+        convert_end = time.perf_counter()
+        metrics.record('convert', len(rows), convert_end - read_end, estimate_bytes(batch))
+        if batch:
+            upsert_rows(mssql_conn, table_name, column_names, mssql_key_names, batch,
+                        schema=mssql_table.schema or 'dbo', identity_insert=identity_insert)
+        mssql_conn.execute(text("COMMIT"))
+        state.set_watermark(table_name, key_names, last_key)
+        stats['batches'] += 1
+        stats['copied'] += len(batch)
+        stage_start = time.perf_counter()
+        metrics.record('write', len(batch), stage_start - convert_end, estimate_bytes(batch))
+
+    stats['truncated'] = sum(converter.truncated.values())
+    converter.report_truncations()
+    metrics.finish()
+    elapsed = time.time() - copy_start
+    print(f"Table `{table_name}`: {stats['copied']} new or changed rows upserted in {elapsed:.2f}s")
+    return stats
@@ -0,0 +1,293 @@
+import re
+import time
+
+from sqlalchemy import CheckConstraint, Column, Identity, Index, MetaData, PrimaryKeyConstraint, Table, text
+from sqlalchemy import types as sqltypes
+from sqlalchemy.dialects import mssql, mysql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+# Longest sized NVARCHAR/NCHAR and VARCHAR/VARBINARY; longer columns become (MAX)
+MAX_NVARCHAR_LENGTH = 4000
+MAX_VARCHAR_LENGTH = 8000
+
+# SQL Server limits on the key size of a nonclustered index and of a clustered index (or clustered primary key)
+MAX_INDEX_KEY_BYTES = 1700
+MAX_CLUSTERED_KEY_BYTES = 900
+
+# MySQL character sets stored as single-byte VARCHAR; everything else (utf8, utf8mb4, ...) becomes NVARCHAR
+SINGLE_BYTE_CHARSETS = ('latin1', 'ascii', 'cp1252')
+
+# Add CHECK constraints that keep ENUM values and JSON documents valid on the SQL Server side
+ADD_CHECK_CONSTRAINTS = True
+
+# MySQL defaults that mean "now", and the SQL Server function used instead
+CURRENT_TIMESTAMP_DEFAULT = re.compile(r"^(current_timestamp|now|localtimestamp)(\(\d*\))?$", re.IGNORECASE)
+
+
+def sized_string(length, unicode, fixed=False):
+    """NVARCHAR/NCHAR (or VARCHAR/CHAR) of the given length, or (MAX) when it is too long for a sized column."""
+    limit = MAX_NVARCHAR_LENGTH if unicode else MAX_VARCHAR_LENGTH
+    if length is None or length > limit:
+        return mssql.NVARCHAR(None) if unicode else mssql.VARCHAR(None)
+    if fixed:
+        return mssql.NCHAR(length) if unicode else mssql.CHAR(length)
+    return mssql.NVARCHAR(length) if unicode else mssql.VARCHAR(length)
+
+
+def sized_binary(length, fixed=False):
+    if length is None or length > MAX_VARCHAR_LENGTH:
+        return mssql.VARBINARY('max')
+    return mssql.BINARY(length) if fixed else mssql.VARBINARY(length)
+
+
+def is_unicode(column_type, table_charset=None):
+    charset = getattr(column_type, 'charset', None) or table_charset or ''
+    return charset.lower() not in SINGLE_BYTE_CHARSETS
+
+
+def convert_to_sqlserver_type(column_type, table_charset=None):
+    """Map a reflected MySQL column type to the SQL Server type that holds every value of it.
+
+    Integer widths move up one size when unsigned (BIGINT UNSIGNED becomes
+    DECIMAL(20,0)), DECIMAL keeps its precision and scale, strings keep their
+    length, and fractional seconds carry over to DATETIME2/TIME.
+    """
+    unsigned = getattr(column_type, 'unsigned', False)
+
+    # Integers; SQL Server TINYINT is unsigned, so signed TINYINT needs SMALLINT
+    if isinstance(column_type, mysql.TINYINT):
+        return mssql.TINYINT() if unsigned else mssql.SMALLINT()
+    if isinstance(column_type, mysql.SMALLINT):
+        return mssql.INTEGER() if unsigned else mssql.SMALLINT()
+    if isinstance(column_type, mysql.MEDIUMINT):
+        return mssql.INTEGER()
+    if isinstance(column_type, mysql.BIGINT):
+        return mssql.DECIMAL(20, 0) if unsigned else mssql.BIGINT()
+    if isinstance(column_type, sqltypes.Integer):
+        return mssql.BIGINT() if unsigned else mssql.INTEGER()
+    if isinstance(column_type, mysql.BIT):
+        return mssql.BIT() if (column_type.length or 1) == 1 else mssql.BIGINT()
+    if isinstance(column_type, mysql.YEAR):
+        return mssql.SMALLINT()
+
+    # Exact and approximate numerics
+    if isinstance(column_type, sqltypes.Float):
+        if isinstance(column_type, (mysql.DOUBLE, mysql.REAL)):
+            return mssql.FLOAT(53)
+        return mssql.REAL()
+    if isinstance(column_type, sqltypes.Numeric):
+        precision = column_type.precision or 10
+        scale = column_type.scale or 0
+        # SQL Server DECIMAL stops at 38 digits; keep the scale and give up integer digits
+        return mssql.DECIMAL(min(precision, 38), min(scale, 38))
+
+    # Dates and times
+    if isinstance(column_type, sqltypes.DateTime):
+        fsp = getattr(column_type, 'fsp', None)
+        return mssql.DATETIME2(fsp or 0)
+    if isinstance(column_type, sqltypes.Date):
+        return mssql.DATE()
+    if isinstance(column_type, sqltypes.Time):
+        fsp = getattr(column_type, 'fsp', None)
+        return mssql.TIME(fsp or 0)
+
+    # JSON, ENUM and SET are stored as text
+    if isinstance(column_type, sqltypes.JSON):
+        return mssql.NVARCHAR(None)
+    if isinstance(column_type, mysql.ENUM):
+        return sized_string(max((len(value) for value in column_type.enums), default=1),
+                            is_unicode(column_type, table_charset))
+    if isinstance(column_type, mysql.SET):
+        # All members joined with commas
+        length = sum(len(value) for value in column_type.values) + max(len(column_type.values) - 1, 0)
+        return sized_string(max(length, 1), is_unicode(column_type, table_charset))
+
+    # Text types, longest first since they share base classes
+    unicode = is_unicode(column_type, table_charset)
+    if isinstance(column_type, mysql.TINYTEXT):
+        return sized_string(255, unicode)
+    if isinstance(column_type, (mysql.MEDIUMTEXT, mysql.LONGTEXT, sqltypes.TEXT)):
+        return sized_string(None, unicode)
+    if isinstance(column_type, (sqltypes.CHAR, sqltypes.NCHAR)):
+        return sized_string(column_type.length, unicode, fixed=True)
+    if isinstance(column_type, sqltypes.String):
+        return sized_string(column_type.length, unicode)
+
+    # Binary types
+    if isinstance(column_type, mysql.TINYBLOB):
+        return sized_binary(255)
+    if isinstance(column_type, (mysql.MEDIUMBLOB, mysql.LONGBLOB, sqltypes.BLOB)):
+        return sized_binary(None)
+    if isinstance(column_type, sqltypes.BINARY):
+        return sized_binary(column_type.length, fixed=True)
+    if isinstance(column_type, sqltypes._Binary):
+        return sized_binary(getattr(column_type, 'length', None))
+
+    print(f"No SQL Server mapping for MySQL type {column_type!r}; using NVARCHAR(MAX).")
+    return mssql.NVARCHAR(None)
+
+
+def convert_server_default(mysql_column):
+    """Translate a literal or CURRENT_TIMESTAMP column default; other expressions are dropped."""
+    default = mysql_column.server_default
+    if default is None or not hasattr(default, 'arg'):
+        return None
+    value = str(getattr(default.arg, 'text', default.arg)).strip()
+    if value.upper() == 'NULL':
+        return None
+    if CURRENT_TIMESTAMP_DEFAULT.match(value):
+        return text('SYSDATETIME()')
+    if re.fullmatch(r"'(?:[^']|'')*'|-?\d+(\.\d+)?", value):
+        return text(value)
+    print(f"Column `{mysql_column.table.name}`.`{mysql_column.name}`: default {value} not carried over.")
+    return None
+
+
+def index_key_bytes(columns):
+    """Worst-case key size of an index on these (SQL Server) columns."""
+    total = 0
+    for col in columns:
+        length = getattr(col.type, 'length', None)
+        if isinstance(col.type, (sqltypes.String, sqltypes._Binary)):
+            if length is None or length == 'max':
+                return None
+            total += length * 2 if isinstance(col.type, (mssql.NVARCHAR, mssql.NCHAR)) else length
+        else:
+            total += 8
+    return total
+
+
+def build_mssql_table(mysql_table, metadata, schema=None, add_indexes=True):
+    """Build the SQL Server Table for a reflected MySQL table, with its primary key and indexes.
+
+    The primary key becomes the clustered key, as it is in InnoDB. A table
+    without one is clustered on its first unique index over NOT NULL columns,
+    which is the key InnoDB clusters it on. Keys over 900 bytes (e.g.
+    NVARCHAR(500) after the CHAR/VARCHAR widening) cannot be clustered and
+    become nonclustered; a primary key over 1700 bytes is not created at all,
+    with a message saying so. Unique indexes on nullable columns
+    are filtered to non-NULL rows, because SQL Server allows only one NULL in
+    a unique index and MySQL allows many.
+    """
+    table_charset = mysql_table.dialect_kwargs.get('mysql_default charset')
+    mssql_table = Table(mysql_table.name, metadata, schema=schema)
+    checks = []
+
+    for col in mysql_table.columns:
+        mssql_type = convert_to_sqlserver_type(col.type, table_charset)
+        if isinstance(col.type, sqltypes.Time):
+            # MySQL TIME is an interval (-838:59:59 to 838:59:59); SQL Server TIME is a time of day
+            print(f"Column `{mysql_table.name}`.`{col.name}`: MySQL TIME is copied to SQL Server TIME, values "
+                  f"below 00:00:00 or from 24:00:00 up will not load.")
+        elif isinstance(col.type, sqltypes.Numeric) and (col.type.precision or 0) > 38:
+            print(f"Column `{mysql_table.name}`.`{col.name}`: DECIMAL({col.type.precision},{col.type.scale or 0}) "
+                  f"is over SQL Server's 38 digits; copied as {mssql_type.compile(dialect=mssql.dialect())}.")
+        # Only real AUTO_INCREMENT columns become IDENTITY, never other integer primary keys
+        identity = col.autoincrement is True
+        args = [Identity(start=1, increment=1)] if identity else []
+        server_default = convert_server_default(col)
+        mssql_table.append_column(Column(
+            col.name,
+            mssql_type,
+            *args,
+            nullable=col.nullable,
+            server_default=server_default,
+            autoincrement=True if identity else False,
+        ))
+        if ADD_CHECK_CONSTRAINTS:
+            quoted = f"[{col.name}]"
+            if isinstance(col.type, mysql.ENUM) and col.type.enums:
+                allowed = ', '.join("'" + value.replace("'", "''") + "'" for value in col.type.enums)
+                checks.append(CheckConstraint(f"{quoted} IN ({allowed})", name=f"CK_{mysql_table.name}_{col.name}"))
+            elif isinstance(col.type, sqltypes.JSON):
+                checks.append(CheckConstraint(f"ISJSON({quoted}) = 1", name=f"CK_{mysql_table.name}_{col.name}"))
+    for check in checks:
+        mssql_table.append_constraint(check)
+
+    clustered_done = False
+    key_names = [col.name for col in mysql_table.primary_key.columns]
+    if key_names:
+        key_bytes = index_key_bytes([mssql_table.c[name] for name in key_names])
+        if key_bytes is not None and key_bytes <= MAX_CLUSTERED_KEY_BYTES:
+            mssql_table.append_constraint(PrimaryKeyConstraint(*key_names))
+            clustered_done = True
+        elif key_bytes is not None and key_bytes <= MAX_INDEX_KEY_BYTES:
+            print(f"Table `{mysql_table.name}`: primary key is {key_bytes} bytes, over the "
+                  f"{MAX_CLUSTERED_KEY_BYTES}-byte clustered key limit; created as NONCLUSTERED.")
+            mssql_table.append_constraint(PrimaryKeyConstraint(*key_names, mssql_clustered=False))
+        else:
+            size = f"{key_bytes} bytes" if key_bytes is not None else "a (MAX) column"
+            print(f"Table `{mysql_table.name}`: primary key ({', '.join(key_names)}) has {size}, over SQL Server's "
+                  f"{MAX_INDEX_KEY_BYTES}-byte key limit; table created WITHOUT a primary key.")
+
+    if add_indexes:
+        for index in sorted(mysql_table.indexes, key=lambda ix: (not ix.unique, ix.name or '')):
+            mssql_index = convert_index(index, mssql_table, cluster=not clustered_done)
+            if mssql_index is not None and mssql_index.kwargs.get('mssql_clustered'):
+                clustered_done = True
+    return mssql_table
+
+
+def convert_index(mysql_index, mssql_table, cluster=False):
+    """Attach the SQL Server equivalent of a MySQL index to mssql_table, or return None if it cannot be built."""
+    table_name = mssql_table.name
+    prefix = (mysql_index.dialect_options['mysql'].get('prefix') or '').upper()
+    if prefix in ('FULLTEXT', 'SPATIAL'):
+        print(f"Table `{table_name}`: {prefix} index {mysql_index.name} not recreated.")
+        return None
+    columns = [mssql_table.c[col.name] for col in mysql_index.columns]
+    if not columns:
+        # Functional indexes reflect without columns
+        print(f"Table `{table_name}`: expression index {mysql_index.name} not recreated.")
+        return None
+    key_bytes = index_key_bytes(columns)
+    if key_bytes is None or key_bytes > MAX_INDEX_KEY_BYTES:
+        # (MAX) columns cannot be index keys, and oversize keys fail on insert
+        print(f"Table `{table_name}`: index {mysql_index.name} is too wide for SQL Server and was not recreated.")
+        return None
+
+    options = {}
+    nullable = [col for col in columns if col.nullable]
+    if mysql_index.unique and nullable:
+        where = nullable[0].isnot(None)
+        for col in nullable[1:]:
+            where = where & col.isnot(None)
+        options['mssql_where'] = where
+    elif mysql_index.unique and cluster and key_bytes <= MAX_CLUSTERED_KEY_BYTES:
+        options['mssql_clustered'] = True
+    return Index(mysql_index.name, *columns, unique=mysql_index.unique, **options)
+
+
+def create_indexes(mssql_conn, mssql_table):
+    """Create the table's indexes that do not exist yet; used to build deferred indexes after the bulk load."""
+    created = []
+    schema = mssql_table.schema or 'dbo'
+    for index in sorted(mssql_table.indexes, key=lambda ix: not ix.kwargs.get('mssql_clustered')):
+        exists = mssql_conn.execute(
+            text("SELECT 1 FROM sys.indexes WHERE name = :name AND object_id = OBJECT_ID(:table)"),
+            {'name': index.name, 'table': f"[{schema}].[{mssql_table.name}]"},
+        ).first()
+        if exists:
+            continue
+        start = time.time()
+        mssql_conn.execute(CreateIndex(index))
+        mssql_conn.execute(text("COMMIT"))
+        print(f"Table `{mssql_table.name}`: created index {index.name} "
+              f"in {time.time() - start:.2f}s")
+        created.append(index.name)
+    return created
+
+
+def create_mssql_table(mssql_conn, mysql_table, metadata=None, defer_indexes=True):
+    """Create the SQL Server table for a MySQL table; secondary indexes too unless they are deferred."""
+    mssql_table = build_mssql_table(mysql_table, metadata if metadata is not None else MetaData())
+    mssql_conn.execute(text(str(CreateTable(mssql_table).compile(dialect=mssql.dialect()))))
+    mssql_conn.execute(text("COMMIT"))
+    if not defer_indexes:
+        create_indexes(mssql_conn, mssql_table)
+    return mssql_table
+
+
+def create_deferred_indexes(mssql_conn, mysql_table, schema=None):
+    """Recreate the indexes the schema copy deferred, mapped from the MySQL table definition."""
+    return create_indexes(mssql_conn, build_mssql_table(mysql_table, MetaData(), schema=schema))
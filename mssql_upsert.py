@@ -0,0 +1,84 @@
+from bulk_writers import dbapi_connection, identity_insert_on, quote_name
+
+# Rows staged and merged per MERGE statement
+MERGE_BATCH_SIZE = 5000
+
+
+def stage_rows(cursor, target, stage, column_names, rows):
+    """Create an empty #temp copy of the target columns and bulk-insert rows into it."""
+    column_list = ', '.join(quote_name(name) for name in column_names)
+    # The UNION ALL stops SELECT INTO from copying the IDENTITY property to the temp table
+    cursor.execute(
+        f"SELECT TOP 0 {column_list} INTO {stage} FROM {target} "
+        f"UNION ALL SELECT TOP 0 {column_list} FROM {target}"
+    )
+    placeholders = ', '.join('?' for _ in column_names)
+    cursor.fast_executemany = True
+    cursor.executemany(f"INSERT INTO {stage} ({column_list}) VALUES ({placeholders})", rows)
+
+
+def drop_stage(cursor, stage):
+    # A failed statement leaves the #temp table behind on the session; drop it so the next batch can stage again
+    cursor.execute(f"IF OBJECT_ID('tempdb..{stage}') IS NOT NULL DROP TABLE {stage}")
+
+
+def merge_sql(target, stage, column_names, key_names):
+    """Build a MERGE that updates matching keys and inserts the rest."""
+    if not key_names:
+        raise ValueError(f"Cannot merge into {target} without key columns")
+    on_clause = ' AND '.join(f"t.{quote_name(name)} = s.{quote_name(name)}" for name in key_names)
+    column_list = ', '.join(quote_name(name) for name in column_names)
+    source_list = ', '.join(f"s.{quote_name(name)}" for name in column_names)
+    sql = f"MERGE {target} WITH (HOLDLOCK) AS t USING {stage} AS s ON {on_clause}"
+    update_columns = [name for name in column_names if name not in key_names]
+    if update_columns:
+        set_list = ', '.join(f"t.{quote_name(name)} = s.{quote_name(name)}" for name in update_columns)
+        sql += f" WHEN MATCHED THEN UPDATE SET {set_list}"
+    sql += f" WHEN NOT MATCHED BY TARGET THEN INSERT ({column_list}) VALUES ({source_list});"
+    return sql
+
+
+def upsert_rows(conn, table_name, column_names, key_names, rows, schema='dbo', identity_insert=False,
+                batch_size=MERGE_BATCH_SIZE):
+    """Insert-or-update rows by key with one staged MERGE per batch. Returns the number of rows merged.
+
+    The caller commits, as with the bulk writers.
+    """
+    target = quote_name(f"{schema}.{table_name}" if schema and '.' not in table_name else table_name)
+    stage = '#upsert_stage'
+    sql = merge_sql(target, stage, column_names, key_names)
+    rows = list(rows)
+    cursor = dbapi_connection(conn).cursor()
+    try:
+        for start in range(0, len(rows), batch_size):
+            try:
+                stage_rows(cursor, target, stage, column_names, rows[start:start + batch_size])
+                if identity_insert:
+                    with identity_insert_on(cursor, target):
+                        cursor.execute(sql)
+                else:
+                    cursor.execute(sql)
+            finally:
+                drop_stage(cursor, stage)
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def delete_keys(conn, table_name, key_names, keys, schema='dbo', batch_size=MERGE_BATCH_SIZE):
+    """Delete rows by key (tuples in key_names order) through a staged join. Returns the number of keys sent."""
+    target = quote_name(f"{schema}.{table_name}" if schema and '.' not in table_name else table_name)
+    stage = '#delete_stage'
+    on_clause = ' AND '.join(f"t.{quote_name(name)} = s.{quote_name(name)}" for name in key_names)
+    keys = list(keys)
+    cursor = dbapi_connection(conn).cursor()
+    try:
+        for start in range(0, len(keys), batch_size):
+            try:
+                stage_rows(cursor, target, stage, key_names, keys[start:start + batch_size])
+                cursor.execute(f"DELETE t FROM {target} AS t JOIN {stage} AS s ON {on_clause}")
+            finally:
+                drop_stage(cursor, stage)
+    finally:
+        cursor.close()
+    return len(keys)
@@ -0,0 +1,109 @@
+from sqlalchemy import literal_column, select
+from sqlalchemy import types as sqltypes
+
+from row_converter import RowConverter, TEXT_DECIMALS, compile_converter, decimal_handling
+
+# Result columns carrying the truncation bitmasks, one bit per truncated column and FLAG_BITS columns per mask
+FLAG_COLUMN_PREFIX = '__truncated_'
+FLAG_BITS = 63
+
+# MySQL DECIMAL precision limit
+MAX_MYSQL_PRECISION = 65
+
+
+def pushdown_select(mysql_table, mssql_table, clean_utf8=False, preparer=None, key_columns=None):
+    """Build a SELECT that converts the rows in MySQL, and the converter for its result.
+
+    For every target column the SELECT returns the value ready to insert:
+    strings longer than the target column are cut with LEFT(col, n),
+    clean_utf8 re-encodes strings with CONVERT(col USING utf8mb4) (invalid
+    characters become '?'), and decimals with more scale than the target are
+    rounded with CAST(col AS DECIMAL(p, s)) (half away from zero, like the
+    Python path). Which values were cut comes back as one bitmask per row, so
+    truncations are still counted per column. The converter left in Python
+    only drops rows with NULL in NOT NULL columns. Returns (query, converter).
+
+    Key columns (key_columns, by default the primary key) are selected
+    untransformed and converted in Python instead, so keyset paging reads
+    the real key values back from the rows.
+    """
+    quote = preparer.quote if preparer is not None else (lambda name: f"`{name}`")
+    target_columns = {col.name: col for col in mssql_table.columns}
+    expressions = []
+    source_types = []
+    truncated_columns = []
+    flag_terms = []
+    key_names = {col.name for col in (key_columns if key_columns is not None else mysql_table.primary_key.columns)}
+    for col in mysql_table.columns:
+        target = target_columns.get(col.name)
+        column_sql = f"{quote(mysql_table.name)}.{quote(col.name)}"
+        if target is None or col.name in key_names:
+            expressions.append(col)
+            source_types.append(col.type)
+            continue
+
+        target_length = getattr(target.type, 'length', None)
+        source_length = getattr(col.type, 'length', None)
+        if isinstance(col.type, sqltypes.String) and not isinstance(col.type, sqltypes.Enum):
+            value_sql = f"CONVERT({column_sql} USING utf8mb4)" if clean_utf8 else column_sql
+            if target_length and (source_length is None or source_length > target_length):
+                bit = len(truncated_columns) % FLAG_BITS
+                truncated_columns.append(col.name)
+                # CHAR_LENGTH(NULL) > n is NULL, and one NULL term would make the whole mask NULL
+                flag_terms.append(f"(COALESCE(CHAR_LENGTH({column_sql}) > {int(target_length)}, 0) << {bit})")
+                value_sql = f"LEFT({value_sql}, {int(target_length)})"
+                source_type = sqltypes.String(target_length)
+            else:
+                source_type = col.type
+            if value_sql == column_sql:
+                expressions.append(col)
+            else:
+                expressions.append(literal_column(value_sql, type_=source_type).label(col.name))
+            source_types.append(source_type)
+            continue
+
+        decimals = decimal_handling(col.type, target.type)
+        if decimals is not None and decimals != TEXT_DECIMALS:
+            # Keep the integer digits of the source so the CAST can never clip a value
+            precision = min(MAX_MYSQL_PRECISION, (col.type.precision or MAX_MYSQL_PRECISION)
+                            - (col.type.scale or 0) + decimals)
+            source_type = sqltypes.Numeric(precision, decimals)
+            expressions.append(literal_column(f"CAST({column_sql} AS DECIMAL({precision}, {int(decimals)}))",
+                                              type_=source_type).label(col.name))
+            source_types.append(source_type)
+            continue
+
+        expressions.append(col)
+        source_types.append(col.type)
+
+    source_names = [col.name for col in mysql_table.columns]
+    truncation_flags = {}
+    for start in range(0, len(truncated_columns), FLAG_BITS):
+        name = f"{FLAG_COLUMN_PREFIX}{start // FLAG_BITS}"
+        terms = flag_terms[start:start + FLAG_BITS]
+        expressions.append(literal_column(f"({' | '.join(terms)})", type_=sqltypes.BigInteger).label(name))
+        truncation_flags[len(source_names)] = truncated_columns[start:start + FLAG_BITS]
+        source_names.append(name)
+        source_types.append(sqltypes.BigInteger())
+
+    query = select(*expressions).select_from(mysql_table)
+    # Only the untransformed key columns can still need re-encoding
+    python_clean = clean_utf8 and any(isinstance(col.type, sqltypes.String) for col in mysql_table.columns
+                                      if col.name in key_names and col.name in target_columns)
+    converter = RowConverter(source_names, mssql_table, source_types=source_types, clean_utf8=python_clean,
+                             truncation_flags=truncation_flags)
+    return query, converter
+
+
+def source_query(mysql_conn, mysql_table, mssql_table, clean_utf8=False, pushdown=True, key_columns=None):
+    """(query, converter) for copying a table: pushed down into MySQL when possible, else select(mysql_table).
+
+    Pushdown needs MySQL functions, so other source dialects (the SQLite
+    stand-ins of benchmark_copy.py) keep the Python conversion. key_columns
+    are the columns a keyset copy pages on, if not the primary key.
+    """
+    dialect = mysql_conn.dialect
+    if pushdown and dialect.name == 'mysql':
+        return pushdown_select(mysql_table, mssql_table, clean_utf8=clean_utf8, preparer=dialect.identifier_preparer,
+                               key_columns=key_columns)
+    return select(mysql_table), compile_converter(mysql_table, mssql_table, clean_utf8=clean_utf8)
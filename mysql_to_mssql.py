@@ -0,0 +1,371 @@
+import argparse
+import datetime
+import os
+import time
+
+import pymysql
+import pyodbc
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from bulk_writers import DEFAULT_WRITER, WRITER_BACKENDS, make_writer
+from checksum_sync import load_table_spec, sync_table
+from checkpoint_copy import can_resume, copy_table_resumable, start_checkpoint
+from chunked_copy import copy_table_chunked, pk_ranges_minmax, pk_ranges_sampled, single_key_column
+from copy_metrics import REPORT_DIR, run_metrics
+from copy_state import CopyStateStore
+from mssql_schema import create_deferred_indexes, create_mssql_table
+from parallel_copy import ServerSlots, create_pooled_engine, mysql_table_sizes, order_by_size, run_parallel
+from pipeline_copy import copy_table_pipelined
+from reflection_cache import ReflectionCache
+from row_verifier import VERIFY_WORKERS, verify_table, write_verify_report
+from snapshot_files import SNAPSHOT_DIR, SNAPSHOT_WRITERS, export_table, import_table, read_manifest
+from stream_copy import DEFAULT_BATCH_SIZE, copy_table_streaming
+from swap_reload import SWAP_METHOD, reload_with_swap
+
+# Connection defaults, the same servers the standalone scripts use
+MYSQL_HOST = 'sever_address'
+MYSQL_USER = 'test123'
+MYSQL_PASSWORD = 'test123'
+MYSQL_DATABASE = 'hotpack_test'
+MSSQL_CONNECTION = (
+    'DRIVER={ODBC Driver 17 for SQL Server};'
+    'SERVER=ipack-svr-rpt;DATABASE=Report_1;'
+    'Trusted_Connection=yes;'
+)
+
+# Tables with at least this many (estimated) rows and a single-column primary key are copied in key ranges
+CHUNKED_MIN_ROWS = 5_000_000
+
+
+def connection_factories(args):
+    def connect_mysql():
+        return pymysql.connect(host=args.mysql_host, user=args.mysql_user, password=args.mysql_password,
+                               db=args.mysql_database)
+
+    def connect_mssql():
+        return pyodbc.connect(args.mssql)
+
+    return connect_mysql, connect_mssql
+
+
+def create_engines(args, pool_size):
+    connect_mysql, connect_mssql = connection_factories(args)
+    return (create_pooled_engine('mysql+pymysql://', connect_mysql, pool_size),
+            create_pooled_engine('mssql+pyodbc://', connect_mssql, pool_size))
+
+
+def run_schema(args):
+    """Create the SQL Server tables for the selected (or all) MySQL tables."""
+    mysql_engine, mssql_engine = create_engines(args, 1)
+    table_names = args.tables or list(mysql_table_sizes(mysql_engine))
+    mysql_tables = ReflectionCache(mysql_engine).tables(table_names)
+    for table_name, mysql_table in mysql_tables.items():
+        print(f"Creating table {table_name} in SQL Server...")
+        with mssql_engine.connect() as conn:
+            create_mssql_table(conn, mysql_table, defer_indexes=not args.create_indexes)
+    print("Table structure transfer complete!")
+
+
+def run_copy(args):
+    """Reload the selected (or all) tables, several tables at a time."""
+    pool_size = max(args.workers, args.chunk_workers)
+    mysql_engine, mssql_engine = create_engines(args, pool_size)
+    table_sizes = mysql_table_sizes(mysql_engine)
+    table_names = args.tables or list(table_sizes)
+    mysql_tables = ReflectionCache(mysql_engine).tables(table_names)
+    mssql_tables = ReflectionCache(mssql_engine).tables(table_names)
+    table_paths = {}
+    state = CopyStateStore()
+    if not args.resume:
+        state.clear_checkpoints()
+    # Finished tables are always checkpointed; --checkpoint-batches also records each committed batch (a keyset
+    # copy instead of the pipeline). A staging table is recreated empty on every run, so not for swap reloads
+    checkpoints = state if args.checkpoint_batches and not args.swap else None
+
+    def copy_one(table_name):
+        start_time = time.time()
+        mysql_table = mysql_tables.get(table_name)
+        mssql_table = mssql_tables.get(table_name)
+        if mysql_table is None or mssql_table is None:
+            print(f"Table `{table_name}` does not exist in one of the databases and will be skipped.")
+            table_paths[table_name] = 'skipped'
+            return None
+
+        checkpoint = state.get_checkpoint(table_name)
+        if checkpoint is not None and checkpoint[0] == 'done':
+            print(f"Table `{table_name}` was copied by the previous run ({checkpoint[2]} rows). Skipping...")
+            table_paths[table_name] = 'skipped (done)'
+            return None
+
+        with mysql_engine.connect() as mysql_conn:
+            total_rows = mysql_conn.execute(select(func.count()).select_from(mysql_table)).scalar()
+        print(f"Total rows to copy from MySQL table `{table_name}`: {total_rows}")
+        resuming = checkpoints is not None and can_resume(state, table_name)
+        if not resuming:
+            start_checkpoint(state, table_name)
+        if total_rows == 0 or not (args.swap or resuming):
+            with mssql_engine.connect() as conn:
+                conn.execute(text(f"TRUNCATE TABLE {table_name}"))
+                conn.execute(text("COMMIT"))
+        if total_rows == 0:
+            table_paths[table_name] = 'skipped (empty)'
+            return None
+
+        key_column = single_key_column(mysql_table)
+        key_columns = list(mysql_table.primary_key.columns)
+        chunked = key_column is not None and (total_rows >= CHUNKED_MIN_ROWS
+                                              or bool(state.get_chunk_plan(table_name)))
+
+        def load(target_table):
+            # TABLOCK on the staging heap allows minimal logging; chunks load concurrently, so not for them
+            writer = make_writer(args.writer, target_table, tablock=args.swap and not chunked)
+            if chunked:
+                with mysql_engine.connect() as mysql_conn:
+                    if args.chunk_split == 'sampled':
+                        key_ranges = pk_ranges_sampled(mysql_conn, mysql_table, key_column, args.chunk_count,
+                                                       total_rows)
+                    else:
+                        key_ranges = pk_ranges_minmax(mysql_conn, mysql_table, key_column, args.chunk_count,
+                                                      total_rows)
+                return copy_table_chunked(mysql_engine, mssql_engine, mysql_table, target_table, key_ranges,
+                                          args.chunk_workers, writer=writer, batch_size=args.batch_size,
+                                          clean_utf8=args.clean_utf8, state=checkpoints, checkpoint_name=table_name,
+                                          pushdown=not args.no_pushdown)
+            if checkpoints is not None and key_columns:
+                with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                    return copy_table_resumable(mysql_conn, conn, mysql_table, target_table, key_columns,
+                                                checkpoints, batch_size=args.batch_size, writer=writer,
+                                                clean_utf8=args.clean_utf8, pushdown=not args.no_pushdown)
+            copy = copy_table_streaming if args.no_pipeline else copy_table_pipelined
+            with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                return copy(mysql_conn, conn, mysql_table, target_table, batch_size=args.batch_size,
+                            clean_utf8=args.clean_utf8, total_rows=total_rows, writer=writer,
+                            pushdown=not args.no_pushdown)
+
+        try:
+            if args.swap:
+                # Readers keep seeing the old rows until the reloaded table is swapped in
+                stats = reload_with_swap(mssql_engine, mssql_table, load, method=args.swap_method)
+            else:
+                stats = load(mssql_table)
+            state.set_checkpoint(table_name, 'done', None, stats['copied'])
+            table_paths[table_name] = ('swap' if args.swap else 'resumed' if resuming else 'full') + \
+                (' (chunked)' if chunked else '')
+        except (SQLAlchemyError, pyodbc.Error, RuntimeError) as e:
+            print(f"Error copying data for table `{table_name}`: {e}")
+            table_paths[table_name] = 'failed'
+            return None
+        if not args.keep_indexes_deferred:
+            # The rows are committed and checkpointed; an index that cannot be built does not undo the copy
+            try:
+                with mssql_engine.connect() as conn:
+                    create_deferred_indexes(conn, mysql_table, schema=mssql_table.schema)
+            except (SQLAlchemyError, pyodbc.Error) as e:
+                print(f"Table `{table_name}`: rows copied, but creating the deferred indexes failed: {e}")
+                table_paths[table_name] += ', indexes failed'
+        print(f"Completed copying table `{table_name}` ({stats['copied']} copied, {stats['skipped']} skipped). "
+              f"Time taken: {time.time() - start_time:.2f} seconds.")
+        return stats
+
+    tables_in_order = order_by_size(table_names, table_sizes)
+    slots = ServerSlots({'mysql': args.workers, 'mssql': args.workers})
+    run_parallel(tables_in_order, copy_one, args.workers, slots=slots)
+
+    state.close()
+
+    print("\nRun summary:")
+    for table_name in tables_in_order:
+        print(f"  {table_name}: {table_paths.get(table_name, 'failed')}")
+    run_metrics.write_report('copy', directory=args.report_dir, prometheus_path=args.prometheus_textfile)
+
+
+def run_export(args):
+    """Extract the selected (or all) tables once into a snapshot folder that import can load any number of times."""
+    mysql_engine, _ = create_engines(args, args.workers)
+    table_sizes = mysql_table_sizes(mysql_engine)
+    table_names = args.tables or list(table_sizes)
+    mysql_tables = ReflectionCache(mysql_engine).tables(table_names)
+    source = f"{args.mysql_host}/{args.mysql_database}"
+
+    def export_one(table_name):
+        with mysql_engine.connect() as mysql_conn:
+            return export_table(mysql_conn, mysql_tables[table_name], args.directory, batch_size=args.batch_size,
+                                file_format=args.format, source=source)
+
+    tables_in_order = order_by_size([name for name in table_names if name in mysql_tables], table_sizes)
+    slots = ServerSlots({'mysql': args.workers})
+    run_parallel(tables_in_order, export_one, args.workers, slots=slots, servers=('mysql',))
+    run_metrics.write_report('export', directory=args.report_dir, prometheus_path=args.prometheus_textfile)
+    print(f"Snapshot written to {args.directory}")
+
+
+def run_import(args):
+    """Reload SQL Server tables from a snapshot folder without reading MySQL."""
+    _, mssql_engine = create_engines(args, args.workers)
+    manifest = read_manifest(args.directory)
+    table_names = args.tables or list(manifest['tables'])
+    mssql_tables = ReflectionCache(mssql_engine).tables(table_names)
+    print(f"Loading snapshot of {manifest.get('source', 'unknown source')} from {args.directory}")
+    table_paths = {}
+
+    def import_one(table_name):
+        entry = manifest['tables'].get(table_name)
+        mssql_table = mssql_tables.get(table_name)
+        if entry is None or mssql_table is None:
+            print(f"Table `{table_name}` is missing from the snapshot or from SQL Server and will be skipped.")
+            table_paths[table_name] = 'skipped'
+            return None
+        path = os.path.join(args.directory, entry['file'])
+
+        def load(target_table):
+            writer = make_writer(args.writer, target_table, tablock=args.swap)
+            with mssql_engine.connect() as conn:
+                return import_table(conn, path, target_table, writer=writer, clean_utf8=args.clean_utf8)
+
+        try:
+            if args.swap:
+                stats = reload_with_swap(mssql_engine, mssql_table, load, method=args.swap_method)
+            else:
+                with mssql_engine.connect() as conn:
+                    conn.execute(text(f"TRUNCATE TABLE {table_name}"))
+                    conn.execute(text("COMMIT"))
+                stats = load(mssql_table)
+        except (SQLAlchemyError, pyodbc.Error, RuntimeError, ValueError) as e:
+            print(f"Error loading table `{table_name}` from {path}: {e}")
+            table_paths[table_name] = 'failed'
+            return None
+        table_paths[table_name] = f"loaded {stats['copied']} of {entry['rows']} rows"
+        return stats
+
+    # The snapshot's own row counts stand in for the size estimates, so the largest files start first
+    snapshot_sizes = {name: (entry['rows'], entry['bytes']) for name, entry in manifest['tables'].items()}
+    tables_in_order = order_by_size(table_names, snapshot_sizes)
+    slots = ServerSlots({'mssql': args.workers})
+    run_parallel(tables_in_order, import_one, args.workers, slots=slots, servers=('mssql',))
+
+    print("\nRun summary:")
+    for table_name in tables_in_order:
+        print(f"  {table_name}: {table_paths.get(table_name, 'failed')}")
+    run_metrics.write_report('import', directory=args.report_dir, prometheus_path=args.prometheus_textfile)
+
+
+def run_sync(args):
+    """Bring each selected SQL Server table in line with MySQL using the checksum diff."""
+    mysql_engine, mssql_engine = create_engines(args, 1)
+    mysql_conn = mysql_engine.raw_connection()
+    mssql_conn = mssql_engine.raw_connection()
+    try:
+        for table_name in args.tables:
+            spec = load_table_spec(mysql_conn, table_name, table_name, args.columns, key=args.key)
+            stats = sync_table(mysql_conn, mssql_conn, spec)
+            print(f"Table `{table_name}`: {stats['inserted']} inserted, {stats['updated']} updated, "
+                  f"{stats['deleted']} deleted.")
+    finally:
+        mysql_conn.close()
+        mssql_conn.close()
+    run_metrics.write_report('sync', directory=args.report_dir, prometheus_path=args.prometheus_textfile)
+
+
+def run_verify(args):
+    """Compare the selected tables row by row and column by column, and write a diff report."""
+    connect_mysql, connect_mssql = connection_factories(args)
+    results = []
+    for table_name in args.tables:
+        mysql_conn = connect_mysql()
+        try:
+            spec = load_table_spec(mysql_conn, table_name, table_name, args.columns, key=args.key)
+        finally:
+            mysql_conn.close()
+        results.append(verify_table(connect_mysql, connect_mssql, spec, workers=args.workers))
+    write_verify_report(results, directory=args.report_dir)
+    run_metrics.write_report('verify', directory=args.report_dir, prometheus_path=args.prometheus_textfile)
+    if not all(result['matches'] for result in results):
+        raise SystemExit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Copy MySQL tables and data to SQL Server.")
+    parser.add_argument('--mysql-host', default=MYSQL_HOST)
+    parser.add_argument('--mysql-user', default=MYSQL_USER)
+    parser.add_argument('--mysql-password', default=MYSQL_PASSWORD)
+    parser.add_argument('--mysql-database', default=MYSQL_DATABASE)
+    parser.add_argument('--mssql', default=MSSQL_CONNECTION, help="ODBC connection string for SQL Server")
+    parser.add_argument('--report-dir', default=REPORT_DIR, help="folder for the JSON/CSV run report")
+    parser.add_argument('--prometheus-textfile', help="also write the run metrics to this node_exporter textfile")
+    modes = parser.add_subparsers(dest='mode', required=True)
+
+    schema = modes.add_parser('schema', help="create the SQL Server tables from the MySQL definitions")
+    schema.add_argument('--tables', nargs='+', help="tables to create (default: all)")
+    schema.add_argument('--create-indexes', action='store_true',
+                        help="create secondary indexes now instead of after the data load")
+    schema.set_defaults(run=run_schema)
+
+    copy = modes.add_parser('copy', help="reload all or the selected tables")
+    copy.add_argument('--tables', nargs='+', help="tables to copy (default: all)")
+    copy.add_argument('--workers', type=int, default=8, help="tables copied at the same time")
+    copy.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    copy.add_argument('--writer', choices=sorted(WRITER_BACKENDS), default=DEFAULT_WRITER)
+    copy.add_argument('--clean-utf8', action='store_true', help="drop characters that are not valid UTF-8")
+    copy.add_argument('--no-pushdown', action='store_true',
+                      help="truncate, re-encode and round values in Python instead of in the MySQL SELECT")
+    copy.add_argument('--no-pipeline', action='store_true',
+                      help="read, convert and write each batch in turn instead of overlapping them")
+    copy.add_argument('--chunk-count', type=int, default=16)
+    copy.add_argument('--chunk-workers', type=int, default=4)
+    copy.add_argument('--chunk-split', choices=('minmax', 'sampled'), default='minmax')
+    copy.add_argument('--swap', action='store_true',
+                      help="load into a staging table and swap it in, instead of truncating the live table")
+    copy.add_argument('--swap-method', choices=('switch', 'rename'), default=SWAP_METHOD)
+    copy.add_argument('--resume', action='store_true',
+                      help="skip tables the last run finished and continue interrupted ones from their checkpoint")
+    copy.add_argument('--checkpoint-batches', action='store_true',
+                      help="checkpoint every committed batch so --resume can continue inside a table; "
+                           "bad batches are bisected and their bad rows written to rejects/")
+    copy.add_argument('--keep-indexes-deferred', action='store_true',
+                      help="do not build deferred secondary indexes after each table")
+    copy.set_defaults(run=run_copy)
+
+    export = modes.add_parser('export', help="extract tables once into a compressed columnar snapshot folder")
+    export.add_argument('--tables', nargs='+', help="tables to export (default: all)")
+    export.add_argument('--directory', default=os.path.join(SNAPSHOT_DIR, f"{datetime.date.today():%Y-%m-%d}"))
+    export.add_argument('--workers', type=int, default=4, help="tables exported at the same time")
+    export.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="rows per stored batch")
+    export.add_argument('--format', choices=sorted(SNAPSHOT_WRITERS),
+                        help="arrow (needs pyarrow) or native (default: arrow when pyarrow is installed)")
+    export.set_defaults(run=run_export)
+
+    load = modes.add_parser('import', help="reload SQL Server tables from a snapshot folder")
+    load.add_argument('--directory', required=True)
+    load.add_argument('--tables', nargs='+', help="tables to load (default: all in the snapshot)")
+    load.add_argument('--workers', type=int, default=8, help="tables loaded at the same time")
+    load.add_argument('--writer', choices=sorted(WRITER_BACKENDS), default=DEFAULT_WRITER)
+    load.add_argument('--clean-utf8', action='store_true', help="drop characters that are not valid UTF-8")
+    load.add_argument('--swap', action='store_true',
+                      help="load into a staging table and swap it in, instead of truncating the live table")
+    load.add_argument('--swap-method', choices=('switch', 'rename'), default=SWAP_METHOD)
+    load.set_defaults(run=run_import)
+
+    sync = modes.add_parser('sync', help="sync tables in place with a chunked checksum diff")
+    sync.add_argument('--tables', nargs='+', required=True)
+    sync.add_argument('--key', help="integer key column (default: the primary key)")
+    sync.add_argument('--columns', nargs='+', help="columns to compare and copy (default: all)")
+    sync.set_defaults(run=run_sync)
+
+    verify = modes.add_parser('verify', help="report rows and columns that differ, without changing anything")
+    verify.add_argument('--tables', nargs='+', required=True)
+    verify.add_argument('--key', help="integer key column (default: the primary key)")
+    verify.add_argument('--columns', nargs='+', help="columns to compare (default: all)")
+    verify.add_argument('--workers', type=int, default=VERIFY_WORKERS, help="key spans checked at the same time")
+    verify.set_defaults(run=run_verify)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    print(f"Mode: {args.mode}")
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import create_engine, text
+
+
+def create_pooled_engine(url, connect, pool_size):
+    """Create an engine whose pool opens a new DB-API connection per checkout slot.
+
+    Unlike `creator=lambda: existing_conn`, every worker gets its own
+    connection, so statements on different tables really run at the same time.
+    Checkouts wait for a free connection instead of timing out, so pool_size
+    is the hard cap on sessions against that server.
+    """
+    return create_engine(url, creator=connect, pool_size=pool_size, max_overflow=0, pool_timeout=None,
+                         pool_pre_ping=True)
+
+
+def mysql_table_sizes(mysql_engine):
+    """Return {table_name: (estimated_rows, data_bytes)} from information_schema for the current database."""
+    query = text(
+        "SELECT TABLE_NAME, COALESCE(TABLE_ROWS, 0), COALESCE(DATA_LENGTH, 0) "
+        "FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'"
+    )
+    with mysql_engine.connect() as conn:
+        return {name: (int(rows), int(size)) for name, rows, size in conn.execute(query)}
+
+
+def order_by_size(table_names, sizes):
+    """Largest tables first (by data size, then row estimate) so the long copies start immediately."""
+    return sorted(table_names, key=lambda name: sizes.get(name, (0, 0))[::-1], reverse=True)
+
+
+class ServerSlots:
+    """Per-server concurrency caps, e.g. {'mysql': 8, 'mssql': 4}."""
+
+    def __init__(self, limits):
+        self.semaphores = {server: threading.BoundedSemaphore(limit) for server, limit in limits.items()}
+
+    def acquire(self, servers):
+        # Always acquire in the same order so two jobs cannot deadlock each other
+        for server in sorted(servers):
+            self.semaphores[server].acquire()
+
+    def release(self, servers):
+        for server in sorted(servers, reverse=True):
+            self.semaphores[server].release()
+
+
+def run_parallel(table_names, copy_one, max_workers, slots=None, servers=('mysql', 'mssql')):
+    """Run copy_one(table_name) for every table on a thread pool.
+
+    Tables are submitted in the given order (use order_by_size), and each job
+    holds one slot on every server it touches while it runs. Returns
+    {table_name: result or exception} and prints the overall wall-clock time.
+    """
+    results = {}
+    run_start = time.time()
+
+    def job(table_name):
+        if slots is not None:
+            slots.acquire(servers)
+        try:
+            return copy_one(table_name)
+        finally:
+            if slots is not None:
+                slots.release(servers)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='copy') as pool:
+        futures = {pool.submit(job, table_name): table_name for table_name in table_names}
+        for future in as_completed(futures):
+            table_name = futures[future]
+            try:
+                results[table_name] = future.result()
+            except Exception as e:
+                print(f"Table `{table_name}` failed: {e}")
+                results[table_name] = e
+
+    print(f"Copied {len(table_names)} tables with {max_workers} workers in {time.time() - run_start:.2f} seconds.")
+    return results
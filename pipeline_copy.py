@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+from copy_metrics import estimate_bytes, run_metrics
+from mysql_pushdown import source_query
+from stream_copy import DEFAULT_BATCH_SIZE, iter_mysql_batches
+
+# Batches each queue between two stages may hold; a full queue makes the faster stage wait
+PIPELINE_QUEUE_DEPTH = 4
+
+# End-of-stream marker passed down the queues
+DONE = object()
+
+
+def put_item(q, item, stop):
+    """Put item on q, waiting for space unless the pipeline was stopped; returns False if it was."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get_item(q, stop):
+    """Take the next item from q, or DONE once the pipeline was stopped."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return DONE
+
+
+def copy_table_pipelined(mysql_conn, mssql_conn, mysql_table, mssql_table,
+                         batch_size=DEFAULT_BATCH_SIZE, clean_utf8=False, total_rows=None, writer=None,
+                         columnar=False, queue_depth=PIPELINE_QUEUE_DEPTH, pushdown=False):
+    """Copy a table with the MySQL read, the conversion and the SQL Server write running at the same time.
+
+    A reader thread streams batches from a server-side cursor into a bounded
+    queue, a converter thread turns them into insert tuples, and the calling
+    thread writes and commits them, so a table takes about as long as its
+    slowest stage instead of the sum of all three. Takes the same arguments
+    and returns the same stats as copy_table_streaming, plus the busy seconds
+    of each stage.
+    """
+    table_name = mssql_table.name
+    column_names = [col.name for col in mssql_table.columns]
+    query, converter = source_query(mysql_conn, mysql_table, mssql_table, clean_utf8=clean_utf8, pushdown=pushdown)
+    convert_batch = converter.convert_batch_columnar if columnar else converter.convert_batch
+    stats = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0}
+    busy = {'read': 0.0, 'convert': 0.0, 'write': 0.0}
+    metrics = run_metrics.table(mysql_table.name)
+    read_queue = queue.Queue(maxsize=queue_depth)
+    write_queue = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        batches = iter_mysql_batches(mysql_conn, query, batch_size)
+        try:
+            while True:
+                start = time.perf_counter()
+                partition = next(batches, DONE)
+                seconds = time.perf_counter() - start
+                busy['read'] += seconds
+                if partition is not DONE:
+                    metrics.record('read', len(partition), seconds, estimate_bytes(partition))
+                if not put_item(read_queue, partition, stop) or partition is DONE:
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            batches.close()
+
+    def convert():
+        try:
+            while True:
+                partition = get_item(read_queue, stop)
+                if partition is DONE:
+                    put_item(write_queue, DONE, stop)
+                    return
+                start = time.perf_counter()
+                batch = convert_batch(partition)
+                seconds = time.perf_counter() - start
+                busy['convert'] += seconds
+                metrics.record('convert', len(partition), seconds, estimate_bytes(batch))
+                if not put_item(write_queue, (batch, len(partition)), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    stages = [threading.Thread(target=read, name=f'{table_name}-read', daemon=True),
+              threading.Thread(target=convert, name=f'{table_name}-convert', daemon=True)]
+    for stage in stages:
+        stage.start()
+
+    copy_start = time.time()
+    batch_start = copy_start
+    try:
+        while True:
+            item = get_item(write_queue, stop)
+            if item is DONE:
+                break
+            batch, read_rows = item
+            stats['skipped'] += read_rows - len(batch)
+            if not batch:
+                continue
+            start = time.perf_counter()
+            if writer is not None:
+                writer.write(mssql_conn, batch)
+            else:
+                mssql_conn.execute(mssql_table.insert(), [dict(zip(column_names, row)) for row in batch])
+            mssql_conn.execute(text("COMMIT"))
+            seconds = time.perf_counter() - start
+            busy['write'] += seconds
+            metrics.record('write', len(batch), seconds, estimate_bytes(batch))
+
+            now = time.time()
+            stats['batches'] += 1
+            stats['copied'] += len(batch)
+            elapsed = now - batch_start
+            rate = len(batch) / elapsed if elapsed > 0 else float('inf')
+            progress = f"{stats['copied']}/{total_rows}" if total_rows else f"{stats['copied']}"
+            print(f"Table `{table_name}` batch {stats['batches']}: {len(batch)} rows in {elapsed:.2f}s "
+                  f"({rate:.0f} rows/s), {progress} rows copied")
+            batch_start = now
+    finally:
+        # On a write error the reader and converter stop at their next queue operation
+        stop.set()
+        for stage in stages:
+            stage.join()
+    if errors:
+        raise errors[0]
+
+    stats['truncated'] = sum(converter.truncated.values())
+    converter.report_truncations()
+    metrics.finish()
+    total_elapsed = time.time() - copy_start
+    for stage, seconds in busy.items():
+        stats[f'{stage}_seconds'] = seconds
+    print(f"Table `{table_name}`: {stats['copied']} rows in {total_elapsed:.2f}s; stages busy "
+          f"read {busy['read']:.2f}s, convert {busy['convert']:.2f}s, write {busy['write']:.2f}s")
+    return stats
@@ -0,0 +1,143 @@
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import MetaData, Table, bindparam, text
+
+# Local SQLite file holding pickled table metadata between runs
+CACHE_PATH = 'reflection_cache.sqlite'
+
+# Per-dialect queries: the server/database the engine points at, and (query, table name column) pairs
+# returning rows per table, column or index whose values change whenever the table's DDL does
+SERVER_QUERIES = {
+    'mysql': "SELECT @@hostname, DATABASE()",
+    'mssql': "SELECT @@SERVERNAME, DB_NAME()",
+    'sqlite': "SELECT 'sqlite', 'main'",
+}
+FINGERPRINT_QUERIES = {
+    'mysql': [
+        ("SELECT TABLE_NAME, CREATE_TIME FROM information_schema.TABLES "
+         "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'", 'TABLE_NAME'),
+        # ALTER TABLE ... ALGORITHM=INSTANT leaves CREATE_TIME alone, so columns and indexes are hashed too
+        ("SELECT TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA, "
+         "CHARACTER_SET_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()", 'TABLE_NAME'),
+        ("SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE, SUB_PART "
+         "FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()", 'TABLE_NAME'),
+    ],
+    # modify_date changes on ALTER TABLE and when an index is created or altered
+    'mssql': [
+        ("SELECT name, object_id, modify_date FROM sys.tables WHERE schema_id = SCHEMA_ID('dbo')", 'name'),
+    ],
+    'sqlite': [
+        ("SELECT name, sql FROM sqlite_master WHERE type = 'table'", 'name'),
+        ("SELECT tbl_name, name, sql FROM sqlite_master WHERE type = 'index'", 'tbl_name'),
+    ],
+}
+
+
+def table_fingerprints(conn, dialect_name, table_names=None):
+    """Return {table_name: fingerprint} for the base tables, limited to table_names when given."""
+    hashes = {}
+    for i, (sql, name_column) in enumerate(FINGERPRINT_QUERIES[dialect_name]):
+        query = text(sql)
+        params = {}
+        if table_names is not None:
+            query = text(f"{sql} AND {name_column} IN :names").bindparams(bindparam('names', expanding=True))
+            params = {'names': list(table_names)}
+        # Sorted, since information_schema rows come back in no particular order
+        for row in sorted((tuple(row) for row in conn.execute(query, params)), key=repr):
+            name = row[0]
+            if i == 0:
+                hashes[name] = hashlib.sha1()
+            if name in hashes:
+                hashes[name].update(repr(row[1:]).encode('utf-8'))
+    return {name: digest.hexdigest() for name, digest in hashes.items()}
+
+
+class ReflectionCache:
+    """Reflect tables lazily and keep them in a local SQLite cache keyed on a schema fingerprint.
+
+    Only the tables asked for are fingerprinted (a few information_schema
+    rows each) and a table is only reflected again when its fingerprint
+    changed, so a two-table job starts without reflecting the whole database.
+    """
+
+    def __init__(self, engine, path=CACHE_PATH):
+        self.engine = engine
+        self.dialect_name = engine.dialect.name
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS reflected_tables ("
+            "server TEXT NOT NULL, table_name TEXT NOT NULL, fingerprint TEXT NOT NULL, metadata BLOB NOT NULL, "
+            "reflected_at TEXT NOT NULL, PRIMARY KEY (server, table_name))"
+        )
+        self.db.commit()
+        self.server = None
+        self.loaded = {}
+
+    def tables(self, table_names):
+        """Return {table_name: Table} for the tables that exist; missing names are left out."""
+        start = time.time()
+        table_names = list(table_names)
+        wanted = [name for name in table_names if name not in self.loaded]
+        hits = reflected = 0
+        if wanted:
+            with self.engine.connect() as conn:
+                if self.server is None:
+                    host, database = conn.execute(text(SERVER_QUERIES[self.dialect_name])).one()
+                    self.server = f"{self.dialect_name}://{host}/{database}"
+                fingerprints = table_fingerprints(conn, self.dialect_name, wanted)
+            for name in wanted:
+                fingerprint = fingerprints.get(name)
+                if fingerprint is None:
+                    self.invalidate(name)
+                    continue
+                table = self.cached_table(name, fingerprint)
+                if table is not None:
+                    hits += 1
+                else:
+                    table = self.reflect(name, fingerprint)
+                    reflected += 1
+                self.loaded[name] = table
+        print(f"Reflection cache ({self.dialect_name}): {hits} tables from cache, {reflected} reflected, "
+              f"{len(wanted) - hits - reflected} missing ({time.time() - start:.2f}s)")
+        return {name: self.loaded[name] for name in table_names if name in self.loaded}
+
+    def table(self, table_name):
+        return self.tables([table_name]).get(table_name)
+
+    def cached_table(self, table_name, fingerprint):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT fingerprint, metadata FROM reflected_tables WHERE server = ? AND table_name = ?",
+                (self.server, table_name),
+            ).fetchone()
+        if row is None or row[0] != fingerprint:
+            return None
+        return pickle.loads(row[1]).tables[table_name]
+
+    def reflect(self, table_name, fingerprint):
+        # Foreign keys are not followed, so referenced tables are not reflected along with this one
+        table = Table(table_name, MetaData(), autoload_with=self.engine, resolve_fks=False)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO reflected_tables (server, table_name, fingerprint, metadata, reflected_at) "
+                "VALUES (?, ?, ?, ?, datetime('now'))",
+                (self.server, table_name, fingerprint, pickle.dumps(table.metadata)),
+            )
+            self.db.commit()
+        return table
+
+    def invalidate(self, table_name):
+        """Forget a table, e.g. after the schema script recreated it."""
+        self.loaded.pop(table_name, None)
+        with self.lock:
+            self.db.execute("DELETE FROM reflected_tables WHERE server = ? AND table_name = ?",
+                            (self.server, table_name))
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
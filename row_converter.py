@@ -0,0 +1,208 @@
+from decimal import ROUND_HALF_UP, Context, Decimal
+from itertools import compress
+
+from sqlalchemy import types as sqltypes
+
+
+# MySQL DECIMAL holds up to 65 digits, more than the default Decimal context
+DECIMAL_CONTEXT = Context(prec=65)
+
+# Decimals bound for a text column (tables created by the old schema script) keep the old two-place format
+TEXT_DECIMALS = 'text'
+
+
+def decimal_handling(source_type, target_type):
+    """How Decimal values headed for target_type are converted.
+
+    Returns None to pass them through, the scale to round them to when the
+    target DECIMAL has a smaller scale than the source, or TEXT_DECIMALS.
+    """
+    if source_type is not None and (not isinstance(source_type, sqltypes.Numeric)
+                                    or isinstance(source_type, sqltypes.Float)):
+        return None
+    if isinstance(target_type, sqltypes.Numeric) and not isinstance(target_type, sqltypes.Float):
+        scale = target_type.scale
+        if scale is None or (source_type is not None and source_type.scale is not None
+                             and source_type.scale <= scale):
+            return None
+        return scale
+    if isinstance(target_type, sqltypes.String):
+        return TEXT_DECIMALS
+    return None
+
+
+class RowConverter:
+    """Convert batches of MySQL rows into SQL Server insert tuples.
+
+    The per-table work (which source column feeds each target column, which
+    columns need truncation, Decimal rounding or a NULL check) is decided
+    once from the reflected schemas and compiled into a specialised Python
+    function, so columns that need no change are copied through untouched and
+    no per-cell isinstance checks or dict lookups remain in the row loop.
+    """
+
+    def __init__(self, source_names, mssql_table, source_types=None, clean_utf8=False, truncation_flags=None):
+        self.table_name = mssql_table.name
+        self.source_names = list(source_names)
+        self.target_names = [col.name for col in mssql_table.columns]
+        source_index = {name: i for i, name in enumerate(self.source_names)}
+
+        # One plan entry per target column: (source index or None, max length, decimal handling, not null)
+        self.plan = []
+        for col in mssql_table.columns:
+            index = source_index.get(col.name)
+            source_type = source_types[index] if source_types is not None and index is not None else None
+            max_length = getattr(col.type, 'length', None)
+            if max_length and isinstance(source_type, sqltypes.String) and source_type.length \
+                    and source_type.length <= max_length:
+                # The source column can never hold a longer value
+                max_length = None
+            decimals = decimal_handling(source_type, col.type)
+            self.plan.append((index, max_length, decimals, not col.nullable))
+        self.clean_utf8 = clean_utf8
+
+        # Truncation counts per target column, reported once per table instead of printed per row
+        self.truncated = {name: 0 for name, (_, max_length, _, _) in zip(self.target_names, self.plan) if max_length}
+        # Columns MySQL already truncated (see mysql_pushdown.py): {source index of a bitmask column: [names by bit]}
+        self.truncation_flags = truncation_flags or {}
+        for names in self.truncation_flags.values():
+            self.truncated.update({name: 0 for name in names})
+        self.passthrough = self.is_passthrough()
+        self.convert_batch = self.compile()
+
+    def is_passthrough(self):
+        """True when rows can be sent as-is: same column order and nothing to check or convert."""
+        return (
+            [index for index, _, _, _ in self.plan] == list(range(len(self.source_names)))
+            and not any(max_length or not_null for _, max_length, _, not_null in self.plan)
+            and all(decimals is None for _, _, decimals, _ in self.plan)
+            and not self.clean_utf8
+        )
+
+    def compile(self):
+        """Generate and compile convert_batch(rows) -> list of tuples for this table."""
+        if self.passthrough:
+            return lambda rows: [tuple(row) for row in rows]
+        if any(index is None and not_null for index, _, _, not_null in self.plan):
+            # A NOT NULL target column has no source column, so every row would be skipped
+            return lambda rows: []
+
+        lines = [
+            "def convert_batch(rows):",
+            "    out = []",
+            "    append = out.append",
+            "    for row in rows:",
+        ]
+        # Rows with NULL in a NOT NULL column are dropped before anything is counted as truncated
+        for index, _, _, not_null in self.plan:
+            if not_null:
+                lines.append(f"        if row[{index}] is None:")
+                lines.append("            continue")
+        for index in self.truncation_flags:
+            lines.append(f"        if row[{index}]:")
+            lines.append(f"            count_flags(row[{index}], {index})")
+        values = []
+        for position, (index, max_length, decimals, not_null) in enumerate(self.plan):
+            if index is None:
+                values.append("None")
+                continue
+            name = f"v{position}"
+            lines.append(f"        {name} = row[{index}]")
+            if max_length or self.clean_utf8:
+                lines.append(f"        if {name}.__class__ is str:")
+                if self.clean_utf8:
+                    lines.append(f"            {name} = {name}.encode('utf-8', 'ignore').decode('utf-8')")
+                if max_length:
+                    lines.append(f"            if len({name}) > {int(max_length)}:")
+                    lines.append(f"                {name} = {name}[:{int(max_length)}]")
+                    lines.append(f"                truncated[{self.target_names[position]!r}] += 1")
+            if decimals is not None:
+                lines.append(f"        if {name}.__class__ is Decimal:")
+                lines.append(f"            {name} = {self.decimal_expression(name, decimals)}")
+            values.append(name)
+        lines.append(f"        append(({', '.join(values)},))")
+        lines.append("    return out")
+
+        namespace = {'Decimal': Decimal, 'ROUND_HALF_UP': ROUND_HALF_UP, 'context': DECIMAL_CONTEXT,
+                     'truncated': self.truncated, 'count_flags': self.count_flags}
+        exec(compile('\n'.join(lines), f"<converter {self.table_name}>", 'exec'), namespace)
+        return namespace['convert_batch']
+
+    def count_flags(self, mask, index):
+        for bit, name in enumerate(self.truncation_flags[index]):
+            if mask >> bit & 1:
+                self.truncated[name] += 1
+
+    @staticmethod
+    def decimal_expression(name, decimals):
+        if decimals == TEXT_DECIMALS:
+            return f"format({name}, '.2f')"
+        # Round half away from zero, as SQL Server does when it narrows a DECIMAL
+        return f"{name}.quantize(Decimal('1e-{int(decimals)}'), ROUND_HALF_UP, context)"
+
+    @staticmethod
+    def convert_decimal(value, decimals):
+        if decimals == TEXT_DECIMALS:
+            return format(value, '.2f')
+        return value.quantize(Decimal(f'1e-{int(decimals)}'), ROUND_HALF_UP, DECIMAL_CONTEXT)
+
+    def convert_batch_columnar(self, rows):
+        """Column-at-a-time variant for numeric-heavy tables.
+
+        Transposes the batch once, runs NULL checks with C-level `None in`
+        scans and only touches the columns that need converting, then zips the
+        columns back into rows.
+        """
+        if not rows:
+            return []
+        source_columns = list(zip(*rows))
+        row_count = len(rows)
+        keep = None
+        for index, _, _, not_null in self.plan:
+            column = source_columns[index] if index is not None else (None,) * row_count
+            if not_null and None in column:
+                mask = [value is not None for value in column]
+                keep = mask if keep is None else [a and b for a, b in zip(keep, mask)]
+        for index in self.truncation_flags:
+            masks = source_columns[index] if keep is None else compress(source_columns[index], keep)
+            for mask in filter(None, masks):
+                self.count_flags(mask, index)
+        columns = []
+        for name, (index, max_length, decimals, not_null) in zip(self.target_names, self.plan):
+            column = source_columns[index] if index is not None else (None,) * row_count
+            if max_length or self.clean_utf8:
+                column = self.convert_string_column(name, column, max_length, keep)
+            if decimals is not None and any(value.__class__ is Decimal for value in column):
+                column = [self.convert_decimal(value, decimals) if value.__class__ is Decimal else value
+                          for value in column]
+            columns.append(column)
+        converted = zip(*columns)
+        return list(compress(converted, keep)) if keep is not None else list(converted)
+
+    def convert_string_column(self, name, column, max_length, keep=None):
+        result = []
+        truncated = 0
+        for position, value in enumerate(column):
+            if value.__class__ is str:
+                if self.clean_utf8:
+                    value = value.encode('utf-8', 'ignore').decode('utf-8')
+                if max_length and len(value) > max_length:
+                    value = value[:max_length]
+                    # Rows dropped for a NULL in a NOT NULL column are not written, so not counted
+                    if keep is None or keep[position]:
+                        truncated += 1
+            result.append(value)
+        if truncated:
+            self.truncated[name] += truncated
+        return result
+
+    def report_truncations(self):
+        for name, count in self.truncated.items():
+            if count:
+                print(f"Table `{self.table_name}`: truncated {count} values in column '{name}'.")
+
+
+def compile_converter(mysql_table, mssql_table, clean_utf8=False):
+    """Build the converter for rows selected with select(mysql_table)."""
+    return RowConverter([col.name for col in mysql_table.columns], mssql_table,
+                        source_types=[col.type for col in mysql_table.columns], clean_utf8=clean_utf8)
@@ -0,0 +1,180 @@
+import csv
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from checksum_sync import (CHUNK_WIDTH, DRILL_FANOUT, LEAF_WIDTH, NULL_MARKER, differing_columns, fetch_range_rows,
+                           find_differing_ranges, mssql_hash_encoding, mssql_rows_sql, mysql_rows_sql)
+from copy_metrics import REPORT_DIR, estimate_bytes, run_metrics
+
+# Key spans checked at the same time; each worker holds one MySQL and one SQL Server connection
+VERIFY_WORKERS = 8
+
+# The key range is cut into this many spans per worker, so one slow span does not leave the other workers idle
+SPANS_PER_WORKER = 4
+
+# Differences kept per table for the report; past this they are only counted
+MAX_REPORTED_DIFFERENCES = 10000
+
+
+def key_bounds(conn, sql):
+    """Run a MIN(key), MAX(key), COUNT(*) query and return the three values."""
+    lowest, highest, count = fetch_range_rows(conn, sql)[0]
+    return lowest, highest, int(count or 0)
+
+
+def key_spans(lower, upper, chunk_width, count):
+    """Split [lower, upper) into at most `count` spans whose starts are multiples of chunk_width."""
+    first = lower // chunk_width * chunk_width
+    chunks = -(-(upper - first) // chunk_width)
+    span_width = max(-(-chunks // count), 1) * chunk_width
+    return [(start, min(start + span_width, upper)) for start in range(first, upper, span_width)]
+
+
+def rendered_rows(conn, spec, sql):
+    """{key: rendered values} for the rows of one leaf range."""
+    return {int(row[spec.key_index]): row for row in fetch_range_rows(conn, sql)}
+
+
+def report_value(value):
+    return None if value == NULL_MARKER else value
+
+
+def compare_range_columns(mysql_conn, mssql_conn, spec, lower, upper):
+    """Compare one leaf range column by column. Returns a list of difference dicts.
+
+    Both servers render the values with the expressions the checksums hash,
+    so a row differs here exactly when it changed its bucket's checksum.
+    kind is 'missing' (only in MySQL), 'extra' (only in SQL Server) or
+    'changed' (one entry per differing column).
+    """
+    source = rendered_rows(mysql_conn, spec, mysql_rows_sql(spec, lower, upper))
+    target = rendered_rows(mssql_conn, spec, mssql_rows_sql(spec, lower, upper))
+    differences = []
+    for key in sorted(set(source) | set(target)):
+        if key not in target:
+            differences.append({'key': key, 'kind': 'missing', 'column': None, 'source': None, 'target': None})
+        elif key not in source:
+            differences.append({'key': key, 'kind': 'extra', 'column': None, 'source': None, 'target': None})
+        else:
+            for name in differing_columns(spec, source[key], target[key]):
+                position = spec.columns.index(name)
+                differences.append({'key': key, 'kind': 'changed', 'column': name,
+                                    'source': report_value(source[key][position]),
+                                    'target': report_value(target[key][position])})
+    return differences
+
+
+def verify_table(connect_mysql, connect_mssql, spec, workers=VERIFY_WORKERS, chunk_width=CHUNK_WIDTH,
+                 leaf_width=LEAF_WIDTH, fanout=DRILL_FANOUT, max_reported=MAX_REPORTED_DIFFERENCES):
+    """Check that the SQL Server table holds the same rows as MySQL, down to the differing rows and columns.
+
+    The key range is split into spans that `workers` threads check at the
+    same time, each on its own pair of DB-API connections from
+    connect_mysql()/connect_mssql(). A span is compared with the per-bucket
+    (count, hash sum) queries of checksum_sync, computed on each server;
+    only leaf ranges whose checksums differ are fetched, one at a time, so
+    memory stays bounded by leaf_width rows per worker whatever the table
+    size. Nothing is written to SQL Server. Returns a result dict for
+    write_verify_report.
+    """
+    metrics = run_metrics.table(spec.mysql_name)
+    verify_start = time.time()
+    result = {'table': spec.mysql_name, 'mssql_table': f"{spec.mssql_schema}.{spec.mssql_name}", 'key': spec.key,
+              'columns': spec.columns, 'source_rows': 0, 'target_rows': 0, 'differing_ranges': 0,
+              'missing': 0, 'extra': 0, 'changed_rows': 0, 'changed_columns': {}, 'differences': [],
+              'truncated_report': False}
+    lock = threading.Lock()
+    local = threading.local()
+    opened = []
+
+    def connections():
+        if not hasattr(local, 'mysql_conn'):
+            local.mysql_conn = connect_mysql()
+            local.mssql_conn = connect_mssql()
+            with lock:
+                opened.extend([local.mysql_conn, local.mssql_conn])
+        return local.mysql_conn, local.mssql_conn
+
+    def record(differences):
+        with lock:
+            result['differing_ranges'] += 1
+            changed_keys = set()
+            for difference in differences:
+                if difference['kind'] == 'changed':
+                    changed_keys.add(difference['key'])
+                    column = difference['column']
+                    result['changed_columns'][column] = result['changed_columns'].get(column, 0) + 1
+                else:
+                    result[difference['kind']] += 1
+            result['changed_rows'] += len(changed_keys)
+            room = max_reported - len(result['differences'])
+            if len(differences) > room:
+                result['truncated_report'] = True
+            result['differences'].extend(differences[:max(room, 0)])
+
+    def verify_span(lower, upper):
+        mysql_conn, mssql_conn = connections()
+        stage_start = time.perf_counter()
+        for range_lower, range_upper in find_differing_ranges(mysql_conn, mssql_conn, spec, lower, upper,
+                                                              chunk_width, leaf_width, fanout):
+            compare_start = time.perf_counter()
+            metrics.record('checksum', 0, compare_start - stage_start)
+            differences = compare_range_columns(mysql_conn, mssql_conn, spec, range_lower, range_upper)
+            stage_start = time.perf_counter()
+            metrics.record('compare', len(differences), stage_start - compare_start, estimate_bytes(
+                [(difference['source'], difference['target']) for difference in differences]))
+            record(differences)
+        metrics.record('checksum', 0, time.perf_counter() - stage_start)
+
+    try:
+        mysql_conn, mssql_conn = connections()
+        spec.hash_encoding = mssql_hash_encoding(mssql_conn)
+        source_low, source_high, result['source_rows'] = key_bounds(
+            mysql_conn, f"SELECT MIN(`{spec.key}`), MAX(`{spec.key}`), COUNT(*) FROM `{spec.mysql_name}`")
+        target_low, target_high, result['target_rows'] = key_bounds(
+            mssql_conn, f"SELECT MIN([{spec.key}]), MAX([{spec.key}]), COUNT_BIG(*) "
+                        f"FROM [{spec.mssql_schema}].[{spec.mssql_name}]")
+        keys = [key for key in (source_low, source_high, target_low, target_high) if key is not None]
+        spans = key_spans(int(min(keys)), int(max(keys)) + 1, chunk_width, workers * SPANS_PER_WORKER) if keys else []
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify') as pool:
+            futures = [pool.submit(verify_span, lower, upper) for lower, upper in spans]
+            for future in as_completed(futures):
+                future.result()
+    finally:
+        for conn in opened:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    metrics.finish()
+
+    result['differences'].sort(key=lambda difference: (difference['key'], difference['column'] or ''))
+    result['seconds'] = round(time.time() - verify_start, 3)
+    result['matches'] = not (result['missing'] or result['extra'] or result['changed_rows'])
+    print(f"Table `{spec.mysql_name}`: {result['source_rows']} rows in MySQL, {result['target_rows']} in SQL Server; "
+          f"{result['missing']} missing, {result['extra']} extra, {result['changed_rows']} changed "
+          f"in {result['differing_ranges']} ranges ({result['seconds']:.2f}s)")
+    for column, count in sorted(result['changed_columns'].items()):
+        print(f"  column `{column}`: {count} values differ")
+    return result
+
+
+def write_verify_report(results, directory=REPORT_DIR):
+    """Write <directory>/verify-<timestamp>.json (summary and differences per table) and a .csv of differences."""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"verify-{datetime.datetime.now():%Y%m%d-%H%M%S}")
+    with open(f"{base}.json", 'w', encoding='utf-8') as json_file:
+        json.dump({'tables': results}, json_file, indent=2, default=str)
+    with open(f"{base}.csv", 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=['table', 'key', 'kind', 'column', 'source', 'target'])
+        writer.writeheader()
+        for result in results:
+            for difference in result['differences']:
+                writer.writerow({'table': result['table'], **difference})
+    print(f"Verification report written to {base}.json and {base}.csv")
+    return base
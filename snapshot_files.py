@@ -0,0 +1,273 @@
+import datetime
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from sqlalchemy import select, text
+from sqlalchemy import types as sqltypes
+
+from copy_metrics import estimate_bytes, run_metrics
+from row_converter import RowConverter
+from stream_copy import DEFAULT_BATCH_SIZE, iter_mysql_batches
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# Folder exports go to (one sub-folder per snapshot) and the manifest listing the tables in a snapshot
+SNAPSHOT_DIR = 'snapshots'
+MANIFEST_NAME = 'manifest.json'
+
+# Arrow IPC files (when pyarrow is installed) are compressed per buffer with this codec. Compressed buffers
+# are decompressed on read; with None the memory-mapped Arrow buffers are read in place, at the cost of larger
+# files. Neither format loads zero-copy: pyodbc takes Python tuples, so every stored batch is turned back into
+# rows (to_pylist for Arrow, unpickling for the native format) before it is written
+ARROW_COMPRESSION = 'zstd'
+
+# Without pyarrow, tables are written in the native format: column-wise pickled chunks compressed with zlib
+NATIVE_COMPRESSION_LEVEL = 6
+NATIVE_MAGIC = b'MYSNAP1\n'
+LENGTH = struct.Struct('<Q')
+
+FILE_EXTENSIONS = {'arrow': '.arrow', 'native': '.snap'}
+
+
+def default_format():
+    return 'arrow' if pyarrow is not None else 'native'
+
+
+def arrow_type(column_type):
+    """Arrow type for a reflected MySQL column type; strings for anything without a closer match."""
+    if isinstance(column_type, sqltypes.Boolean):
+        return pyarrow.bool_()
+    if isinstance(column_type, sqltypes.Integer):
+        return pyarrow.uint64() if getattr(column_type, 'unsigned', False) else pyarrow.int64()
+    if isinstance(column_type, sqltypes.Float):
+        return pyarrow.float64()
+    if isinstance(column_type, sqltypes.Numeric):
+        precision = column_type.precision or 38
+        scale = column_type.scale or 0
+        # MySQL allows DECIMAL(65, 30); decimal128 stops at 38 digits
+        return (pyarrow.decimal128(precision, scale) if precision <= 38
+                else pyarrow.decimal256(precision, scale))
+    if isinstance(column_type, sqltypes.DateTime):
+        return pyarrow.timestamp('us')
+    if isinstance(column_type, sqltypes.Date):
+        return pyarrow.date32()
+    if isinstance(column_type, sqltypes.Time):
+        # pymysql returns TIME values as timedelta (they can be negative or above 24 hours)
+        return pyarrow.duration('us')
+    if isinstance(column_type, (sqltypes._Binary, sqltypes.BINARY)) or type(column_type).__name__ == 'BIT':
+        return pyarrow.large_binary()
+    return pyarrow.large_string()
+
+
+class ArrowSnapshotWriter:
+    """Write batches of rows to an Arrow IPC file, one record batch per MySQL batch."""
+
+    def __init__(self, path, column_names, column_types):
+        self.column_names = list(column_names)
+        self.schema = pyarrow.schema(
+            [pyarrow.field(name, arrow_type(column_type)) for name, column_type in zip(column_names, column_types)],
+            metadata={b'sqlalchemy_types': pickle.dumps(list(column_types))},
+        )
+        options = pyarrow.ipc.IpcWriteOptions(compression=ARROW_COMPRESSION)
+        self.sink = pyarrow.OSFile(path, 'wb')
+        self.writer = pyarrow.ipc.new_file(self.sink, self.schema, options=options)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        arrays = []
+        for field, values in zip(self.schema, columns):
+            try:
+                arrays.append(pyarrow.array(values, type=field.type))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, OverflowError) as e:
+                raise ValueError(f"Column `{field.name}` does not fit Arrow type {field.type}: {e}") from e
+        self.writer.write_batch(pyarrow.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+
+class NativeSnapshotWriter:
+    """Write batches of rows as length-prefixed, zlib-compressed, column-wise pickled chunks.
+
+    Layout: magic, header length, pickled header (column names and types),
+    then one (length, chunk) pair per batch. Only read files this tool wrote:
+    chunks are unpickled.
+    """
+
+    def __init__(self, path, column_names, column_types):
+        self.file = open(path, 'wb')
+        header = pickle.dumps({'columns': list(column_names), 'types': list(column_types)})
+        self.file.write(NATIVE_MAGIC + LENGTH.pack(len(header)) + header)
+
+    def write(self, rows):
+        chunk = zlib.compress(pickle.dumps(list(zip(*rows)), protocol=5), NATIVE_COMPRESSION_LEVEL)
+        self.file.write(LENGTH.pack(len(chunk)) + chunk)
+
+    def close(self):
+        self.file.close()
+
+
+SNAPSHOT_WRITERS = {'arrow': ArrowSnapshotWriter, 'native': NativeSnapshotWriter}
+
+
+def iter_arrow_batches(path):
+    """Yield (column_names, column_types, rows) per record batch of a memory-mapped Arrow IPC file."""
+    with pyarrow.memory_map(path, 'r') as source:
+        reader = pyarrow.ipc.open_file(source)
+        column_names = reader.schema.names
+        column_types = pickle.loads(reader.schema.metadata[b'sqlalchemy_types'])
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield column_names, column_types, list(zip(*(column.to_pylist() for column in batch.columns)))
+
+
+def iter_native_batches(path):
+    """Yield (column_names, column_types, rows) per chunk of a native snapshot, reading it through mmap."""
+    with open(path, 'rb') as snapshot_file, \
+            mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            if bytes(view[:len(NATIVE_MAGIC)]) != NATIVE_MAGIC:
+                raise ValueError(f"{path} is not a native snapshot file")
+            offset = len(NATIVE_MAGIC)
+            (header_length,) = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            header = pickle.loads(view[offset:offset + header_length])
+            offset += header_length
+            while offset < len(view):
+                (chunk_length,) = LENGTH.unpack_from(view, offset)
+                offset += LENGTH.size
+                columns = pickle.loads(zlib.decompress(view[offset:offset + chunk_length]))
+                offset += chunk_length
+                yield header['columns'], header['types'], list(zip(*columns))
+        finally:
+            view.release()
+
+
+def iter_snapshot_batches(path):
+    if path.endswith(FILE_EXTENSIONS['arrow']):
+        if pyarrow is None:
+            raise RuntimeError(f"{path} is an Arrow file; install pyarrow to load it")
+        return iter_arrow_batches(path)
+    return iter_native_batches(path)
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'tables': {}}
+    with open(path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+manifest_lock = threading.Lock()
+
+
+def record_in_manifest(directory, table_name, entry, source=None):
+    """Add or replace one table in the snapshot manifest (exports of several tables run in parallel)."""
+    with manifest_lock:
+        manifest = read_manifest(directory)
+        if source is not None:
+            manifest['source'] = source
+        manifest['tables'][table_name] = entry
+        temp_path = os.path.join(directory, MANIFEST_NAME + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+
+
+def export_table(mysql_conn, mysql_table, directory, batch_size=DEFAULT_BATCH_SIZE, file_format=None, source=None):
+    """Stream a MySQL table into <directory>/<table>.arrow (or .snap) and record it in the manifest.
+
+    The file is written under a temporary name and renamed when complete, so
+    an interrupted export never leaves a file that looks loadable. Returns
+    the manifest entry.
+    """
+    table_name = mysql_table.name
+    file_format = file_format or default_format()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, table_name + FILE_EXTENSIONS[file_format])
+    temp_path = path + '.partial'
+    metrics = run_metrics.table(table_name)
+    writer = SNAPSHOT_WRITERS[file_format](temp_path, [col.name for col in mysql_table.columns],
+                                           [col.type for col in mysql_table.columns])
+    rows = 0
+    export_start = time.time()
+    try:
+        stage_start = time.perf_counter()
+        for partition in iter_mysql_batches(mysql_conn, select(mysql_table), batch_size):
+            read_end = time.perf_counter()
+            metrics.record('read', len(partition), read_end - stage_start, estimate_bytes(partition))
+            writer.write(partition)
+            stage_start = time.perf_counter()
+            metrics.record('export', len(partition), stage_start - read_end)
+            rows += len(partition)
+    finally:
+        writer.close()
+    os.replace(temp_path, path)
+    metrics.finish()
+
+    entry = {'file': os.path.basename(path), 'format': file_format, 'rows': rows, 'bytes': os.path.getsize(path),
+             'exported_at': datetime.datetime.now().isoformat(timespec='seconds')}
+    record_in_manifest(directory, table_name, entry, source)
+    elapsed = time.time() - export_start
+    print(f"Table `{table_name}`: exported {rows} rows to {path} ({entry['bytes'] / 2 ** 20:.1f} MiB) "
+          f"in {elapsed:.2f}s")
+    return entry
+
+
+def import_table(mssql_conn, path, mssql_table, writer=None, clean_utf8=False):
+    """Load a snapshot file into a SQL Server table, converting and committing one stored batch at a time.
+
+    Rows go through the same RowConverter as a direct copy, built from the
+    MySQL column types stored in the file. Returns the stats dict of
+    copy_table_streaming.
+    """
+    table_name = mssql_table.name
+    column_names = [col.name for col in mssql_table.columns]
+    metrics = run_metrics.table(table_name)
+    stats = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0}
+    converter = None
+    import_start = time.time()
+    stage_start = time.perf_counter()
+    for source_names, source_types, rows in iter_snapshot_batches(path):
+        read_end = time.perf_counter()
+        metrics.record('read', len(rows), read_end - stage_start, estimate_bytes(rows))
+        if converter is None:
+            converter = RowConverter(source_names, mssql_table, source_types=source_types, clean_utf8=clean_utf8)
+        batch = converter.convert_batch(rows)
+        stats['skipped'] += len(rows) - len(batch)
+        convert_end = time.perf_counter()
+        metrics.record('convert', len(rows), convert_end - read_end, estimate_bytes(batch))
+        stage_start = convert_end
+        if not batch:
+            continue
+        if writer is not None:
+            writer.write(mssql_conn, batch)
+        else:
+            mssql_conn.execute(mssql_table.insert(), [dict(zip(column_names, row)) for row in batch])
+        mssql_conn.execute(text("COMMIT"))
+        stage_start = time.perf_counter()
+        metrics.record('write', len(batch), stage_start - convert_end, estimate_bytes(batch))
+        stats['batches'] += 1
+        stats['copied'] += len(batch)
+
+    if converter is not None:
+        stats['truncated'] = sum(converter.truncated.values())
+        converter.report_truncations()
+    metrics.finish()
+    elapsed = time.time() - import_start
+    rate = stats['copied'] / elapsed if elapsed > 0 else float('inf')
+    print(f"Table `{table_name}`: loaded {stats['copied']} rows from {path} in {elapsed:.2f}s ({rate:.0f} rows/s)")
+    return stats
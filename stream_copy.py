@@ -0,0 +1,141 @@
+import time
+
+from sqlalchemy import and_, or_, select, text
+
+from copy_metrics import estimate_bytes, run_metrics
+from mysql_pushdown import source_query
+
+# Default number of rows sent to SQL Server per insert/commit
+DEFAULT_BATCH_SIZE = 5000
+
+
+def iter_mysql_batches(mysql_conn, query, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the rows of a MySQL query in lists of at most batch_size rows."""
+    # stream_results makes the pymysql dialect use an unbuffered SSCursor, so
+    # only one batch is held in memory instead of the whole result set; it is
+    # set on this statement, since on the connection it would stay for the caller's later queries
+    result = mysql_conn.execute(query.execution_options(stream_results=True))
+    try:
+        for partition in result.partitions(batch_size):
+            yield partition
+    finally:
+        result.close()
+
+
+def get_key_columns(mysql_table, key_column_names=None):
+    """Return the columns to page on: the given unique columns or the reflected primary key."""
+    if key_column_names:
+        return [mysql_table.c[name] for name in key_column_names]
+    return list(mysql_table.primary_key.columns)
+
+
+def keyset_after(key_columns, last_key):
+    """Build `(k1, k2, ...) > last_key` expanded so MySQL can use the index range."""
+    clauses = []
+    for i, col in enumerate(key_columns):
+        equal_prefix = [key_columns[j] == last_key[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, col > last_key[i]))
+    return or_(*clauses)
+
+
+class AdaptiveBatchSizer:
+    """Grow or shrink the batch size so each batch takes roughly target_seconds."""
+
+    def __init__(self, initial=1000, minimum=100, maximum=50000, target_seconds=1.0):
+        self.batch_size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+
+    def record(self, rows, seconds):
+        # Only adjust on full batches; the last short batch says nothing about speed
+        if rows < self.batch_size:
+            return
+        if seconds < self.target_seconds / 2:
+            self.batch_size = min(self.batch_size * 2, self.maximum)
+        elif seconds > self.target_seconds * 2:
+            self.batch_size = max(self.batch_size // 2, self.minimum)
+
+
+def iter_keyset_batches(mysql_conn, mysql_table, key_columns, sizer, start_after=None, query=None):
+    """Page through a table with `WHERE key > last_seen ORDER BY key LIMIT n`.
+
+    Unlike OFFSET/LIMIT every page is an index range scan, so late pages cost
+    the same as early ones. query replaces select(mysql_table), e.g. with a
+    pushdown SELECT; it must return the key columns untransformed under their
+    own names (source_query does, given the same key_columns).
+    Yields (rows, last_key) per page.
+    """
+    key_names = [col.name for col in key_columns]
+    last_key = tuple(start_after) if start_after is not None else None
+    while True:
+        limit = sizer.batch_size
+        page = (query if query is not None else select(mysql_table)).order_by(*key_columns).limit(limit)
+        if last_key is not None:
+            page = page.where(keyset_after(key_columns, last_key))
+        rows = mysql_conn.execute(page).fetchall()
+        if not rows:
+            return
+        last_key = tuple(rows[-1]._mapping[name] for name in key_names)
+        yield rows, last_key
+        if len(rows) < limit:
+            return
+
+
+def copy_table_streaming(mysql_conn, mssql_conn, mysql_table, mssql_table,
+                         batch_size=DEFAULT_BATCH_SIZE, clean_utf8=False, total_rows=None, writer=None,
+                         columnar=False, pushdown=False):
+    """Copy a table in fixed-size batches without loading it into memory.
+
+    writer is a bulk_writers backend; without one rows go through the
+    SQLAlchemy insert. columnar=True converts each batch column by column,
+    which is faster for numeric-heavy tables. pushdown=True lets MySQL
+    truncate, re-encode and round the values (mysql_pushdown.py). Returns a
+    dict with the number of copied, skipped and truncated rows.
+    """
+    table_name = mssql_table.name
+    column_names = [col.name for col in mssql_table.columns]
+    query, converter = source_query(mysql_conn, mysql_table, mssql_table, clean_utf8=clean_utf8, pushdown=pushdown)
+    convert_batch = converter.convert_batch_columnar if columnar else converter.convert_batch
+    stats = {'copied': 0, 'skipped': 0, 'truncated': 0, 'batches': 0}
+    metrics = run_metrics.table(mysql_table.name)
+
+    # Pipeline: MySQL batches from a server-side cursor -> compiled converter -> one insert per batch
+    copy_start = time.time()
+    batch_start = copy_start
+    stage_start = time.perf_counter()
+    for partition in iter_mysql_batches(mysql_conn, query, batch_size):
+        read_end = time.perf_counter()
+        metrics.record('read', len(partition), read_end - stage_start, estimate_bytes(partition))
+        batch = convert_batch(partition)
+        stats['skipped'] += len(partition) - len(batch)
+        convert_end = time.perf_counter()
+        metrics.record('convert', len(partition), convert_end - read_end, estimate_bytes(batch))
+        stage_start = convert_end
+        if not batch:
+            continue
+        if writer is not None:
+            writer.write(mssql_conn, batch)
+        else:
+            mssql_conn.execute(mssql_table.insert(), [dict(zip(column_names, row)) for row in batch])
+        mssql_conn.execute(text("COMMIT"))
+        stage_start = time.perf_counter()
+        metrics.record('write', len(batch), stage_start - convert_end, estimate_bytes(batch))
+
+        now = time.time()
+        stats['batches'] += 1
+        stats['copied'] += len(batch)
+        elapsed = now - batch_start
+        rate = len(batch) / elapsed if elapsed > 0 else float('inf')
+        progress = f"{stats['copied']}/{total_rows}" if total_rows else f"{stats['copied']}"
+        print(f"Table `{table_name}` batch {stats['batches']}: {len(batch)} rows in {elapsed:.2f}s "
+              f"({rate:.0f} rows/s), {progress} rows copied")
+        batch_start = now
+
+    stats['truncated'] = sum(converter.truncated.values())
+    converter.report_truncations()
+    metrics.finish()
+    total_elapsed = time.time() - copy_start
+    if stats['copied'] and total_elapsed > 0:
+        print(f"Table `{table_name}`: average throughput {stats['copied'] / total_elapsed:.0f} rows/s")
+    return stats
@@ -0,0 +1,220 @@
+import contextlib
+import time
+
+from sqlalchemy import MetaData, text
+
+from bulk_writers import quote_name
+
+# Suffixes of the tables the new rows are loaded into and the old rows are switched out to
+STAGING_SUFFIX = '__staging'
+RETIRED_SUFFIX = '__retired'
+
+# 'switch' swaps the data with ALTER TABLE ... SWITCH (keeps the target's permissions, triggers and
+# dependent views); 'rename' swaps the tables with sp_rename, for targets SWITCH refuses (e.g. referenced
+# by foreign keys)
+SWAP_METHOD = 'switch'
+
+# How long the SWITCH waits behind running queries before giving up; readers are not blocked meanwhile
+LOW_PRIORITY_WAIT_MINUTES = 1
+
+
+def table_indexes(conn, qualified_name):
+    """Return the target's rowstore indexes as dicts, clustered first, each with its key and included columns."""
+    indexes = {}
+    for index_id, name, type_desc, is_unique, is_primary_key, is_unique_constraint, filter_definition in conn.execute(
+        text("SELECT index_id, name, type_desc, is_unique, is_primary_key, is_unique_constraint, filter_definition "
+             "FROM sys.indexes WHERE object_id = OBJECT_ID(:table) AND type IN (1, 2) ORDER BY type, index_id"),
+        {'table': qualified_name},
+    ):
+        indexes[index_id] = {'name': name, 'type': type_desc, 'unique': bool(is_unique),
+                             'primary_key': bool(is_primary_key), 'unique_constraint': bool(is_unique_constraint),
+                             'filter': filter_definition, 'keys': [], 'include': []}
+    for index_id, column_name, descending, included in conn.execute(
+        text("SELECT ic.index_id, c.name, ic.is_descending_key, ic.is_included_column "
+             "FROM sys.index_columns ic "
+             "JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id "
+             "WHERE ic.object_id = OBJECT_ID(:table) ORDER BY ic.index_id, ic.key_ordinal, ic.index_column_id"),
+        {'table': qualified_name},
+    ):
+        if index_id not in indexes:
+            continue
+        if included:
+            indexes[index_id]['include'].append(quote_name(column_name))
+        else:
+            indexes[index_id]['keys'].append(quote_name(column_name) + (' DESC' if descending else ''))
+    return list(indexes.values())
+
+
+def index_statements(conn, table_name, copy_name, schema='dbo', suffix=STAGING_SUFFIX, defaults=False):
+    """DDL that gives copy_name the target's indexes, key constraints and CHECK constraints.
+
+    Constraint names are schema-wide, so copies get the original name plus
+    suffix; index names only need to be unique per table and are kept.
+    """
+    source = quote_name(f"{schema}.{table_name}")
+    target = quote_name(f"{schema}.{copy_name}")
+    statements = []
+    for index in table_indexes(conn, source):
+        kind = 'CLUSTERED' if index['type'] == 'CLUSTERED' else 'NONCLUSTERED'
+        keys = ', '.join(index['keys'])
+        if index['primary_key'] or index['unique_constraint']:
+            constraint = 'PRIMARY KEY' if index['primary_key'] else 'UNIQUE'
+            statements.append(f"ALTER TABLE {target} ADD CONSTRAINT {quote_name(index['name'] + suffix)} "
+                              f"{constraint} {kind} ({keys})")
+            continue
+        unique = 'UNIQUE ' if index['unique'] else ''
+        statement = f"CREATE {unique}{kind} INDEX {quote_name(index['name'])} ON {target} ({keys})"
+        if index['include']:
+            statement += f" INCLUDE ({', '.join(index['include'])})"
+        if index['filter']:
+            statement += f" WHERE {index['filter']}"
+        statements.append(statement)
+    for name, definition in conn.execute(
+        text("SELECT name, definition FROM sys.check_constraints "
+             "WHERE parent_object_id = OBJECT_ID(:table) AND is_disabled = 0"),
+        {'table': source},
+    ):
+        statements.append(f"ALTER TABLE {target} WITH CHECK ADD CONSTRAINT {quote_name(name + suffix)} "
+                          f"CHECK {definition}")
+    if defaults:
+        for name, column_name, definition in conn.execute(
+            text("SELECT dc.name, c.name, dc.definition FROM sys.default_constraints dc "
+                 "JOIN sys.columns c ON c.object_id = dc.parent_object_id AND c.column_id = dc.parent_column_id "
+                 "WHERE dc.parent_object_id = OBJECT_ID(:table)"),
+            {'table': source},
+        ):
+            statements.append(f"ALTER TABLE {target} ADD CONSTRAINT {quote_name(name + suffix)} "
+                              f"DEFAULT {definition} FOR {quote_name(column_name)}")
+    return statements
+
+
+def drop_table_if_exists(conn, table_name, schema='dbo'):
+    qualified_name = quote_name(f"{schema}.{table_name}")
+    conn.execute(text(f"IF OBJECT_ID(:table, 'U') IS NOT NULL DROP TABLE {qualified_name}"),
+                 {'table': qualified_name})
+
+
+def create_heap_copy(conn, table_name, copy_name, schema='dbo'):
+    """Create an empty heap with the target's columns (including IDENTITY) on the target's filegroup."""
+    source = quote_name(f"{schema}.{table_name}")
+    target = quote_name(f"{schema}.{copy_name}")
+    drop_table_if_exists(conn, copy_name, schema)
+    filegroup = conn.execute(
+        text("SELECT ds.name FROM sys.indexes i JOIN sys.data_spaces ds ON ds.data_space_id = i.data_space_id "
+             "WHERE i.object_id = OBJECT_ID(:table) AND i.index_id IN (0, 1) AND ds.type = 'FG' "
+             "AND ds.is_default = 0"),
+        {'table': source},
+    ).scalar()
+    # SWITCH needs both tables on the same filegroup; SELECT INTO uses the default one unless told otherwise
+    on_filegroup = f" ON {quote_name(filegroup)}" if filegroup else ''
+    conn.execute(text(f"SELECT TOP 0 * INTO {target}{on_filegroup} FROM {source}"))
+    conn.execute(text("COMMIT"))
+
+
+def run_statements(conn, table_name, statements):
+    for statement in statements:
+        start = time.time()
+        conn.execute(text(statement))
+        conn.execute(text("COMMIT"))
+        print(f"Table `{table_name}`: {statement[:100]} ({time.time() - start:.2f}s)")
+
+
+def swap_by_switch(conn, table_name, schema='dbo'):
+    """Switch the target's rows out to the retired table and the staging rows in, in one transaction."""
+    target = quote_name(f"{schema}.{table_name}")
+    staging = quote_name(f"{schema}.{table_name}{STAGING_SUFFIX}")
+    retired = quote_name(f"{schema}.{table_name}{RETIRED_SUFFIX}")
+    create_heap_copy(conn, table_name, f"{table_name}{RETIRED_SUFFIX}", schema)
+    # The retired table is empty, so building its indexes is instant
+    run_statements(conn, table_name, index_statements(conn, table_name, f"{table_name}{RETIRED_SUFFIX}", schema,
+                                                      suffix=RETIRED_SUFFIX))
+    low_priority = (f"WITH (WAIT_AT_LOW_PRIORITY (MAX_DURATION = {LOW_PRIORITY_WAIT_MINUTES} MINUTES, "
+                    f"ABORT_AFTER_WAIT = SELF))")
+    # Both switches run in one transaction (the connection is not in autocommit mode)
+    try:
+        conn.execute(text(f"ALTER TABLE {target} SWITCH TO {retired} {low_priority}"))
+        conn.execute(text(f"ALTER TABLE {staging} SWITCH TO {target} {low_priority}"))
+        conn.execute(text("COMMIT"))
+    except Exception:
+        conn.execute(text("IF @@TRANCOUNT > 0 ROLLBACK"))
+        raise
+    drop_table_if_exists(conn, f"{table_name}{RETIRED_SUFFIX}", schema)
+    drop_table_if_exists(conn, f"{table_name}{STAGING_SUFFIX}", schema)
+    conn.execute(text("COMMIT"))
+
+
+def swap_by_rename(conn, table_name, schema='dbo'):
+    """Rename the staging table over the target in one transaction, then give constraints their names back."""
+    staged_constraints = [name for (name,) in conn.execute(
+        text("SELECT name FROM sys.objects "
+             "WHERE parent_object_id = OBJECT_ID(:table) AND type IN ('PK', 'UQ', 'C', 'D')"),
+        {'table': quote_name(f"{schema}.{table_name}{STAGING_SUFFIX}")},
+    )]
+    try:
+        conn.execute(text("EXEC sp_rename :old, :new"),
+                     {'old': f"{schema}.{table_name}", 'new': f"{table_name}{RETIRED_SUFFIX}"})
+        conn.execute(text("EXEC sp_rename :old, :new"),
+                     {'old': f"{schema}.{table_name}{STAGING_SUFFIX}", 'new': table_name})
+        conn.execute(text("COMMIT"))
+    except Exception:
+        conn.execute(text("IF @@TRANCOUNT > 0 ROLLBACK"))
+        raise
+    drop_table_if_exists(conn, f"{table_name}{RETIRED_SUFFIX}", schema)
+    for name in staged_constraints:
+        if name.endswith(STAGING_SUFFIX):
+            conn.execute(text("EXEC sp_rename :old, :new, 'OBJECT'"),
+                         {'old': f"{schema}.{name}", 'new': name[:-len(STAGING_SUFFIX)]})
+    conn.execute(text("COMMIT"))
+
+
+@contextlib.contextmanager
+def swap_session(mssql_engine, conn=None):
+    """The connection to run a swap step on: conn when the caller lends one, else a pooled one."""
+    if conn is not None:
+        yield conn
+    else:
+        with mssql_engine.connect() as pooled_conn:
+            yield pooled_conn
+
+
+def reload_with_swap(mssql_engine, mssql_table, load, method=SWAP_METHOD, conn=None):
+    """Reload a table without readers ever seeing it empty or half loaded.
+
+    load(staging_table) copies the rows into staging_table, a Table with the
+    target's columns that exists on the server as a heap, so the load runs
+    without index maintenance (minimally logged with TABLOCK under the SIMPLE
+    or BULK_LOGGED recovery model). The target's indexes and constraints are
+    then built on the loaded heap and the staging table is swapped in
+    atomically. If anything fails before the swap, the target is untouched.
+    With conn every step runs on that connection instead of checking one out
+    of mssql_engine's pool, for callers that already hold a pooled session.
+    Returns whatever load returned.
+    """
+    table_name = mssql_table.name
+    schema = mssql_table.schema or 'dbo'
+    staging_name = f"{table_name}{STAGING_SUFFIX}"
+    with swap_session(mssql_engine, conn) as session:
+        create_heap_copy(session, table_name, staging_name, schema)
+    staging_table = mssql_table.to_metadata(MetaData(), name=staging_name)
+
+    try:
+        result = load(staging_table)
+        with swap_session(mssql_engine, conn) as session:
+            # Indexes are built once over the loaded rows instead of maintained row by row
+            run_statements(session, table_name, index_statements(session, table_name, staging_name, schema,
+                                                                 defaults=(method == 'rename')))
+            swap_start = time.time()
+            if method == 'rename':
+                swap_by_rename(session, table_name, schema)
+            else:
+                swap_by_switch(session, table_name, schema)
+            print(f"Table `{table_name}`: swapped in the reloaded table ({method}) in {time.time() - swap_start:.2f}s")
+    except Exception:
+        with swap_session(mssql_engine, conn) as session:
+            # A failed statement may have left the lent connection inside a transaction
+            session.execute(text("IF @@TRANCOUNT > 0 ROLLBACK"))
+            drop_table_if_exists(session, staging_name, schema)
+            drop_table_if_exists(session, f"{table_name}{RETIRED_SUFFIX}", schema)
+            session.execute(text("COMMIT"))
+        raise
+    return result
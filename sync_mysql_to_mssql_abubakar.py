@@ -2,6 +2,10 @@ import pymysql
 import pyodbc
 import logging
 
+from bulk_writers import WRITER_BACKENDS
+from checksum_sync import load_table_spec, sync_table
+from copy_metrics import run_metrics
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -26,20 +30,15 @@ mssql_conn_str = (
 mssql_conn = pyodbc.connect(mssql_conn_str)
 mssql_cursor = mssql_conn.cursor()
 
-def fetch_mysql_data():
-    try:
-        logging.info("Fetching data from MySQL...")
-        mysql_cursor = mysql_conn.cursor()
-        mysql_cursor.execute("SELECT id, first_name, last_name, user_name, password, role, status, email FROM user_tb")
-        data = mysql_cursor.fetchall()
-        mysql_cursor.close()  # Close MySQL cursor after use
-        logging.info(f"Fetched {len(data)} rows from MySQL.")
-        
-        # Convert data to tuples for hashable comparison
-        return [tuple(row) for row in data]
-    except Exception as e:
-        logging.error(f"Error fetching data from MySQL: {e}")
-        return []
+# Bulk writer backend used to insert new rows (executemany, fast_executemany, bulk_insert); changed rows are
+# always merged, since a plain insert cannot update them
+WRITER_BACKEND = 'fast_executemany'
+
+# Columns of user_tb kept in sync (the key `id` first)
+USER_TB_COLUMNS = ['id', 'first_name', 'last_name', 'user_name', 'password', 'role', 'status', 'email']
+
+# Optional Prometheus textfile (node_exporter textfile collector) written next to the JSON/CSV run report
+PROMETHEUS_TEXTFILE = None
 
 def count_mssql_records():
     try:
@@ -52,41 +51,20 @@ def count_mssql_records():
         logging.error(f"Error counting records in MSSQL: {e}")
         return 0
 
-def compare_and_sync_data(mysql_data):
+def compare_and_sync_data():
     try:
         # Get the current record count in MSSQL
         initial_mssql_count = count_mssql_records()
 
-        # Fetch existing data from MSSQL to compare
-        logging.info("Fetching data from MSSQL for comparison...")
-        mssql_cursor.execute("SELECT id, first_name, last_name, user_name, password, role, status, email FROM dbo.user_tb")
-        mssql_data = mssql_cursor.fetchall()
-
-        # Convert MSSQL data to tuples for comparison
-        mssql_data_tuples = [tuple(row) for row in mssql_data]
-
-        # Convert data to sets for comparison
-        mysql_set = set(mysql_data)
-        mssql_set = set(mssql_data_tuples)
-
-        identical_records = mysql_set.intersection(mssql_set)
-        new_records = mysql_set - mssql_set
-
-        logging.info(f"Identical records between MySQL and MSSQL: {len(identical_records)}")
-        logging.info(f"New records to be inserted into MSSQL: {len(new_records)}")
-
-        # Insert new records into MSSQL
-        if new_records:
-            insert_query = """
-            INSERT INTO dbo.user_tb (id, first_name, last_name, user_name, password, role, status, email) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            for row in new_records:
-                mssql_cursor.execute(insert_query, row)
-            mssql_conn.commit()
-            logging.info(f"Inserted {len(new_records)} new records into MSSQL.")
-        else:
-            logging.info("No new records to insert into MSSQL.")
+        # Compare per-key-range checksums computed on each server and only pull rows from ranges that differ
+        logging.info("Comparing MySQL and MSSQL checksums per key range...")
+        spec = load_table_spec(mysql_conn, 'user_tb', 'user_tb', USER_TB_COLUMNS, key='id')
+        writer = WRITER_BACKENDS[WRITER_BACKEND]('user_tb', USER_TB_COLUMNS, schema='dbo')
+        stats = sync_table(mysql_conn, mssql_conn, spec, writer=writer)
+
+        logging.info(f"New records inserted into MSSQL: {stats['inserted']}")
+        logging.info(f"Changed records updated in MSSQL: {stats['updated']}")
+        logging.info(f"Records deleted from MSSQL: {stats['deleted']}")
 
         # Final count of records in MSSQL after the sync
         final_mssql_count = count_mssql_records()
@@ -97,14 +75,8 @@ def compare_and_sync_data(mysql_data):
 
 def main():
     logging.info("Synchronization process started.")
-    
-    # Fetch data from MySQL
-    mysql_data = fetch_mysql_data()
-    
-    if mysql_data:
-        compare_and_sync_data(mysql_data)
-    else:
-        logging.warning("No data fetched from MySQL. Skipping synchronization.")
+    compare_and_sync_data()
+    run_metrics.write_report('sync', prometheus_path=PROMETHEUS_TEXTFILE)
 
 if __name__ == "__main__":
     try:
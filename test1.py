@@ -1,41 +1,68 @@
 import pyodbc
 import pymysql
-from sqlalchemy import create_engine, MetaData, Table, select, text, func
+from sqlalchemy import select, text, func
 from sqlalchemy.exc import SQLAlchemyError, DataError
 import time
-from decimal import Decimal
-
-# SQL Server connection (using pyodbc)
-mssql_conn = pyodbc.connect(
-    'DRIVER={ODBC Driver 17 for SQL Server};'
-    'SERVER=ipack-svr-rpt;DATABASE=Report_1;'
-    'Trusted_Connection=yes;'
-)
-
-# MySQL connection (using pymysql)
-mysql_conn = pymysql.connect(
-    host='sever_address',
-    user='test123',
-    password='test123',
-    db='hotpack_test'
-)
-
-# Create SQLAlchemy engines with existing connections
-mysql_engine = create_engine('mysql+pymysql://', creator=lambda: mysql_conn)
-mssql_engine = create_engine('mssql+pyodbc://', creator=lambda: mssql_conn)
-
-# MySQL metadata reflection
-mysql_metadata = MetaData()
-mysql_metadata.reflect(bind=mysql_engine)
-mysql_tables = mysql_metadata.tables
-
-# SQL Server metadata reflection
-mssql_metadata = MetaData()
-mssql_metadata.reflect(bind=mssql_engine)
+
+from bulk_writers import DEFAULT_WRITER, make_writer
+from copy_metrics import run_metrics
+from chunked_copy import copy_table_chunked, pk_ranges_minmax, pk_ranges_sampled, single_key_column
+from parallel_copy import create_pooled_engine
+from reflection_cache import ReflectionCache
+from pipeline_copy import copy_table_pipelined
+
+# Tables with at least CHUNKED_MIN_ROWS rows and a single-column primary key are split into CHUNK_COUNT
+# key ranges copied by CHUNK_WORKERS workers; CHUNK_SPLIT is 'minmax' or 'sampled' (skewed keys)
+CHUNKED_MIN_ROWS = 5_000_000
+CHUNK_COUNT = 16
+CHUNK_WORKERS = 4
+CHUNK_SPLIT = 'minmax'
+
+
+# SQL Server connection (using pyodbc); every pooled connection is opened with this
+def connect_mssql():
+    return pyodbc.connect(
+        'DRIVER={ODBC Driver 17 for SQL Server};'
+        'SERVER=ipack-svr-rpt;DATABASE=Report_1;'
+        'Trusted_Connection=yes;'
+    )
+
+
+# MySQL connection (using pymysql); every pooled connection is opened with this
+def connect_mysql():
+    return pymysql.connect(
+        host='sever_address',
+        user='test123',
+        password='test123',
+        db='hotpack_test'
+    )
+
+
+# Create SQLAlchemy engines with one pooled connection per chunk worker on each side
+mysql_engine = create_pooled_engine('mysql+pymysql://', connect_mysql, CHUNK_WORKERS)
+mssql_engine = create_pooled_engine('mssql+pyodbc://', connect_mssql, CHUNK_WORKERS)
 
 # Tables to process
 tables_to_process = ['inquiry_bom_update', 'pack_weight_info']
 
+# Reflect only the tables to process, reusing cached metadata when their DDL has not changed
+mysql_tables = ReflectionCache(mysql_engine).tables(tables_to_process)
+mssql_tables = ReflectionCache(mssql_engine).tables(tables_to_process)
+
+# Number of rows read from MySQL and inserted into SQL Server per batch
+BATCH_SIZE = 5000
+
+# Bulk writer backend per table (executemany, fast_executemany, tvp, bulk_insert); others use DEFAULT_WRITER
+TABLE_WRITERS = {}
+
+# Let MySQL re-encode strings as utf8mb4, cut them to the SQL Server column lengths and round decimals in the
+# SELECT (mysql_pushdown.py), instead of doing it per cell in Python
+PUSHDOWN = True
+
+# Per-stage rows/s, bytes/s, batch latencies, retries and peak memory go to reports/copy-<time>.json and .csv;
+# set PROMETHEUS_TEXTFILE to also write them for the node_exporter textfile collector
+PROMETHEUS_TEXTFILE = None
+
 # Loop through each specified table
 for table_name in tables_to_process:
     print(f"\nStarting to process table: {table_name}")
@@ -43,7 +70,7 @@ for table_name in tables_to_process:
 
     # Get MySQL and SQL Server table metadata
     mysql_table = mysql_tables.get(table_name)
-    mssql_table = mssql_metadata.tables.get(table_name)
+    mssql_table = mssql_tables.get(table_name)
 
     if mysql_table is not None and mssql_table is not None:
         # Fetch total rows from MySQL for progress tracking
@@ -57,52 +84,30 @@ for table_name in tables_to_process:
             conn.execute(text(f"TRUNCATE TABLE {table_name}"))
             conn.execute(text("COMMIT"))
 
-        # Fetch SQL Server column lengths
-        column_max_lengths = {col.name: col.type.length for col in mssql_table.columns if hasattr(col.type, 'length')}
-        print(f"Column max lengths for `{table_name}` in SQL Server: {column_max_lengths}")
-
-        # Fetch data from MySQL and prepare for insertion into SQL Server
-        with mysql_engine.connect() as mysql_conn:
-            mysql_data = mysql_conn.execute(select(mysql_table)).fetchall()
-            insert_data = []
-
-            for row in mysql_data:
-                insert_row = {}
-                for mssql_col in mssql_table.columns:
-                    value = row._mapping.get(mssql_col.name)
-
-                    # Apply UTF-8 encoding and truncation for strings if necessary
-                    max_length = column_max_lengths.get(mssql_col.name)
-                    if isinstance(value, str):
-                        value = value.encode('utf-8', errors='ignore').decode('utf-8')
-                        if max_length and len(value) > max_length:
-                            print(f"Truncating `{mssql_col.name}` in `{table_name}`: Original length = {len(value)}, Max length = {max_length}")
-                            value = value[:max_length]
-
-                    # Handle Decimal values explicitly
-                    if isinstance(value, Decimal):
-                        # Convert to a formatted string with fixed precision (e.g., 10, 2 for two decimal places)
-                        value = f"{value:.2f}"
-
-                    # Check for None values in non-nullable columns
-                    if not mssql_col.nullable and value is None:
-                        print(f"Skipping row due to NULL in non-nullable column `{mssql_col.name}`.")
-                        break
-
-                    insert_row[mssql_col.name] = value
-                insert_data.append(insert_row)
-
-            # Insert data into SQL Server and catch any errors
-            with mssql_engine.connect() as conn:
-                try:
-                    conn.execute(mssql_table.insert(), insert_data)
-                    conn.execute(text("COMMIT"))
-                    print(f"Table `{table_name}`: All rows copied successfully.")
-                except DataError as e:
-                    print(f"Data error copying data for table `{table_name}`: {e}")
-                    print(f"Problematic row data: {insert_data[-1]}")
-                except SQLAlchemyError as e:
-                    print(f"Error copying data for table `{table_name}`: {e}")
+        # Stream rows from MySQL and insert them in fixed-size batches so memory stays flat
+        writer = make_writer(TABLE_WRITERS.get(table_name, DEFAULT_WRITER), mssql_table)
+        key_column = single_key_column(mysql_table)
+        try:
+            if key_column is not None and total_rows >= CHUNKED_MIN_ROWS:
+                # Very large table: copy disjoint primary key ranges in parallel, one transaction per chunk
+                with mysql_engine.connect() as mysql_conn:
+                    if CHUNK_SPLIT == 'sampled':
+                        key_ranges = pk_ranges_sampled(mysql_conn, mysql_table, key_column, CHUNK_COUNT, total_rows)
+                    else:
+                        key_ranges = pk_ranges_minmax(mysql_conn, mysql_table, key_column, CHUNK_COUNT, total_rows)
+                stats = copy_table_chunked(mysql_engine, mssql_engine, mysql_table, mssql_table, key_ranges,
+                                           CHUNK_WORKERS, writer=writer, batch_size=BATCH_SIZE, clean_utf8=True,
+                                           pushdown=PUSHDOWN)
+            else:
+                with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                    stats = copy_table_pipelined(mysql_conn, conn, mysql_table, mssql_table,
+                                                 batch_size=BATCH_SIZE, clean_utf8=True, total_rows=total_rows,
+                                                 writer=writer, pushdown=PUSHDOWN)
+            print(f"Table `{table_name}`: All rows copied successfully ({stats['copied']} copied, {stats['skipped']} skipped).")
+        except DataError as e:
+            print(f"Data error copying data for table `{table_name}`: {e}")
+        except (SQLAlchemyError, pyodbc.Error, RuntimeError) as e:
+            print(f"Error copying data for table `{table_name}`: {e}")
 
         end_time = time.time()
         time_taken = end_time - start_time
@@ -112,3 +117,4 @@ for table_name in tables_to_process:
         print(f"Table `{table_name}` does not exist in one of the databases and will be skipped.")
 
 print("\nData transfer for specified tables from MySQL to SQL Server is complete!")
+run_metrics.write_report('copy', prometheus_path=PROMETHEUS_TEXTFILE)
@@ -0,0 +1,55 @@
+class RecordingCursor:
+    """DB-API cursor that records every statement and its parameters; statements containing fail_on raise."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.fast_executemany = False
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql)
+        self.connection.params.append(params)
+        if self.connection.fail_on and self.connection.fail_on in sql:
+            raise RuntimeError(f"failed: {sql}")
+
+    def executemany(self, sql, rows):
+        self.execute(sql, rows)
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.params = []
+        self.fail_on = fail_on
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+
+class ScriptedCursor(RecordingCursor):
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        self.rows = self.connection.results.pop(0) if self.connection.results else []
+
+    def fetchall(self):
+        return self.rows
+
+
+class ScriptedConnection(RecordingConnection):
+    """Connection whose queries return the given result lists in order (then empty results)."""
+
+    def __init__(self, *results):
+        super().__init__()
+        self.results = list(results)
+        self.commits = 0
+
+    def cursor(self):
+        return ScriptedCursor(self)
+
+    def commit(self):
+        self.commits += 1
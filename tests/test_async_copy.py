@@ -0,0 +1,142 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select, text
+
+import async_copy
+import swap_reload
+from async_copy import copy_small_tables, small_tables
+
+
+class InsertWriter:
+    """Plain SQLAlchemy inserts into the table the writer was made for."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def write(self, conn, rows):
+        conn.execute(self.table.insert(), [dict(zip(self.table.c.keys(), row)) for row in rows])
+
+
+@pytest.fixture
+def pair(tmp_path, monkeypatch):
+    engines, tables = [], []
+    for name in ('source', 'target'):
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        metadata = MetaData()
+        table = Table('t', metadata, Column('id', Integer, primary_key=True), Column('name', String(20)))
+        metadata.create_all(engine)
+        engines.append(engine)
+        tables.append(table)
+    with engines[0].begin() as conn:
+        conn.execute(tables[0].insert(), [{'id': key, 'name': f"n{key}"} for key in range(1, 6)])
+    with engines[1].begin() as conn:
+        conn.execute(tables[1].insert(), [{'id': 99, 'name': 'old'}])
+
+    writers = []
+
+    def make_writer(backend, mssql_table, **options):
+        writers.append((backend, mssql_table.name, options))
+        return InsertWriter(mssql_table)
+
+    monkeypatch.setattr(async_copy, 'make_writer', make_writer)
+    # SQLite has no TRUNCATE TABLE
+    monkeypatch.setattr(async_copy, 'truncate_table',
+                        lambda conn, mssql_table: conn.execute(text(f"DELETE FROM {mssql_table.name}")))
+    return engines, tables, writers
+
+
+def target_rows(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(select(table.c.id).order_by(table.c.id)).scalars().all()
+
+
+def test_small_tables_filter_on_both_limits():
+    sizes = {'a': (10, 100), 'b': (10, 10 ** 9), 'c': (10 ** 6, 100)}
+    assert small_tables(['a', 'b', 'c', 'd'], sizes) == ['a']
+
+
+def test_reload_uses_the_table_writer(pair):
+    (source_engine, target_engine), (source, target), writers = pair
+    results = copy_small_tables(source_engine, target_engine, [(source, target)], concurrency=1,
+                                writer_backend='fast_executemany', table_writers={'t': 'tvp'})
+    assert results['t']['copied'] == 5
+    assert writers == [('tvp', 't', {})]
+    assert target_rows(target_engine, target) == [1, 2, 3, 4, 5]
+
+
+def test_after_copy_failure_keeps_the_table_copied(pair):
+    (source_engine, target_engine), (source, target), _ = pair
+
+    def after_copy(conn, mysql_table, mssql_table, rows):
+        raise RuntimeError("bookkeeping failed")
+
+    results = copy_small_tables(source_engine, target_engine, [(source, target)], concurrency=1,
+                                writer_backend='executemany', after_copy=after_copy)
+    assert isinstance(results['t'], dict)
+    assert str(results['t']['after_copy_error']) == "bookkeeping failed"
+    assert target_rows(target_engine, target) == [1, 2, 3, 4, 5]
+
+
+def test_swap_loads_the_staging_table(pair, monkeypatch):
+    (source_engine, target_engine), (source, target), writers = pair
+    staging = Table('t__staging', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(20)))
+    staging.create(target_engine)
+    swapped = []
+
+    def reload_with_swap(mssql_engine, mssql_table, load, conn=None):
+        assert conn is not None
+        load(staging)
+        swapped.append(mssql_table.name)
+
+    monkeypatch.setattr(async_copy, 'reload_with_swap', reload_with_swap)
+    results = copy_small_tables(source_engine, target_engine, [(source, target)], concurrency=1,
+                                writer_backend='executemany', swap=True)
+    assert results['t']['copied'] == 5
+    assert swapped == ['t']
+    assert writers == [('executemany', 't__staging', {'tablock': True})]
+    # The live table is not truncated; the swap replaces it
+    assert target_rows(target_engine, target) == [99]
+    assert target_rows(target_engine, staging) == [1, 2, 3, 4, 5]
+
+
+def test_swap_runs_on_the_worker_sessions(tmp_path, monkeypatch):
+    names = ['a', 'b', 'c', 'd']
+    source_engine = create_engine(f"sqlite:///{tmp_path / 'source'}.db")
+    target_path = str(tmp_path / 'target.db')
+    # As in the all-tables script no more SQL Server sessions than small-table workers, but a checkout gives
+    # up after a few seconds instead of waiting forever
+    target_engine = create_engine(f"sqlite:///{target_path}", pool_size=2, max_overflow=0, pool_timeout=3,
+                                  creator=lambda: sqlite3.connect(target_path, timeout=30, check_same_thread=False))
+    pairs = []
+    for name in names:
+        source = Table(name, MetaData(), Column('id', Integer, primary_key=True))
+        target = Table(name, MetaData(), Column('id', Integer, primary_key=True))
+        source.create(source_engine)
+        target.create(target_engine)
+        with source_engine.begin() as conn:
+            conn.execute(source.insert(), [{'id': key} for key in range(1, 4)])
+        pairs.append((source, target))
+
+    def create_heap_copy(conn, table_name, copy_name, schema='dbo'):
+        conn.execute(text(f"DROP TABLE IF EXISTS {copy_name}"))
+        conn.execute(text(f"CREATE TABLE {copy_name} AS SELECT * FROM {table_name} WHERE 0"))
+        conn.commit()
+
+    def swap_by_switch(conn, table_name, schema='dbo'):
+        conn.execute(text(f"DELETE FROM {table_name}"))
+        conn.execute(text(f"INSERT INTO {table_name} SELECT * FROM {table_name}{swap_reload.STAGING_SUFFIX}"))
+        conn.execute(text(f"DROP TABLE {table_name}{swap_reload.STAGING_SUFFIX}"))
+        conn.execute(text("COMMIT"))
+
+    # SQLite stand-ins for the SQL Server DDL; the connection handling is the real one
+    monkeypatch.setattr(swap_reload, 'create_heap_copy', create_heap_copy)
+    monkeypatch.setattr(swap_reload, 'index_statements', lambda *args, **kwargs: [])
+    monkeypatch.setattr(swap_reload, 'swap_by_switch', swap_by_switch)
+    monkeypatch.setattr(async_copy, 'make_writer', lambda backend, mssql_table, **options: InsertWriter(mssql_table))
+
+    results = copy_small_tables(source_engine, target_engine, pairs, concurrency=2, writer_backend='executemany',
+                                swap=True)
+    assert all(isinstance(results[name], dict) and results[name]['copied'] == 3 for name in names)
+    for _, target in pairs:
+        assert target_rows(target_engine, target) == [1, 2, 3]
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import func, select
+
+import benchmark_copy
+from benchmark_copy import build_tables, create_engines, prepare, run_scenario
+
+ROWS = 300
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark_copy, 'TABLE_SHAPES', {
+        'narrow': {'rows': ROWS, 'strings': 2, 'decimals': 1, 'integers': 1, 'datetimes': 1}})
+    monkeypatch.setattr(benchmark_copy, 'BATCH_SIZE', 64)
+    monkeypatch.setattr(benchmark_copy, 'SYNC_LEAF_WIDTH', 100)
+    monkeypatch.setattr(benchmark_copy, 'SCHEMA_TABLES', 2)
+    prepare(str(tmp_path))
+    return str(tmp_path)
+
+
+def target_state(workdir):
+    _, mssql_engine = create_engines(workdir)
+    _, mssql_table = build_tables('narrow')
+    with mssql_engine.connect() as conn:
+        return conn.execute(select(func.count(), func.sum(mssql_table.c.id))).one()
+
+
+def test_copy_scenarios_produce_the_same_target(workdir):
+    states = {}
+    for scenario in ('baseline', 'streaming', 'pipelined', 'chunked', 'resumable'):
+        result = run_scenario(scenario, 'narrow', workdir)
+        assert result['rows'] == ROWS
+        states[scenario] = target_state(workdir)
+    assert len(set(states.values())) == 1
+    # Rows with NULL in a NOT NULL target column are skipped by every copier
+    assert 0 < states['baseline'][0] < ROWS
+
+
+def test_sync_and_schema_scenarios_run(workdir):
+    assert run_scenario('sync', 'narrow', workdir)['rows'] == ROWS
+    assert run_scenario('schema', 'narrow', workdir)['rows'] == 2
@@ -0,0 +1,118 @@
+import json
+
+import pymysqlreplication
+import pytest
+from pymysqlreplication.row_event import UpdateRowsEvent, WriteRowsEvent
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+from binlog_cdc import CdcApplier, RowChange, changes_from_binlog, changes_from_file, load_position, run_cdc
+from fakes import ScriptedConnection
+
+
+def make_table():
+    return Table('t', MetaData(), Column('id', Integer, primary_key=True, autoincrement=False),
+                 Column('name', String(3)))
+
+
+def sent_rows(conn, statement_start):
+    return [list(params) for sql, params in zip(conn.statements, conn.params) if sql.startswith(statement_start)]
+
+
+def test_updates_replay_as_delete_then_upsert(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    path.write_text('\n'.join(json.dumps(event) for event in [
+        {'op': 'insert', 'table': 't', 'values': {'id': 1}, 'log_file': 'b.1', 'log_pos': 10},
+        {'op': 'update', 'table': 't', 'values': {'id': 2}, 'before': {'id': 1}, 'log_file': 'b.1', 'log_pos': 20},
+    ]) + '\n\n')
+    changes = [(change.op, change.values['id'], change.position) for change in changes_from_file(str(path))]
+    assert changes == [('upsert', 1, ('b.1', 10)), ('delete', 1, ('b.1', 20)), ('upsert', 2, ('b.1', 20))]
+
+
+def test_last_change_per_key_wins_and_position_is_saved_after_commit(tmp_path):
+    conn = ScriptedConnection()
+    position_path = str(tmp_path / 'position.json')
+    applier = CdcApplier(conn, {'t': make_table()}, position_path=position_path)
+    run_cdc([
+        RowChange('upsert', 't', {'id': 1, 'name': 'abcdef'}, ('b.1', 10)),
+        RowChange('upsert', 't', {'id': 2, 'name': 'x'}, ('b.1', 20)),
+        RowChange('delete', 't', {'id': 2, 'name': 'x'}, ('b.1', 30)),
+        RowChange('upsert', 't', {'id': 9}, ('b.1', 40)),
+    ], applier)
+    assert applier.stats == {'upserted': 2, 'deleted': 1, 'skipped': 0, 'batches': 1}
+    assert sent_rows(conn, 'INSERT INTO #upsert_stage') == [[(1, 'abc'), (9, None)]]
+    assert sent_rows(conn, 'INSERT INTO #delete_stage') == [[(2,)]]
+    assert conn.commits == 1
+    assert load_position(position_path) == ('b.1', 40)
+
+
+def test_flush_never_splits_an_event(tmp_path):
+    conn = ScriptedConnection()
+    applier = CdcApplier(conn, {'t': make_table()}, position_path=str(tmp_path / 'position.json'), batch_size=1)
+    # Two rows of one multi-row event share a position, so they are committed together
+    run_cdc([
+        RowChange('upsert', 't', {'id': 1}, ('b.1', 10)),
+        RowChange('upsert', 't', {'id': 2}, ('b.1', 10)),
+        RowChange('upsert', 't', {'id': 3}, ('b.1', 20)),
+    ], applier)
+    assert applier.stats['batches'] == 2
+    assert sent_rows(conn, 'INSERT INTO #upsert_stage') == [[(1, None), (2, None)], [(3, None)]]
+
+
+class FakeWrite(WriteRowsEvent):
+    rows = None
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+
+class FakeUpdate(UpdateRowsEvent):
+    rows = None
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+
+class FakeStream:
+    def __init__(self, events, **options):
+        self.events = events
+        self.options = options
+        self.log_file = 'b.1'
+        self.log_pos = 10
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        pass
+
+
+def stream_of(monkeypatch, events):
+    streams = []
+
+    def reader(**options):
+        streams.append(FakeStream(events, **options))
+        return streams[-1]
+
+    monkeypatch.setattr(pymysqlreplication, 'BinLogStreamReader', reader)
+    return streams
+
+
+def test_binlog_rows_are_read_with_column_names(monkeypatch):
+    streams = stream_of(monkeypatch, [FakeUpdate('t', [{'before_values': {'id': 1}, 'after_values': {'id': 2}}])])
+    changes = list(changes_from_binlog({}, 1, 'db', ['t']))
+    assert streams[0].options['use_column_name_cache'] is True
+    assert [(change.op, change.values) for change in changes] == [('delete', {'id': 1}), ('upsert', {'id': 2})]
+
+
+def test_binlog_rows_without_column_names_stop_the_stream(monkeypatch):
+    stream_of(monkeypatch, [FakeWrite('t', [{'values': {'UNKNOWN_COL0': 1, 'UNKNOWN_COL1': 'x'}}])])
+    with pytest.raises(RuntimeError, match='binlog_row_metadata=FULL'):
+        list(changes_from_binlog({}, 1, 'db', ['t']))
+
+
+def test_tables_without_a_primary_key_are_refused():
+    keyless = Table('k', MetaData(), Column('id', Integer), Column('name', String(3)))
+    with pytest.raises(ValueError, match='k'):
+        CdcApplier(ScriptedConnection(), {'t': make_table(), 'k': keyless})
@@ -0,0 +1,98 @@
+import pytest
+
+from sqlalchemy import Integer, String
+
+from bulk_writers import (BulkInsertWriter, BulkWriter, ExecutemanyWriter, FastExecutemanyWriter, TvpWriter,
+                          quote_name)
+from fakes import RecordingConnection, RecordingCursor, ScriptedConnection
+from mssql_upsert import upsert_rows
+
+
+def test_quote_name_splits_schema():
+    assert quote_name('dbo.user_tb') == '[dbo].[user_tb]'
+    assert quote_name('[dbo].[user_tb]') == '[dbo].[user_tb]'
+
+
+def test_base_writer_is_abstract():
+    with pytest.raises(TypeError):
+        BulkWriter('t', ['id'])
+
+
+def test_identity_insert_wraps_batch():
+    conn = RecordingConnection()
+    ExecutemanyWriter('t', ['id', 'name'], identity_insert=True).write(conn, [(1, 'a')])
+    assert conn.statements == ['SET IDENTITY_INSERT [dbo].[t] ON',
+                               'INSERT INTO [dbo].[t] ([id], [name]) VALUES (?, ?)',
+                               'SET IDENTITY_INSERT [dbo].[t] OFF']
+
+
+@pytest.mark.parametrize('writer_class', [ExecutemanyWriter, FastExecutemanyWriter])
+def test_identity_insert_switched_off_when_batch_fails(writer_class):
+    conn = RecordingConnection(fail_on='INSERT INTO')
+    with pytest.raises(RuntimeError):
+        writer_class('t', ['id'], identity_insert=True).write(conn, [(1,)])
+    assert conn.statements[-1] == 'SET IDENTITY_INSERT [dbo].[t] OFF'
+
+
+def test_empty_batch_sends_nothing():
+    conn = RecordingConnection()
+    ExecutemanyWriter('t', ['id'], identity_insert=True).write(conn, [])
+    assert conn.statements == []
+
+
+def test_upsert_cleans_session_when_merge_fails():
+    conn = RecordingConnection(fail_on='MERGE')
+    with pytest.raises(RuntimeError):
+        upsert_rows(conn, 't', ['id', 'name'], ['id'], [(1, 'a')], identity_insert=True)
+    assert 'SET IDENTITY_INSERT [dbo].[t] OFF' in conn.statements
+    assert conn.statements[-1].endswith('DROP TABLE #upsert_stage')
+
+
+def test_bulk_insert_file_keeps_empty_strings_apart_from_nulls(tmp_path):
+    written = []
+
+    class KeepingCursor(RecordingCursor):
+        def execute(self, sql, params=None):
+            # The data file is removed after the load, so read it while the statement runs
+            written.extend(path.read_text(encoding='utf-8') for path in tmp_path.glob('*.dat'))
+            super().execute(sql, params)
+
+    conn = RecordingConnection()
+    conn.cursor = lambda: KeepingCursor(conn)
+    BulkInsertWriter('t', ['id', 'name'], local_dir=str(tmp_path)).write(conn, [(1, ''), (2, None)])
+    assert written == ['1\x1f\x00\x1e2\x1f\x1e']
+    assert 'KEEPNULLS' in conn.statements[0] and 'TABLOCK' not in conn.statements[0]
+    with pytest.raises(ValueError):
+        BulkInsertWriter.format_value('a\x00b')
+
+
+def test_bulk_insert_takes_a_table_lock_only_when_asked(tmp_path):
+    conn = RecordingConnection()
+    BulkInsertWriter('t', ['id'], local_dir=str(tmp_path), tablock=True).write(conn, [(1,)])
+    assert conn.statements[0].endswith('KEEPNULLS, TABLOCK)')
+
+
+def tvp_statements(*results):
+    conn = ScriptedConnection(*results)
+    TvpWriter('t', ['id', 'name'], [Integer(), String(20)]).write(conn, [(1, 'a')])
+    return [sql.split(' AS TABLE')[0].split('EXEC(')[-1].strip("'") for sql in conn.statements
+            if not sql.startswith('SELECT')]
+
+
+def test_tvp_type_is_created_when_missing():
+    assert tvp_statements([])[0] == 'CREATE TYPE [dbo].[t_tvp]'
+
+
+def test_tvp_type_is_kept_while_it_matches_the_target():
+    type_columns = [('id', 56, 4, 10, 0), ('name', 167, 20, 0, 0)]
+    statements = tvp_statements(type_columns, type_columns)
+    assert statements == ['INSERT INTO [dbo].[t] ([id], [name]) SELECT [id], [name] FROM ?']
+
+
+def test_tvp_type_is_recreated_when_the_target_changed():
+    # name was widened to VARCHAR(50) on the target since the type was created
+    statements = tvp_statements([('id', 56, 4, 10, 0), ('name', 167, 20, 0, 0)],
+                                [('id', 56, 4, 10, 0), ('name', 167, 50, 0, 0)])
+    assert statements[:2] == ['DROP TYPE [dbo].[t_tvp]', 'CREATE TYPE [dbo].[t_tvp]']
+    # A type with other columns is recreated without looking at the target
+    assert tvp_statements([('id', 56, 4, 10, 0)])[:2] == ['DROP TYPE [dbo].[t_tvp]', 'CREATE TYPE [dbo].[t_tvp]']
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from checkpoint_copy import can_resume, copy_table_resumable, start_checkpoint
+from copy_state import CopyStateStore
+
+
+class FailingWriter:
+    """Plain SQLAlchemy inserts that raise a connection-style error on the given call."""
+
+    def __init__(self, table, fail_on_call=None):
+        self.table = table
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+
+    def write(self, conn, rows):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("connection lost")
+        conn.execute(self.table.insert(), [dict(zip(self.table.c.keys(), row)) for row in rows])
+
+
+def make_pair(tmp_path, rows):
+    engines, tables = [], []
+    for name in ('source', 'target'):
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        metadata = MetaData()
+        table = Table('t', metadata, Column('id', Integer, primary_key=True), Column('name', String(20)))
+        metadata.create_all(engine)
+        engines.append(engine)
+        tables.append(table)
+    with engines[0].begin() as conn:
+        conn.execute(tables[0].insert(), [{'id': key, 'name': f"n{key}"} for key in rows])
+    return engines, tables
+
+
+def test_interrupted_copy_resumes_after_last_committed_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (source_engine, target_engine), (source, target) = make_pair(tmp_path, range(1, 26))
+    state = CopyStateStore(str(tmp_path / 'state.sqlite'))
+    start_checkpoint(state, 't')
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        with pytest.raises(RuntimeError):
+            copy_table_resumable(mysql_conn, mssql_conn, source, target, [source.c.id], state, batch_size=10,
+                                 writer=FailingWriter(target, fail_on_call=2))
+    assert can_resume(state, 't')
+    assert state.get_checkpoint('t')[1:] == ((10,), 10)
+
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        stats = copy_table_resumable(mysql_conn, mssql_conn, source, target, [source.c.id], state, batch_size=10,
+                                     writer=FailingWriter(target))
+    assert stats['copied'] == 25
+    with target_engine.connect() as conn:
+        assert conn.execute(select(target.c.id).order_by(target.c.id)).scalars().all() == list(range(1, 26))
+    assert state.get_checkpoint('t')[0] == 'done'
+    state.close()
+
+
+def test_bad_rows_are_bisected_out_to_rejects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (source_engine, target_engine), (source, target) = make_pair(tmp_path, range(1, 11))
+    # Key 7 is already on the target, so its insert violates the primary key
+    with target_engine.begin() as conn:
+        conn.execute(target.insert(), [{'id': 7, 'name': 'old'}])
+    state = CopyStateStore(str(tmp_path / 'state.sqlite'))
+    start_checkpoint(state, 't')
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        stats = copy_table_resumable(mysql_conn, mssql_conn, source, target, [source.c.id], state, batch_size=10)
+    assert stats['copied'] == 9
+    assert stats['rejected'] == 1
+    assert '"id": 7' in (tmp_path / 'rejects' / 't.jsonl').read_text()
+    state.close()
@@ -0,0 +1,77 @@
+import pytest
+
+import checksum_sync
+from bulk_writers import ExecutemanyWriter
+from checksum_sync import (TableSpec, compare_range, mssql_hash_encoding, mssql_row_hash, mssql_value_expr,
+                           mysql_row_hash, mysql_value_expr, sync_table)
+from fakes import ScriptedConnection
+
+COLUMN_TYPES = {'id': 'int', 'code': 'char', 'amount': 'decimal', 'flag': 'bit', 'starts': 'time'}
+
+
+def make_spec():
+    return TableSpec('t', 't', 'id', ['id', 'code', 'amount'], COLUMN_TYPES)
+
+
+def test_char_padding_trimmed_on_both_servers():
+    assert mysql_value_expr('code', 'char') == "COALESCE(RTRIM(`code`), '#NULL#')"
+    assert mssql_value_expr('code', 'char') == "COALESCE(RTRIM(CAST([code] AS NVARCHAR(MAX))), '#NULL#')"
+    # VARCHAR keeps trailing spaces on both servers, so they still count
+    assert 'RTRIM' not in mysql_value_expr('name', 'varchar') + mssql_value_expr('name', 'varchar')
+
+
+def test_bit_rendered_as_number():
+    assert mysql_value_expr('flag', 'bit') == "COALESCE(CAST(`flag` + 0 AS CHAR), '#NULL#')"
+    assert mssql_value_expr('flag', 'bit') == "COALESCE(CAST([flag] AS VARCHAR(100)), '#NULL#')"
+
+
+def test_time_rendered_to_seconds():
+    assert mysql_value_expr('starts', 'time') == "COALESCE(TIME_FORMAT(`starts`, '%H:%i:%s'), '#NULL#')"
+    assert mssql_value_expr('starts', 'time') == "COALESCE(CONVERT(VARCHAR(8), [starts], 108), '#NULL#')"
+
+
+def test_hash_encoding_from_server_capabilities():
+    assert mssql_hash_encoding(ScriptedConnection([(1,)])) == 'utf8'
+    assert mssql_hash_encoding(ScriptedConnection([(0,)], [(14,)])) == 'utf16'
+    with pytest.raises(RuntimeError, match='2016'):
+        mssql_hash_encoding(ScriptedConnection([(0,)], [(12,)]))
+
+
+def test_utf16_hashing_matches_on_both_servers():
+    spec = make_spec()
+    spec.hash_encoding = 'utf16'
+    assert 'USING utf16le' in mysql_row_hash(spec)
+    assert 'CONVERT(NVARCHAR(MAX), CONCAT(' in mssql_row_hash(spec)
+    assert 'COLLATE' not in mssql_row_hash(spec)
+    spec.hash_encoding = 'utf8'
+    assert 'USING utf8mb4' in mysql_row_hash(spec)
+    assert f'COLLATE {checksum_sync.MSSQL_UTF8_COLLATION}' in mssql_row_hash(spec)
+
+
+def test_compare_range_uses_rendered_values():
+    # MySQL returns the raw values followed by the rendered ones; SQL Server only the rendered ones
+    source = ScriptedConnection([
+        (1, 'ab', 1.23, '1', 'ab', '1.2300'),
+        (2, 'cd', 2, '2', 'cd', '2.0000'),
+        (3, 'ef', 3, '3', 'ef', '3.0000'),
+    ])
+    target = ScriptedConnection([
+        ('1', 'ab', '1.23'),
+        ('2', 'xx', '2.00'),
+        ('4', 'gh', '4.00'),
+    ])
+    inserts, updates, deletes = compare_range(source, target, make_spec(), 0, 10)
+    assert inserts == [(3, 'ef', 3)]
+    assert updates == [(2, 'cd', 2)]
+    assert deletes == [4]
+
+
+def test_sync_writes_new_rows_through_writer(monkeypatch):
+    monkeypatch.setattr(checksum_sync, 'find_changes',
+                        lambda *args: iter([([(3, 'ef', 3)], [(2, 'cd', 2)], [])]))
+    mssql_conn = ScriptedConnection([(1,)])
+    writer = ExecutemanyWriter('t', ['id', 'code', 'amount'])
+    stats = sync_table(ScriptedConnection(), mssql_conn, make_spec(), writer=writer)
+    assert stats == {'inserted': 1, 'updated': 1, 'deleted': 0, 'ranges': 1}
+    assert any(sql.startswith('INSERT INTO [dbo].[t]') for sql in mssql_conn.statements)
+    assert any(sql.startswith('MERGE [dbo].[t]') for sql in mssql_conn.statements)
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from chunked_copy import pk_ranges_minmax, pk_ranges_sampled, range_condition
+
+
+def make_table(key_type, keys):
+    engine = create_engine('sqlite://')
+    metadata = MetaData()
+    table = Table('t', metadata, Column('id', key_type, primary_key=True))
+    metadata.create_all(engine)
+    if keys:
+        with engine.begin() as conn:
+            conn.execute(table.insert(), [{'id': key} for key in keys])
+    return engine, table
+
+
+def covered_keys(conn, table, key_ranges):
+    keys = []
+    for key_range in key_ranges:
+        keys += conn.execute(select(table.c.id).where(range_condition(table.c.id, key_range))).scalars().all()
+    return keys
+
+
+def test_minmax_splits_integer_keys_evenly():
+    engine, table = make_table(Integer, list(range(1, 101)))
+    with engine.connect() as conn:
+        key_ranges = pk_ranges_minmax(conn, table, table.c.id, 4)
+        assert len(key_ranges) == 4
+        assert sorted(covered_keys(conn, table, key_ranges)) == list(range(1, 101))
+
+
+def test_minmax_falls_back_to_sampled_for_string_keys():
+    keys = [f"key-{i:04d}" for i in range(100)]
+    engine, table = make_table(String(20), keys)
+    with engine.connect() as conn:
+        key_ranges = pk_ranges_minmax(conn, table, table.c.id, 4)
+        assert key_ranges == pk_ranges_sampled(conn, table, table.c.id, 4)
+        assert len(key_ranges) == 4
+        assert sorted(covered_keys(conn, table, key_ranges)) == keys
+
+
+def test_single_range_for_empty_or_constant_keys():
+    engine, table = make_table(Integer, [])
+    with engine.connect() as conn:
+        assert pk_ranges_minmax(conn, table, table.c.id, 4) == [(None, None)]
+    engine, table = make_table(Integer, [5])
+    with engine.connect() as conn:
+        assert pk_ranges_minmax(conn, table, table.c.id, 4) == [(None, None)]
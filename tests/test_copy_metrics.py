@@ -0,0 +1,42 @@
+import csv
+import json
+
+from copy_metrics import RunMetrics, estimate_bytes, percentile
+
+
+def test_estimate_bytes_scales_the_sample():
+    rows = [('abcd', 1, None)] * 1000
+    assert estimate_bytes(rows) == 12 * 1000
+    assert estimate_bytes([]) == 0
+
+
+def test_percentiles_pick_the_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 51
+    assert percentile(values, 99) == 99
+    assert percentile([], 90) is None
+
+
+def test_report_summarises_stages_and_writes_all_formats(tmp_path):
+    metrics = RunMetrics()
+    table = metrics.table('t')
+    assert metrics.table('t') is table
+    table.record('read', 100, 0.5, 1000)
+    table.record('read', 100, 1.5, 1000)
+    table.retry()
+    table.finish()
+    prometheus_path = tmp_path / 'copy.prom'
+    report = metrics.write_report('copy', directory=str(tmp_path / 'reports'), prometheus_path=str(prometheus_path))
+
+    read = report['tables'][0]['stages']['read']
+    assert (read['batches'], read['rows'], read['bytes'], read['rows_per_second']) == (2, 200, 2000, 100.0)
+    assert report['tables'][0]['retries'] == 1
+
+    json_path, = (tmp_path / 'reports').glob('copy-*.json')
+    assert json.loads(json_path.read_text())['tables'][0]['table'] == 't'
+    csv_path, = (tmp_path / 'reports').glob('copy-*.csv')
+    with open(csv_path, newline='') as csv_file:
+        assert [row['stage'] for row in csv.DictReader(csv_file)] == ['read']
+    prometheus = prometheus_path.read_text()
+    assert 'mysql_to_mssql_rows{table="t",stage="read"} 200' in prometheus
+    assert 'mysql_to_mssql_retries{table="t"} 1' in prometheus
@@ -0,0 +1,78 @@
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine
+
+from copy_state import CopyStateStore
+from fakes import ScriptedConnection
+from incremental_copy import copy_table_incremental, current_watermark, watermark_columns
+
+
+class TargetConnection(ScriptedConnection):
+    """DB-API fake that also takes the SQLAlchemy-style execute(text("COMMIT"))."""
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+        self.params.append(None)
+
+
+def make_source(tmp_path, rows):
+    engine = create_engine(f"sqlite:///{tmp_path / 'source'}.db")
+    table = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(20)),
+                  Column('updated_at', DateTime))
+    table.create(engine)
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{'id': key, 'name': name} for key, name in rows])
+    return engine, table
+
+
+def test_watermark_column_detection():
+    auto = Table('a', MetaData(), Column('id', Integer, primary_key=True, autoincrement=True))
+    stamped = Table('s', MetaData(), Column('code', String(5), primary_key=True), Column('updated_at', DateTime))
+    plain = Table('p', MetaData(), Column('code', String(5), primary_key=True))
+    assert watermark_columns(auto) == [auto.c.id]
+    assert watermark_columns(stamped) == [stamped.c.updated_at, stamped.c.code]
+    assert watermark_columns(plain) is None
+    assert watermark_columns(plain, 'code') == [plain.c.code]
+
+
+def test_watermarks_keep_their_types(tmp_path):
+    state = CopyStateStore(str(tmp_path / 'state.sqlite'))
+    value = (datetime.datetime(2024, 5, 1, 12, 30), Decimal('1.50'), 'k')
+    state.set_watermark('t', ['a', 'b', 'c'], value)
+    assert state.get_watermark('t', ['a', 'b', 'c']) == value
+    # A watermark on other columns does not apply
+    assert state.get_watermark('t', ['a']) is None
+    state.close()
+
+
+def test_only_rows_past_the_watermark_are_upserted(tmp_path):
+    engine, source = make_source(tmp_path, [(key, f"n{key}") for key in range(1, 8)])
+    target = Table('t', MetaData(), Column('id', Integer, primary_key=True, autoincrement=False),
+                   Column('name', String(20)), Column('updated_at', DateTime))
+    state = CopyStateStore(str(tmp_path / 'state.sqlite'))
+    state.set_watermark('t', ['id'], (4,))
+    mssql_conn = TargetConnection()
+    with engine.connect() as mysql_conn:
+        stats = copy_table_incremental(mysql_conn, mssql_conn, source, target, [source.c.id], state, batch_size=2)
+        assert current_watermark(mysql_conn, source, [source.c.id]) == (7,)
+    assert (stats['copied'], stats['batches']) == (3, 2)
+    staged = [list(params) for sql, params in zip(mssql_conn.statements, mssql_conn.params)
+              if sql.startswith('INSERT INTO #upsert_stage')]
+    assert [[row[0] for row in rows] for rows in staged] == [[5, 6], [7]]
+    assert state.get_watermark('t', ['id']) == (7,)
+    state.close()
+
+
+def test_targets_without_a_primary_key_merge_on_the_mysql_key(tmp_path):
+    engine, source = make_source(tmp_path, [(1, 'a'), (2, 'b')])
+    target = Table('t', MetaData(), Column('id', Integer, autoincrement=False), Column('name', String(20)),
+                   Column('updated_at', DateTime))
+    state = CopyStateStore(str(tmp_path / 'state.sqlite'))
+    state.set_watermark('t', ['id'], (1,))
+    mssql_conn = TargetConnection()
+    with engine.connect() as mysql_conn:
+        copy_table_incremental(mysql_conn, mssql_conn, source, target, [source.c.id], state)
+    merge, = [sql for sql in mssql_conn.statements if sql.startswith('MERGE')]
+    assert ' ON t.[id] = s.[id] ' in merge
+    state.close()
@@ -0,0 +1,67 @@
+from sqlalchemy import Column, Index, Integer, MetaData, Table
+from sqlalchemy.dialects import mssql, mysql
+from sqlalchemy.schema import CreateTable
+
+from mssql_schema import build_mssql_table, convert_to_sqlserver_type
+
+
+def ddl(mysql_table):
+    mssql_table = build_mssql_table(mysql_table, MetaData())
+    return mssql_table, str(CreateTable(mssql_table).compile(dialect=mssql.dialect()))
+
+
+def key_table(key_type):
+    return Table('t', MetaData(), Column('code', key_type, primary_key=True, nullable=False),
+                 Column('n', Integer))
+
+
+def test_type_mapping_widens_unicode_and_unsigned():
+    assert isinstance(convert_to_sqlserver_type(mysql.VARCHAR(20, charset='utf8mb4')), mssql.NVARCHAR)
+    assert isinstance(convert_to_sqlserver_type(mysql.CHAR(3, charset='utf8mb4')), mssql.NCHAR)
+    assert isinstance(convert_to_sqlserver_type(mysql.INTEGER(unsigned=True)), mssql.BIGINT)
+
+
+def test_small_primary_key_is_clustered():
+    mssql_table, sql = ddl(key_table(mysql.VARCHAR(100, charset='utf8mb4')))
+    assert 'PRIMARY KEY (code)' in sql
+    assert list(mssql_table.primary_key.columns.keys()) == ['code']
+
+
+def test_primary_key_over_900_bytes_is_nonclustered(capsys):
+    # NVARCHAR(500) is 1000 bytes: too wide to cluster, narrow enough for a nonclustered key
+    _, sql = ddl(key_table(mysql.VARCHAR(500, charset='utf8mb4')))
+    assert 'PRIMARY KEY NONCLUSTERED (code)' in sql
+    assert 'NONCLUSTERED' in capsys.readouterr().out
+
+
+def test_primary_key_over_1700_bytes_is_not_created(capsys):
+    mssql_table, sql = ddl(key_table(mysql.VARCHAR(1000, charset='utf8mb4')))
+    assert 'PRIMARY KEY' not in sql
+    assert not mssql_table.primary_key.columns
+    assert 'WITHOUT a primary key' in capsys.readouterr().out
+
+
+def test_wide_unique_index_is_not_clustered():
+    table = Table('t', MetaData(), Column('code', mysql.VARCHAR(500, charset='utf8mb4'), nullable=False))
+    Index('ux_code', table.c.code, unique=True)
+    mssql_table, _ = ddl(table)
+    (index,) = mssql_table.indexes
+    assert not index.kwargs.get('mssql_clustered')
+
+
+def test_narrow_unique_index_clusters_keyless_table():
+    table = Table('t', MetaData(), Column('code', mysql.VARCHAR(100, charset='utf8mb4'), nullable=False))
+    Index('ux_code', table.c.code, unique=True)
+    mssql_table, _ = ddl(table)
+    (index,) = mssql_table.indexes
+    assert index.kwargs.get('mssql_clustered')
+
+
+def test_time_and_wide_decimal_columns_are_reported(capsys):
+    mysql_table = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('took', mysql.TIME()),
+                        Column('amount', mysql.DECIMAL(65, 30)))
+    mssql_table, _ = ddl(mysql_table)
+    assert isinstance(mssql_table.c.took.type, mssql.TIME)
+    out = capsys.readouterr().out
+    assert '`t`.`took`: MySQL TIME' in out
+    assert '`t`.`amount`: DECIMAL(65,30)' in out and 'DECIMAL(38, 30)' in out
@@ -0,0 +1,54 @@
+import sqlite3
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from sqlalchemy.dialects import mysql
+
+from mysql_pushdown import FLAG_COLUMN_PREFIX, pushdown_select
+
+
+def make_tables(key_type=Integer):
+    source = Table('t', MetaData(), Column('id', key_type, primary_key=True), Column('a', String(50)),
+                   Column('b', String(50)))
+    target = Table('t', MetaData(), Column('id', key_type if key_type is Integer else String(5), primary_key=True),
+                   Column('a', String(5)), Column('b', String(5)))
+    return source, target
+
+
+def compiled(query):
+    return str(query.compile(dialect=mysql.dialect()))
+
+
+def test_flag_terms_treat_null_as_not_truncated():
+    source, target = make_tables()
+    query, converter = pushdown_select(source, target)
+    flag_sql = str(query.selected_columns[f"{FLAG_COLUMN_PREFIX}0"].element)
+    assert flag_sql.count('COALESCE(') == 2
+
+    # Evaluate the mask on a row with NULL in one flagged column and an over-long value in the other
+    db = sqlite3.connect(':memory:')
+    db.create_function('CHAR_LENGTH', 1, lambda value: None if value is None else len(value))
+    db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT, b TEXT)")
+    db.execute("INSERT INTO t VALUES (1, NULL, 'much too long')")
+    (mask,) = db.execute(f"SELECT {flag_sql} FROM t").fetchone()
+    assert mask == 2
+    converter.convert_batch([(1, None, 'much ', mask)])
+    assert converter.truncated == {'a': 0, 'b': 1}
+
+
+def test_key_columns_are_selected_untransformed():
+    source, target = make_tables(key_type=String(50))
+    query, converter = pushdown_select(source, target)
+    sql = compiled(query)
+    assert 'LEFT(`t`.`id`' not in sql
+    assert 'LEFT(`t`.`a`, 5)' in sql
+    # The key is cut in Python instead, and still counted
+    assert converter.convert_batch([('long key value', 'a', 'b', 0)]) == [('long ', 'a', 'b')]
+    assert converter.truncated['id'] == 1
+
+
+def test_paging_columns_other_than_the_primary_key_stay_untransformed():
+    source, target = make_tables()
+    query, _ = pushdown_select(source, target, key_columns=[source.c.a])
+    sql = compiled(query)
+    assert 'LEFT(`t`.`a`' not in sql
+    assert 'LEFT(`t`.`b`, 5)' in sql
@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+import time
+
+from parallel_copy import ServerSlots, create_pooled_engine, order_by_size, run_parallel
+
+
+def test_largest_tables_first():
+    sizes = {'small': (10, 100), 'wide': (10, 5000), 'long': (1000, 5000)}
+    assert order_by_size(['small', 'unknown', 'wide', 'long'], sizes) == ['long', 'wide', 'small', 'unknown']
+
+
+def test_failures_are_returned_per_table():
+    def copy_one(table_name):
+        if table_name == 'bad':
+            raise RuntimeError("boom")
+        return table_name.upper()
+
+    results = run_parallel(['a', 'bad', 'b'], copy_one, max_workers=3)
+    assert results['a'] == 'A' and results['b'] == 'B'
+    assert isinstance(results['bad'], RuntimeError)
+
+
+def test_server_slots_cap_concurrent_jobs():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def copy_one(table_name):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    run_parallel([f"t{i}" for i in range(8)], copy_one, max_workers=8, slots=ServerSlots({'mysql': 4, 'mssql': 2}))
+    assert peak[0] == 2
+
+
+def test_pool_never_opens_more_sessions_than_its_size(tmp_path):
+    opened = []
+
+    def connect():
+        opened.append(1)
+        return sqlite3.connect(str(tmp_path / 'pool.db'), check_same_thread=False)
+
+    engine = create_pooled_engine(f"sqlite:///{tmp_path / 'pool.db'}", connect, pool_size=2)
+    assert engine.pool.size() == 2
+    with engine.connect(), engine.connect():
+        pass
+    with engine.connect():
+        pass
+    assert len(opened) == 2
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from pipeline_copy import copy_table_pipelined
+
+
+class FailingWriter:
+    def __init__(self):
+        self.calls = 0
+
+    def write(self, conn, rows):
+        self.calls += 1
+        raise RuntimeError("write failed")
+
+
+def make_pair(tmp_path, rows):
+    source_engine = create_engine(f"sqlite:///{tmp_path / 'source'}.db")
+    target_engine = create_engine(f"sqlite:///{tmp_path / 'target'}.db")
+    source = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(20)))
+    target = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(3), nullable=False))
+    source.create(source_engine)
+    target.create(target_engine)
+    with source_engine.begin() as conn:
+        conn.execute(source.insert(), [{'id': key, 'name': name} for key, name in rows])
+    return (source_engine, target_engine), (source, target)
+
+
+def test_pipelined_copy_matches_the_streaming_result(tmp_path):
+    rows = [(key, None if key % 5 == 0 else 'abcdef'[:key % 6 + 1]) for key in range(1, 24)]
+    (source_engine, target_engine), (source, target) = make_pair(tmp_path, rows)
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        stats = copy_table_pipelined(mysql_conn, mssql_conn, source, target, batch_size=4, queue_depth=1)
+    kept = [(key, name[:3]) for key, name in rows if name is not None]
+    assert (stats['copied'], stats['skipped']) == (len(kept), 4)
+    assert stats['truncated'] == sum(1 for _, name in rows if name is not None and len(name) > 3)
+    assert {'read_seconds', 'convert_seconds', 'write_seconds'} <= set(stats)
+    with target_engine.connect() as conn:
+        assert conn.execute(select(target).order_by(target.c.id)).all() == kept
+
+
+def test_write_error_stops_the_pipeline(tmp_path):
+    (source_engine, target_engine), (source, target) = make_pair(tmp_path, [(key, 'a') for key in range(1, 50)])
+    writer = FailingWriter()
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        with pytest.raises(RuntimeError, match='write failed'):
+            copy_table_pipelined(mysql_conn, mssql_conn, source, target, batch_size=2, writer=writer,
+                                 queue_depth=1)
+    assert writer.calls == 1
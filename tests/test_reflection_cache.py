@@ -0,0 +1,46 @@
+from sqlalchemy import create_engine, text
+
+from reflection_cache import ReflectionCache
+
+
+def make_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db'}.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE a (id INTEGER PRIMARY KEY, name VARCHAR(20))"))
+        conn.execute(text("CREATE TABLE b (id INTEGER PRIMARY KEY)"))
+    return engine
+
+
+def counting_cache(engine, path, reflected):
+    cache = ReflectionCache(engine, path=path)
+    reflect = cache.reflect
+
+    def counted(table_name, fingerprint):
+        reflected.append(table_name)
+        return reflect(table_name, fingerprint)
+
+    cache.reflect = counted
+    return cache
+
+
+def test_unchanged_tables_come_from_the_cache(tmp_path):
+    engine = make_engine(tmp_path)
+    path = str(tmp_path / 'cache.sqlite')
+    reflected = []
+    first = counting_cache(engine, path, reflected).tables(['a', 'b', 'missing'])
+    assert sorted(first) == ['a', 'b']
+    second = counting_cache(engine, path, reflected).tables(['a', 'b'])
+    assert reflected == ['a', 'b']
+    assert [col.name for col in second['a'].columns] == ['id', 'name']
+
+
+def test_changed_tables_are_reflected_again(tmp_path):
+    engine = make_engine(tmp_path)
+    path = str(tmp_path / 'cache.sqlite')
+    reflected = []
+    counting_cache(engine, path, reflected).tables(['a', 'b'])
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE a ADD COLUMN extra INTEGER"))
+    tables = counting_cache(engine, path, reflected).tables(['a', 'b'])
+    assert reflected == ['a', 'b', 'a']
+    assert 'extra' in tables['a'].c
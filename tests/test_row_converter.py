@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table
+
+from row_converter import RowConverter, compile_converter
+
+SOURCE = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(50)),
+               Column('amount', Numeric(12, 4)))
+TARGET = Table('t', MetaData(), Column('id', Integer, primary_key=True, nullable=False), Column('name', String(5)),
+               Column('amount', Numeric(10, 2)))
+
+
+def convert(converter, rows, columnar):
+    return converter.convert_batch_columnar(rows) if columnar else converter.convert_batch(rows)
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_truncates_rounds_and_drops_null_keys(columnar):
+    converter = compile_converter(SOURCE, TARGET)
+    rows = [(1, 'abcdefgh', Decimal('1.235')), (2, 'abc', None), (None, 'x', Decimal('1'))]
+    assert convert(converter, rows, columnar) == [(1, 'abcde', Decimal('1.24')), (2, 'abc', None)]
+    assert converter.truncated == {'name': 1}
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_rejected_rows_are_not_counted_as_truncated(columnar):
+    # The NOT NULL column comes after the truncated one
+    target = Table('t', MetaData(), Column('name', String(5)), Column('id', Integer, nullable=False))
+    converter = RowConverter(['id', 'name'], target, source_types=[Integer(), String(50)])
+    assert convert(converter, [(None, 'abcdefgh'), (2, 'abcdefgh')], columnar) == [('abcde', 2)]
+    assert converter.truncated == {'name': 1}
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_truncation_flags_counted_for_kept_rows_only(columnar):
+    # Bitmask column 3 flags truncations MySQL already made: bit 0 is name, bit 1 is a second column
+    converter = RowConverter(['id', 'name', 'amount', '__truncated_0'], TARGET,
+                             truncation_flags={3: ['name', 'note']})
+    rows = [(1, 'abcde', None, 0b11), (None, 'abcde', None, 0b01), (3, 'abc', None, 0)]
+    assert convert(converter, rows, columnar) == [(1, 'abcde', None), (3, 'abc', None)]
+    assert converter.truncated == {'name': 1, 'note': 1}
+
+
+def test_passthrough_when_nothing_to_do():
+    table = Table('p', MetaData(), Column('id', Integer), Column('name', String(50)))
+    converter = compile_converter(table, table)
+    assert converter.passthrough
+    assert converter.convert_batch([[1, 'a']]) == [(1, 'a')]
@@ -0,0 +1,46 @@
+import row_verifier
+from checksum_sync import TableSpec
+from fakes import ScriptedConnection
+from row_verifier import compare_range_columns, key_spans, verify_table
+
+COLUMN_TYPES = {'id': 'int', 'code': 'char', 'amount': 'decimal'}
+
+
+def make_spec():
+    return TableSpec('t', 't', 'id', ['id', 'code', 'amount'], COLUMN_TYPES)
+
+
+def test_key_spans_cover_the_range_on_chunk_boundaries():
+    assert key_spans(5, 250, 100, 2) == [(0, 200), (200, 250)]
+
+
+def test_compare_uses_the_checksum_renderings():
+    source = ScriptedConnection([('1', 'ab', '1.2300'), ('2', 'cd', '2.0000'), ('3', 'ef', '3.0000')])
+    target = ScriptedConnection([('1', 'ab', '1.23'), ('2', 'xx', '2.00'), ('4', 'gh', '#NULL#')])
+    differences = compare_range_columns(source, target, make_spec(), 0, 10)
+    assert differences == [
+        {'key': 2, 'kind': 'changed', 'column': 'code', 'source': 'cd', 'target': 'xx'},
+        {'key': 3, 'kind': 'missing', 'column': None, 'source': None, 'target': None},
+        {'key': 4, 'kind': 'extra', 'column': None, 'source': None, 'target': None},
+    ]
+    # CHAR padding is trimmed on both servers, as the checksums do
+    assert 'RTRIM(`code`)' in source.statements[0]
+    assert 'RTRIM(CAST([code] AS NVARCHAR(MAX)))' in target.statements[0]
+
+
+def test_verify_detects_the_hash_encoding(monkeypatch):
+    monkeypatch.setattr(row_verifier, 'find_differing_ranges', lambda *args: [])
+    spec = make_spec()
+    connections = {
+        'mysql': [ScriptedConnection([(1, 3, 3)])],
+        # No UTF-8 collation on this server, so rows are hashed as UTF-16
+        'mssql': [ScriptedConnection([(0,)], [(14,)], [(1, 3, 3)])],
+    }
+
+    def connect(side):
+        return connections[side].pop(0) if connections[side] else ScriptedConnection()
+
+    result = verify_table(lambda: connect('mysql'), lambda: connect('mssql'), spec, workers=1)
+    assert spec.hash_encoding == 'utf16'
+    assert result['matches']
+    assert (result['source_rows'], result['target_rows']) == (3, 3)
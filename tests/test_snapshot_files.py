@@ -0,0 +1,45 @@
+import datetime
+import os
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, Numeric, String, Table, create_engine, select
+
+import snapshot_files
+from snapshot_files import export_table, import_table, read_manifest
+
+ROWS = [(key, f"name {key}", Decimal(key) / 4, datetime.datetime(2024, 1, 1, 12, 0, key % 60))
+        for key in range(1, 1001)]
+
+
+def make_table(engine):
+    metadata = MetaData()
+    table = Table('t', metadata, Column('id', Integer, primary_key=True), Column('name', String(20)),
+                  Column('amount', Numeric(12, 2)), Column('updated_at', DateTime))
+    metadata.create_all(engine)
+    return table
+
+
+@pytest.mark.parametrize('file_format', ['native', 'arrow'])
+def test_export_then_import_round_trip(tmp_path, file_format):
+    if file_format == 'arrow' and snapshot_files.pyarrow is None:
+        pytest.skip("pyarrow is not installed")
+    source_engine = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    target_engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    source, target = make_table(source_engine), make_table(target_engine)
+    with source_engine.begin() as conn:
+        conn.execute(source.insert(), [dict(zip(source.c.keys(), row)) for row in ROWS])
+
+    directory = str(tmp_path / 'snapshot')
+    with source_engine.connect() as conn:
+        entry = export_table(conn, source, directory, batch_size=300, file_format=file_format)
+    assert entry['rows'] == len(ROWS)
+    assert read_manifest(directory)['tables']['t']['file'] == entry['file']
+    assert not any(name.endswith('.partial') for name in os.listdir(directory))
+
+    with target_engine.connect() as conn:
+        stats = import_table(conn, os.path.join(directory, entry['file']), target)
+    assert stats['copied'] == len(ROWS)
+    assert stats['batches'] == 4
+    with target_engine.connect() as conn:
+        assert [tuple(row) for row in conn.execute(select(target).order_by(target.c.id))] == ROWS
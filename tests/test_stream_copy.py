@@ -0,0 +1,84 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from stream_copy import (AdaptiveBatchSizer, copy_table_streaming, get_key_columns, iter_keyset_batches,
+                         iter_mysql_batches)
+
+
+def make_pair(tmp_path, rows):
+    source_engine = create_engine(f"sqlite:///{tmp_path / 'source'}.db")
+    target_engine = create_engine(f"sqlite:///{tmp_path / 'target'}.db")
+    source = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(20)))
+    target = Table('t', MetaData(), Column('id', Integer, primary_key=True), Column('name', String(3), nullable=False))
+    source.create(source_engine)
+    target.create(target_engine)
+    with source_engine.begin() as conn:
+        conn.execute(source.insert(), [{'id': key, 'name': name} for key, name in rows])
+    return (source_engine, target_engine), (source, target)
+
+
+def test_batches_are_streamed_in_order(tmp_path):
+    (source_engine, _), (source, _) = make_pair(tmp_path, [(key, 'x') for key in range(1, 8)])
+    with source_engine.connect() as conn:
+        batches = list(iter_mysql_batches(conn, select(source.c.id).order_by(source.c.id), batch_size=3))
+        # Streaming is asked for on the statement; the caller's connection is left as it was
+        assert 'stream_results' not in conn.get_execution_options()
+    assert [[row.id for row in batch] for batch in batches] == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_copy_commits_each_batch_and_counts_skips_and_truncations(tmp_path):
+    rows = [(1, 'abc'), (2, None), (3, 'abcdef'), (4, 'ab'), (5, 'abcd')]
+    (source_engine, target_engine), (source, target) = make_pair(tmp_path, rows)
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        stats = copy_table_streaming(mysql_conn, mssql_conn, source, target, batch_size=2)
+    assert stats == {'copied': 4, 'skipped': 1, 'truncated': 2, 'batches': 3}
+    with target_engine.connect() as conn:
+        assert conn.execute(select(target).order_by(target.c.id)).all() == [
+            (1, 'abc'), (3, 'abc'), (4, 'ab'), (5, 'abc')]
+
+
+def test_columnar_conversion_copies_the_same_rows(tmp_path):
+    rows = [(1, 'abc'), (2, None), (3, 'abcdef')]
+    (source_engine, target_engine), (source, target) = make_pair(tmp_path, rows)
+    with source_engine.connect() as mysql_conn, target_engine.connect() as mssql_conn:
+        stats = copy_table_streaming(mysql_conn, mssql_conn, source, target, batch_size=10, columnar=True)
+    assert (stats['copied'], stats['skipped'], stats['truncated']) == (2, 1, 1)
+
+
+def make_keyed(tmp_path, keys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'keyed'}.db")
+    table = Table('k', MetaData(), Column('a', Integer, primary_key=True), Column('b', Integer, primary_key=True))
+    table.create(engine)
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{'a': a, 'b': b} for a, b in keys])
+    return engine, table
+
+
+def test_keyset_pages_cover_every_row_once(tmp_path):
+    keys = [(a, b) for a in range(1, 4) for b in (2, 1)]
+    engine, table = make_keyed(tmp_path, keys)
+    with engine.connect() as conn:
+        sizer = AdaptiveBatchSizer(initial=2, minimum=1)
+        pages = list(iter_keyset_batches(conn, table, get_key_columns(table), sizer))
+    assert [last_key for _, last_key in pages] == [(1, 2), (2, 2), (3, 2)]
+    assert [tuple(row) for rows, _ in pages for row in rows] == sorted(keys)
+
+
+def test_keyset_starts_after_the_given_key(tmp_path):
+    engine, table = make_keyed(tmp_path, [(1, 1), (1, 2), (2, 1), (2, 2)])
+    with engine.connect() as conn:
+        pages = list(iter_keyset_batches(conn, table, get_key_columns(table), AdaptiveBatchSizer(initial=10),
+                                         start_after=(1, 2)))
+    assert [tuple(row) for row in pages[0][0]] == [(2, 1), (2, 2)]
+
+
+def test_batch_size_follows_the_batch_time():
+    sizer = AdaptiveBatchSizer(initial=1000, minimum=500, maximum=4000, target_seconds=1.0)
+    sizer.record(1000, 0.1)
+    assert sizer.batch_size == 2000
+    # A short last batch says nothing about speed
+    sizer.record(10, 10)
+    assert sizer.batch_size == 2000
+    sizer.record(2000, 10)
+    sizer.record(1000, 10)
+    sizer.record(500, 10)
+    assert sizer.batch_size == 500
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table
+
+from swap_reload import index_statements, reload_with_swap
+
+
+class FakeResult(list):
+    def scalar(self):
+        return self[0][0] if self else None
+
+
+class FakeConnection:
+    """SQLAlchemy-style connection that records statements; queries matching a key of `results` return its rows."""
+
+    def __init__(self, log, results):
+        self.log = log
+        self.results = results
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.log.append(sql)
+        for marker, rows in self.results.items():
+            if marker in sql:
+                return FakeResult(rows)
+        return FakeResult()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeEngine:
+    def __init__(self, results=None):
+        self.log = []
+        self.results = results or {}
+
+    def connect(self):
+        return FakeConnection(self.log, self.results)
+
+
+INDEX_RESULTS = {
+    'FROM sys.indexes WHERE': [(1, 'PK_t', 'CLUSTERED', True, True, False, None),
+                               (2, 'ix_name', 'NONCLUSTERED', False, False, False, '([name] IS NOT NULL)')],
+    'FROM sys.index_columns': [(1, 'id', False, False), (2, 'name', True, False), (2, 'id', False, True)],
+    'FROM sys.check_constraints': [('ck_id', '([id]>(0))')],
+}
+
+
+def test_index_statements_recreate_keys_indexes_and_checks():
+    conn = FakeConnection([], INDEX_RESULTS)
+    assert index_statements(conn, 't', 't__staging') == [
+        "ALTER TABLE [dbo].[t__staging] ADD CONSTRAINT [PK_t__staging] PRIMARY KEY CLUSTERED ([id])",
+        "CREATE NONCLUSTERED INDEX [ix_name] ON [dbo].[t__staging] ([name] DESC) INCLUDE ([id]) "
+        "WHERE ([name] IS NOT NULL)",
+        "ALTER TABLE [dbo].[t__staging] WITH CHECK ADD CONSTRAINT [ck_id__staging] CHECK ([id]>(0))",
+    ]
+
+
+def test_load_goes_to_the_staging_heap_then_switches_in():
+    engine = FakeEngine(INDEX_RESULTS)
+    table = Table('t', MetaData(), Column('id', Integer, primary_key=True))
+    loaded = []
+    assert reload_with_swap(engine, table, lambda staging: loaded.append(staging.name) or 'stats') == 'stats'
+    assert loaded == ['t__staging']
+    switches = [sql for sql in engine.log if ' SWITCH TO ' in sql]
+    assert [sql.split(' WITH ')[0] for sql in switches] == [
+        "ALTER TABLE [dbo].[t] SWITCH TO [dbo].[t__retired]",
+        "ALTER TABLE [dbo].[t__staging] SWITCH TO [dbo].[t]",
+    ]
+    # The indexes are built on the loaded heap before the switch
+    assert engine.log.index("ALTER TABLE [dbo].[t__staging] ADD CONSTRAINT [PK_t__staging] PRIMARY KEY CLUSTERED "
+                            "([id])") < engine.log.index(switches[0])
+
+
+def test_failed_load_leaves_the_target_alone():
+    engine = FakeEngine()
+    table = Table('t', MetaData(), Column('id', Integer, primary_key=True))
+
+    def load(staging):
+        raise RuntimeError("load failed")
+
+    with pytest.raises(RuntimeError, match='load failed'):
+        reload_with_swap(engine, table, load)
+    assert not any('SWITCH' in sql or 'sp_rename' in sql for sql in engine.log)
+    assert 'DROP TABLE [dbo].[t__staging]' in engine.log[-3]
@@ -1,119 +1,310 @@
 import pyodbc
 import pymysql
-from sqlalchemy import create_engine, MetaData, Table, select, text, func
+from sqlalchemy import select, text, func
 from sqlalchemy.exc import SQLAlchemyError, DataError
+import sys
 import time
-from decimal import Decimal
-
-# SQL Server connection (using pyodbc)
-mssql_conn = pyodbc.connect(
-    'DRIVER={ODBC Driver 17 for SQL Server};'
-    'SERVER=ipack-svr-rpt;DATABASE=Report_1;'
-    'Trusted_Connection=yes;'
-)
-
-# MySQL connection (using pymysql)
-mysql_conn = pymysql.connect(
-    host='sever_address',
-    user='test123',
-    password='test123',
-    db='hotpack_test'
-)
-
-# Create SQLAlchemy engines with existing connections
-mysql_engine = create_engine('mysql+pymysql://', creator=lambda: mysql_conn)
-mssql_engine = create_engine('mssql+pyodbc://', creator=lambda: mssql_conn)
-
-# MySQL metadata reflection
-mysql_metadata = MetaData()
-mysql_metadata.reflect(bind=mysql_engine)
-mysql_tables = mysql_metadata.tables
-
-# SQL Server metadata reflection
-mssql_metadata = MetaData()
-mssql_metadata.reflect(bind=mssql_engine)
-
-# Loop through each table in MySQL
-for table_name, mysql_table in mysql_tables.items():
+
+from async_copy import copy_small_tables, small_tables
+from bulk_writers import DEFAULT_WRITER, make_writer
+from checkpoint_copy import can_resume, copy_table_resumable, start_checkpoint
+from chunked_copy import copy_table_chunked, pk_ranges_minmax, pk_ranges_sampled, single_key_column
+from copy_metrics import run_metrics
+from copy_state import CopyStateStore
+from incremental_copy import copy_table_incremental, current_watermark, watermark_columns
+from mssql_schema import create_deferred_indexes
+from parallel_copy import ServerSlots, create_pooled_engine, mysql_table_sizes, order_by_size, run_parallel
+from pipeline_copy import copy_table_pipelined
+from reflection_cache import ReflectionCache
+from swap_reload import reload_with_swap
+
+# Number of tables copied at the same time, and the cap on concurrent sessions per server
+MAX_WORKERS = 8
+MAX_MYSQL_SESSIONS = 8
+MAX_MSSQL_SESSIONS = 8
+
+# Small tables are reloaded first by the asyncio engine (async_copy.py), this many at a time: no COUNT(*),
+# the MySQL read overlaps the TRUNCATE, one commit per table and the sessions are reused across tables.
+# They use the same TABLE_WRITERS and SWAP_RELOAD settings as the other tables; without SWAP_RELOAD readers
+# block on the TRUNCATE's lock until the table's commit
+ASYNC_SMALL_TABLES = True
+SMALL_TABLE_SESSIONS = 16
+
+
+# SQL Server connection (using pyodbc); every pooled connection is opened with this
+def connect_mssql():
+    return pyodbc.connect(
+        'DRIVER={ODBC Driver 17 for SQL Server};'
+        'SERVER=ipack-svr-rpt;DATABASE=Report_1;'
+        'Trusted_Connection=yes;'
+    )
+
+
+# MySQL connection (using pymysql); every pooled connection is opened with this
+def connect_mysql():
+    return pymysql.connect(
+        host='sever_address',
+        user='test123',
+        password='test123',
+        db='hotpack_test'
+    )
+
+
+# Create SQLAlchemy engines with one pooled connection per worker on each side
+mysql_engine = create_pooled_engine('mysql+pymysql://', connect_mysql, max(MAX_MYSQL_SESSIONS, SMALL_TABLE_SESSIONS))
+mssql_engine = create_pooled_engine('mssql+pyodbc://', connect_mssql, max(MAX_MSSQL_SESSIONS, SMALL_TABLE_SESSIONS))
+
+# Table list and size estimates from information_schema; metadata is only reflected for tables whose
+# DDL changed since the last run, the rest comes from reflection_cache.sqlite
+table_sizes = mysql_table_sizes(mysql_engine)
+mysql_tables = ReflectionCache(mysql_engine).tables(table_sizes)
+mssql_tables = ReflectionCache(mssql_engine).tables(table_sizes)
+
+# Number of rows read from MySQL and inserted into SQL Server per batch
+BATCH_SIZE = 5000
+
+# Bulk writer backend per table (executemany, fast_executemany, tvp, bulk_insert); others use DEFAULT_WRITER
+TABLE_WRITERS = {}
+
+# Let MySQL cut strings to the SQL Server column lengths and round decimals in the SELECT (mysql_pushdown.py)
+PUSHDOWN = True
+
+# Tables with at least CHUNKED_MIN_ROWS (estimated) rows and a single-column primary key are split into
+# CHUNK_COUNT key ranges copied by CHUNK_WORKERS workers; CHUNK_SPLIT is 'minmax' or 'sampled' (skewed keys)
+CHUNKED_MIN_ROWS = 5_000_000
+CHUNK_COUNT = 16
+CHUNK_WORKERS = 4
+CHUNK_SPLIT = 'minmax'
+
+# Incremental mode: tables with an auto-increment key or an updated_at-style column only copy rows past
+# the watermark stored in copy_state.sqlite; WATERMARK_COLUMNS overrides the detected column per table
+INCREMENTAL = True
+WATERMARK_COLUMNS = {}
+state = CopyStateStore()
+
+# Full copies load into a staging heap and swap it in (swap_reload.py) instead of truncating the live table,
+# so reports never see it empty or half loaded; otherwise the table reads empty (or partly loaded) from the
+# TRUNCATE until the copy finishes
+SWAP_RELOAD = False
+
+# Finished tables are checkpointed in copy_state.sqlite; run with --resume to skip the tables the last run
+# finished instead of starting over
+RESUME = '--resume' in sys.argv
+
+# Also checkpoint every committed batch (or chunk), so --resume continues inside the table a run died in and
+# bad rows are bisected out to rejects/. Keyed tables then take a keyset copy that commits each batch in turn
+# instead of the pipelined copy (read, convert and write overlapped), so it is off by default
+CHECKPOINT_BATCHES = False
+if not RESUME:
+    state.clear_checkpoints()
+
+# After a full copy, build the secondary indexes copy_schema_mysql_to_mssql.py deferred (existing ones are kept)
+CREATE_DEFERRED_INDEXES = True
+
+# Per-stage rows/s, bytes/s, batch latencies, retries and peak memory go to reports/copy-<time>.json and .csv;
+# set PROMETHEUS_TEXTFILE to also write them for the node_exporter textfile collector
+PROMETHEUS_TEXTFILE = None
+
+# Which path (incremental, full, skipped, failed) each table took, for the run summary
+table_paths = {}
+
+
+def copy_table(table_name):
+    """Copy one table incrementally or by truncate-and-copy; runs on a worker thread with its own connections."""
     print(f"\nStarting to process table: {table_name}")
     start_time = time.time()
 
-    # Get the SQL Server table metadata
-    mssql_table = mssql_metadata.tables.get(table_name)
+    # Get the MySQL and SQL Server table metadata
+    mysql_table = mysql_tables.get(table_name)
+    mssql_table = mssql_tables.get(table_name)
 
     # Check if both tables exist
-    if mysql_table is not None and mssql_table is not None:
-        # Get the total number of rows in the MySQL table for progress tracking
-        with mysql_engine.connect() as mysql_conn:
-            total_rows = mysql_conn.execute(select(func.count()).select_from(mysql_table)).scalar()
-            print(f"Total rows to copy from MySQL table `{table_name}`: {total_rows}")
+    if mysql_table is None or mssql_table is None:
+        print(f"Table `{table_name}` does not exist in one of the databases and will be skipped.")
+        table_paths[table_name] = 'skipped'
+        return None
+
+    # Incremental path: only rows past the stored watermark are pulled and upserted
+    watermark_keys = watermark_columns(mysql_table, WATERMARK_COLUMNS.get(table_name)) if INCREMENTAL else None
+    watermark_names = [col.name for col in watermark_keys] if watermark_keys else None
+    if watermark_keys and state.get_watermark(table_name, watermark_names) is not None:
+        table_paths[table_name] = 'incremental'
+        try:
+            with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                stats = copy_table_incremental(mysql_conn, conn, mysql_table, mssql_table, watermark_keys, state,
+                                               batch_size=BATCH_SIZE, pushdown=PUSHDOWN)
+        except (SQLAlchemyError, pyodbc.Error, RuntimeError) as e:
+            print(f"Error copying data for table `{table_name}`: {e}")
+            table_paths[table_name] = 'failed (incremental)'
+            stats = None
+        print(f"Completed copying table `{table_name}`. Time taken: {time.time() - start_time:.2f} seconds.")
+        return stats
 
-        # Skip tables with no rows
-        if total_rows == 0:
-            print(f"No data to copy for table `{table_name}`. Skipping...")
-            continue
+    # Resumed run: tables the previous run finished are not copied again
+    checkpoint = state.get_checkpoint(table_name)
+    if checkpoint is not None and checkpoint[0] == 'done':
+        print(f"Table `{table_name}` was copied by the previous run ({checkpoint[2]} rows). Skipping...")
+        table_paths[table_name] = 'skipped (done)'
+        return None
 
-        # Step 1: Truncate the table in SQL Server
+    # Get the total number of rows in the MySQL table for progress tracking
+    with mysql_engine.connect() as mysql_conn:
+        total_rows = mysql_conn.execute(select(func.count()).select_from(mysql_table)).scalar()
+        print(f"Total rows to copy from MySQL table `{table_name}`: {total_rows}")
+
+    # Skip tables with no rows
+    if total_rows == 0:
+        print(f"No data to copy for table `{table_name}`. Skipping...")
+        table_paths[table_name] = 'skipped (empty)'
+        return None
+
+    # Full copy; remember where the table ends now so the next run can continue incrementally
+    table_paths[table_name] = 'full'
+    watermark = None
+    if watermark_keys:
+        with mysql_engine.connect() as mysql_conn:
+            watermark = current_watermark(mysql_conn, mysql_table, watermark_keys)
+
+    # Step 1: Truncate the table in SQL Server (swap reloads leave it readable until the new rows are in),
+    # unless an interrupted copy of it continues from its checkpoint
+    # A staging table is recreated empty on every run, so swap reloads only checkpoint finished tables
+    checkpoints = state if CHECKPOINT_BATCHES and not SWAP_RELOAD else None
+    resuming = checkpoints is not None and can_resume(state, table_name)
+    if resuming:
+        table_paths[table_name] = 'full (resumed)'
+    else:
+        start_checkpoint(state, table_name)
+    if not SWAP_RELOAD and not resuming:
         with mssql_engine.connect() as conn:
             print(f"Truncating table {table_name} in SQL Server...")
             conn.execute(text(f"TRUNCATE TABLE {table_name}"))
             conn.execute(text("COMMIT"))
 
-        # Step 2: Copy data from MySQL to SQL Server
-        print(f"Starting data copy for table `{table_name}`...")
+    # Step 2: Copy data from MySQL to SQL Server
+    print(f"Starting data copy for table `{table_name}`...")
 
-        # Get column lengths from SQL Server metadata
-        column_max_lengths = {col.name: col.type.length for col in mssql_table.columns if hasattr(col.type, 'length')}
+    # Stream rows from MySQL and insert them in fixed-size batches so memory stays flat
+    stats = None
+    key_column = single_key_column(mysql_table)
+    key_columns = list(mysql_table.primary_key.columns)
+    chunked = key_column is not None and (total_rows >= CHUNKED_MIN_ROWS or bool(state.get_chunk_plan(table_name)))
 
-        with mysql_engine.connect() as mysql_conn:
-            # Fetch all rows from the MySQL table at once
-            mysql_data = mysql_conn.execute(select(mysql_table)).fetchall()
-
-            # Prepare insert data, truncating specified columns if needed and excluding rows with NULLs in non-nullable columns
-            insert_data = []
-            for row in mysql_data:
-                insert_row = {}
-                skip_row = False
-                for mssql_col in mssql_table.columns:
-                    value = row._mapping.get(mssql_col.name)
-
-                    # Check if the column has a maximum length constraint and needs truncation
-                    max_length = column_max_lengths.get(mssql_col.name)
-                    if max_length and isinstance(value, str) and len(value) > max_length:
-                        print(f"Truncating column '{mssql_col.name}' in table `{table_name}` from {len(value)} to {max_length} characters.")
-                        value = value[:max_length]  # Truncate to SQL Server column max length
-
-                    # Handle Decimal values explicitly by converting them to a string with fixed precision
-                    if isinstance(value, Decimal):
-                        value = f"{value:.2f}"  # Format to two decimal places as string
-
-                    # Check if column is non-nullable and value is None
-                    if not mssql_col.nullable and value is None:
-                        skip_row = True  # Flag to skip this row if it has NULL in a non-nullable column
-                        break
-
-                    insert_row[mssql_col.name] = value
-
-                if not skip_row:  # Only add rows that pass the non-nullable check
-                    insert_data.append(insert_row)
-
-            # Insert all rows at once into SQL Server table
-            with mssql_engine.connect() as conn:
-                try:
-                    conn.execute(mssql_table.insert(), insert_data)
-                    conn.execute(text("COMMIT"))
-                    print(f"Table `{table_name}`: All {len(insert_data)} rows copied successfully.")
-                except DataError as e:
-                    print(f"Data error copying data for table `{table_name}`: {e}")
-                except SQLAlchemyError as e:
-                    print(f"Error copying data for table `{table_name}`: {e}")
-
-        # Calculate and display the time taken for this table
-        end_time = time.time()
-        time_taken = end_time - start_time
-        print(f"Completed copying table `{table_name}`. Time taken: {time_taken:.2f} seconds.")
+    def load(target_table):
+        # TABLOCK lets the load into the staging heap be minimally logged; parallel chunks would serialize on it
+        writer = make_writer(TABLE_WRITERS.get(table_name, DEFAULT_WRITER), target_table,
+                             tablock=SWAP_RELOAD and not chunked)
+        if chunked:
+            # Very large table: copy disjoint primary key ranges in parallel, one transaction per chunk
+            with mysql_engine.connect() as mysql_conn:
+                if CHUNK_SPLIT == 'sampled':
+                    key_ranges = pk_ranges_sampled(mysql_conn, mysql_table, key_column, CHUNK_COUNT, total_rows)
+                else:
+                    key_ranges = pk_ranges_minmax(mysql_conn, mysql_table, key_column, CHUNK_COUNT, total_rows)
+            return copy_table_chunked(mysql_engine, mssql_engine, mysql_table, target_table, key_ranges,
+                                      CHUNK_WORKERS, writer=writer, batch_size=BATCH_SIZE, state=checkpoints,
+                                      checkpoint_name=table_name, pushdown=PUSHDOWN)
+        if checkpoints is not None and key_columns:
+            # Keyset copy committing and checkpointing each batch; bad rows are bisected out to rejects/
+            with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+                return copy_table_resumable(mysql_conn, conn, mysql_table, target_table, key_columns, checkpoints,
+                                            batch_size=BATCH_SIZE, writer=writer, pushdown=PUSHDOWN)
+        with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+            return copy_table_pipelined(mysql_conn, conn, mysql_table, target_table,
+                                        batch_size=BATCH_SIZE, total_rows=total_rows, writer=writer,
+                                        pushdown=PUSHDOWN)
 
+    try:
+        if SWAP_RELOAD:
+            table_paths[table_name] = 'full (swap)'
+            stats = reload_with_swap(mssql_engine, mssql_table, load)
+        else:
+            stats = load(mssql_table)
+        print(f"Table `{table_name}`: All {stats['copied']} rows copied successfully "
+              f"({stats['skipped']} rows skipped due to NULL in non-nullable columns).")
+        state.set_checkpoint(table_name, 'done', None, stats['copied'])
+        if watermark is not None:
+            state.set_watermark(table_name, watermark_names, watermark)
+    except DataError as e:
+        print(f"Data error copying data for table `{table_name}`: {e}")
+        table_paths[table_name] = 'failed (full)'
+    except (SQLAlchemyError, pyodbc.Error, RuntimeError) as e:
+        print(f"Error copying data for table `{table_name}`: {e}")
+        table_paths[table_name] = 'failed (full)'
     else:
-        print(f"Table `{table_name}` does not exist in one of the databases and will be skipped.")
+        if CREATE_DEFERRED_INDEXES:
+            build_deferred_indexes(mysql_table, mssql_table)
+
+    # Calculate and display the time taken for this table
+    end_time = time.time()
+    time_taken = end_time - start_time
+    print(f"Completed copying table `{table_name}`. Time taken: {time_taken:.2f} seconds.")
+    return stats
+
+
+def build_deferred_indexes(mysql_table, mssql_table, conn=None):
+    """Create the deferred indexes of a copied table; a failure is reported on its own, the rows stay copied."""
+    table_name = mysql_table.name
+    try:
+        if conn is not None:
+            create_deferred_indexes(conn, mysql_table, schema=mssql_table.schema)
+        else:
+            with mssql_engine.connect() as conn:
+                create_deferred_indexes(conn, mysql_table, schema=mssql_table.schema)
+    except (SQLAlchemyError, pyodbc.Error) as e:
+        # e.g. duplicate keys under a unique index, or a legacy table the index does not fit
+        print(f"Table `{table_name}`: rows copied, but creating the deferred indexes failed: {e}")
+        table_paths[table_name] = f"{table_paths.get(table_name, 'full')}, indexes failed"
+
+
+def finish_small_table(conn, mysql_table, mssql_table, rows):
+    """Bookkeeping after the asyncio engine committed a small table, as copy_table does after a full copy."""
+    table_name = mysql_table.name
+    table_paths[table_name] = 'full (small, swap)' if SWAP_RELOAD else 'full (small)'
+    state.set_checkpoint(table_name, 'done', None, len(rows))
+    watermark_keys = watermark_columns(mysql_table, WATERMARK_COLUMNS.get(table_name)) if INCREMENTAL else None
+    if watermark_keys:
+        # The rows are all in memory, so the watermark needs no extra query
+        key_values = [tuple(row._mapping[col.name] for col in watermark_keys) for row in rows]
+        watermark = max((key for key in key_values if None not in key), default=None)
+        if watermark is not None:
+            state.set_watermark(table_name, [col.name for col in watermark_keys], watermark)
+    if CREATE_DEFERRED_INDEXES:
+        build_deferred_indexes(mysql_table, mssql_table, conn)
+
+
+def is_small_table_candidate(table_name):
+    """Small tables that would take the full copy path: not incremental and not finished by a resumed run."""
+    mysql_table = mysql_tables.get(table_name)
+    if mysql_table is None or mssql_tables.get(table_name) is None:
+        return False
+    watermark_keys = watermark_columns(mysql_table, WATERMARK_COLUMNS.get(table_name)) if INCREMENTAL else None
+    if watermark_keys and state.get_watermark(table_name, [col.name for col in watermark_keys]) is not None:
+        return False
+    checkpoint = state.get_checkpoint(table_name)
+    return checkpoint is None or checkpoint[0] != 'done'
+
+
+# Copy the largest tables first (information_schema estimates) so the run ends close to the largest table's time
+tables_in_order = order_by_size(list(mysql_tables), table_sizes)
+remaining_tables = tables_in_order
+if ASYNC_SMALL_TABLES:
+    small = [name for name in small_tables(tables_in_order, table_sizes) if is_small_table_candidate(name)]
+    print(f"\nReloading {len(small)} small tables, {SMALL_TABLE_SESSIONS} at a time...")
+    small_results = copy_small_tables(mysql_engine, mssql_engine,
+                                      [(mysql_tables[name], mssql_tables[name]) for name in small],
+                                      concurrency=SMALL_TABLE_SESSIONS, table_writers=TABLE_WRITERS,
+                                      after_copy=finish_small_table, pushdown=PUSHDOWN, swap=SWAP_RELOAD)
+    # Tables that failed here get another chance on the regular path; a table whose rows were committed is
+    # not copied again even if its bookkeeping (finish_small_table) failed
+    remaining_tables = [name for name in tables_in_order if not isinstance(small_results.get(name), dict)]
+slots = ServerSlots({'mysql': MAX_MYSQL_SESSIONS, 'mssql': MAX_MSSQL_SESSIONS})
+run_parallel(remaining_tables, copy_table, MAX_WORKERS, slots=slots)
+state.close()
+
+# Summary of the path each table took
+print("\nRun summary:")
+for table_name in tables_in_order:
+    print(f"  {table_name}: {table_paths.get(table_name, 'failed')}")
+run_metrics.write_report('copy', prometheus_path=PROMETHEUS_TEXTFILE)
 
 print("\nData transfer for all tables from MySQL to SQL Server is complete!")
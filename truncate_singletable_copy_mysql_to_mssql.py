@@ -1,7 +1,14 @@
 import pyodbc
 import pymysql
-from sqlalchemy import create_engine, MetaData, Table, select, text, func
+from sqlalchemy import create_engine, select, text, func
 from sqlalchemy.exc import SQLAlchemyError
+import time
+
+from bulk_writers import DEFAULT_WRITER, make_writer
+from copy_metrics import estimate_bytes, run_metrics
+from mysql_pushdown import source_query
+from reflection_cache import ReflectionCache
+from stream_copy import AdaptiveBatchSizer, get_key_columns, iter_keyset_batches
 
 # SQL Server connection (using pyodbc)
 mssql_conn = pyodbc.connect(
@@ -22,24 +29,32 @@ mysql_conn = pymysql.connect(
 mysql_engine = create_engine('mysql+pymysql://', creator=lambda: mysql_conn)
 mssql_engine = create_engine('mssql+pyodbc://', creator=lambda: mssql_conn)
 
-# MySQL metadata reflection
-mysql_metadata = MetaData()
-mysql_metadata.reflect(bind=mysql_engine)  # Reflect all tables from MySQL
-mysql_tables = mysql_metadata.tables
+# Strings longer than their SQL Server column (e.g. `remarks`) are cut by MySQL with LEFT(col, n), using the
+# reflected target lengths; truncations are counted per column and reported at the end
+PUSHDOWN = True
+
+# Key to page on; None uses the reflected primary key, or list the columns of a unique index
+KEY_COLUMNS = None
+
+# Batch size starts at BATCH_SIZE and adapts so each batch takes about TARGET_BATCH_SECONDS
+BATCH_SIZE = 1000
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 50000
+TARGET_BATCH_SECONDS = 1.0
 
-# SQL Server metadata reflection
-mssql_metadata = MetaData()
-mssql_metadata.reflect(bind=mssql_engine)  # Reflect all tables from SQL Server
+# Bulk writer backend (executemany, fast_executemany, tvp, bulk_insert)
+WRITER_BACKEND = DEFAULT_WRITER
 
-# Define the maximum length for the `remarks` column to avoid truncation errors
-MAX_REMARKS_LENGTH = 255  # Adjust based on SQL Server's `remarks` column length
+# Per-stage rows/s, bytes/s, batch latencies, retries and peak memory go to reports/copy-<time>.json and .csv;
+# set PROMETHEUS_TEXTFILE to also write them for the node_exporter textfile collector
+PROMETHEUS_TEXTFILE = None
 
 table_name = 'assign_defect_printing'
 print(f"Processing table {table_name}...")
 
-# Get SQL Server and MySQL table metadata
-mssql_table = mssql_metadata.tables.get(table_name)
-mysql_table = mysql_tables.get(table_name)
+# Get SQL Server and MySQL table metadata (reflects only this table, cached until its DDL changes)
+mssql_table = ReflectionCache(mssql_engine).table(table_name)
+mysql_table = ReflectionCache(mysql_engine).table(table_name)
 
 if mysql_table is not None and mssql_table is not None:
     # Get the total number of rows in the MySQL table for progress tracking
@@ -55,39 +70,53 @@ if mysql_table is not None and mssql_table is not None:
 
     # Step 2: Copy data from MySQL to SQL Server with progress tracking
     copied_rows = 0  # Initialize counter for tracking copied rows
-    batch_size = 100  # Define batch size for copying rows in chunks
+    key_columns = get_key_columns(mysql_table, KEY_COLUMNS)
+    if not key_columns:
+        raise SystemExit(f"Table {table_name} has no primary key; set KEY_COLUMNS to a unique index.")
+    sizer = AdaptiveBatchSizer(initial=BATCH_SIZE, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE,
+                               target_seconds=TARGET_BATCH_SECONDS)
+    writer = make_writer(WRITER_BACKEND, mssql_table)
+    metrics = run_metrics.table(table_name)
 
-    with mysql_engine.connect() as mysql_conn:
-        # Fetch rows in batches from MySQL
-        for offset in range(0, total_rows, batch_size):
-            mysql_data = mysql_conn.execute(select(mysql_table).offset(offset).limit(batch_size)).fetchall()
-
-            # Prepare insert data, truncating `remarks` if needed
-            insert_data = []
-            for row in mysql_data:
-                insert_row = {}
-                for mssql_col in mssql_table.columns:
-                    value = row._mapping.get(mssql_col.name)
-                    if mssql_col.name == 'remarks' and isinstance(value, str):
-                        # Truncate the `remarks` field if it exceeds the maximum length
-                        insert_row[mssql_col.name] = value[:MAX_REMARKS_LENGTH]
-                    else:
-                        insert_row[mssql_col.name] = value
-                insert_data.append(insert_row)
+    # Page on the key (WHERE key > last_seen ORDER BY key LIMIT n) and reuse one SQL Server connection
+    with mysql_engine.connect() as mysql_conn, mssql_engine.connect() as conn:
+        query, converter = source_query(mysql_conn, mysql_table, mssql_table, pushdown=PUSHDOWN,
+                                        key_columns=key_columns)
+        batch_start = time.time()
+        stage_start = time.perf_counter()
+        for mysql_data, last_key in iter_keyset_batches(mysql_conn, mysql_table, key_columns, sizer, query=query):
+            read_end = time.perf_counter()
+            metrics.record('read', len(mysql_data), read_end - stage_start, estimate_bytes(mysql_data))
+            # Rows arrive truncated; the converter puts them in SQL Server column order and counts truncations
+            insert_data = converter.convert_batch(mysql_data)
+            convert_end = time.perf_counter()
+            metrics.record('convert', len(mysql_data), convert_end - read_end, estimate_bytes(insert_data))
 
             # Insert batch into SQL Server table
-            if insert_data:
-                with mssql_engine.connect() as conn:
-                    try:
-                        conn.execute(mssql_table.insert(), insert_data)
-                        conn.execute(text("COMMIT"))
-                        # Update and display progress
-                        copied_rows += len(insert_data)
-                        progress = (copied_rows / total_rows) * 100
-                        print(f"Progress: {copied_rows}/{total_rows} rows copied ({progress:.2f}%)")
-                    except SQLAlchemyError as e:
-                        print(f"Error copying data in batch: {e}")
+            try:
+                if insert_data:
+                    writer.write(conn, insert_data)
+                conn.execute(text("COMMIT"))
+                metrics.record('write', len(insert_data), time.perf_counter() - convert_end,
+                               estimate_bytes(insert_data))
+                # Update and display progress
+                copied_rows += len(insert_data)
+                progress = (copied_rows / total_rows) * 100 if total_rows else 100.0
+                print(f"Progress: {copied_rows}/{total_rows} rows copied ({progress:.2f}%), "
+                      f"last key {last_key}, batch size {len(insert_data)}")
+            except (SQLAlchemyError, pyodbc.Error) as e:
+                conn.execute(text("ROLLBACK"))
+                print(f"Error copying data in batch ending at key {last_key}: {e}")
+
+            # Resize the next batch based on how long this one took end to end
+            now = time.time()
+            sizer.record(len(mysql_data), now - batch_start)
+            batch_start = now
+            stage_start = time.perf_counter()
+        converter.report_truncations()
+    metrics.finish()
 else:
     print(f"Table {table_name} does not exist in one of the databases.")
 
 print("Data transfer for the table from MySQL to SQL Server is complete!")
+run_metrics.write_report('copy', prometheus_path=PROMETHEUS_TEXTFILE)